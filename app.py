@@ -1,91 +1,202 @@
 import os
+from datetime import date
 from dotenv import load_dotenv
 from flask import Flask, request
-from flask_sqlalchemy import SQLAlchemy
-from flask_restful import Api, Resource
+from flask_restful import Api, Resource, reqparse
+from flask_migrate import Migrate
+from sqlalchemy import case, delete, exists, func, select, update
+from sqlalchemy.exc import IntegrityError
 from models import db, Student, StudentProfile, Teacher, TeacherProfile, Course, Enrollment, TeacherCourse
+from cache import cached, init_cache
+from conditional import (
+    collection_stamp, conditional, delete_row, record_collection_stamp, record_stamp, row_stamp, row_validators,
+    stamp_columns, stamp_from, update_row,
+)
+from compression import init_compression
+from config import pool_options
+from counters import counters_cli
+from batch import BatchResource
+from bulk import BulkStudentsResource, BulkCoursesResource, BulkEnrollmentsResource, read_update
+from db_helpers import abort_on_unique_violation, insert_link
+from enrollments import enroll, enrollment_queue, init_enrollment_queue
+from expand import expandable
+from exports import EnrollmentExportResource, export_cli
+from imports import ImportResource, import_cli
+from instrumentation import MetricsResource, PoolMetricsResource, init_pool_metrics, init_request_metrics
+from pagination import keyset_page, multi_get, parse_ids, stream_ndjson, wants_ndjson
+from ratelimit import init_rate_limits
+from replicas import configure_replica_binds, init_replicas
+from reports import (
+    CoEnrollmentReportResource, TeacherLoadReportResource, TeacherStudentsReportResource, reports_cli,
+)
+from representations import init_representations
+from search import record_search_change, search_page
+from serializers import (
+    student_serializer, student_profile_serializer, teacher_serializer,
+    teacher_profile_serializer, course_serializer,
+)
 
 # Load environment variables
 load_dotenv()
 
-# Initialize Flask app
-app = Flask(__name__)
+# Schema changes are managed with Flask-Migrate (flask db upgrade); batch mode lets SQLite alter tables
+migrate = Migrate(render_as_batch=True)
 
-# Load appropriate configuration based on FLASK_ENV
-if os.getenv('FLASK_ENV') == 'production':
-    app.config.from_object('config.ProductionConfig')
-elif os.getenv('FLASK_ENV') == 'testing':
-    app.config.from_object('config.TestingConfig')
-else:
-    app.config.from_object('config.DevelopmentConfig')
+# Set up Flask-Restful API; resources are added below and registered on each app by create_app()
+api = Api()
 
-# Configure SQLAlchemy database URI based on environment variables
-app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+# orjson for JSON, MessagePack when asked for with Accept
+init_representations(api)
 
-# Set up database URI based on environment (use DB_EXTERNAL_URL by default)
-if os.getenv('FLASK_ENV') == 'production':
-    app.config["SQLALCHEMY_DATABASE_URI"] = os.getenv("DB_INTERNAL_URL")
-else:
-    app.config["SQLALCHEMY_DATABASE_URI"] = os.getenv("DB_EXTERNAL_URL")
 
-# Set the Flask app secret key from environment variable
-app.config["SECRET_KEY"] = os.getenv("SECRET_KEY")
+def create_app(config=None, **settings):
+    """
+    Application factory, used by `flask run`, gunicorn ('app:create_app()'), seed.py and the benchmarks.
 
-# Initialize SQLAlchemy with the Flask app
-db.init_app(app)
+    `config` is a config object or import path; by default it is chosen from FLASK_ENV and the
+    database URI is read from DB_INTERNAL_URL (production) or DB_EXTERNAL_URL. `settings` are
+    applied last, e.g. create_app(SQLALCHEMY_DATABASE_URI='sqlite://').
 
-# Create the app context
-with app.app_context():
-    # Create the database tables if they don't exist
-    db.create_all()
+    No database connection is opened here: the engine connects on the first query. The schema
+    is created and upgraded by the migrations (flask db upgrade), not at startup.
+    """
+    app = Flask(__name__)
+
+    # Load appropriate configuration based on FLASK_ENV
+    if config is None:
+        if os.getenv('FLASK_ENV') == 'production':
+            config = 'config.ProductionConfig'
+        elif os.getenv('FLASK_ENV') == 'testing':
+            config = 'config.TestingConfig'
+        else:
+            config = 'config.DevelopmentConfig'
+        # Set up database URI based on environment (use DB_EXTERNAL_URL by default)
+        if os.getenv('FLASK_ENV') == 'production':
+            settings.setdefault('SQLALCHEMY_DATABASE_URI', os.getenv('DB_INTERNAL_URL'))
+        else:
+            settings.setdefault('SQLALCHEMY_DATABASE_URI', os.getenv('DB_EXTERNAL_URL'))
+    app.config.from_object(config)
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config.update(settings)
+    if app.config.get('DB_POOL_FROM_ENV') and not app.config.get('SQLALCHEMY_ENGINE_OPTIONS'):
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = pool_options(app.config.get('SQLALCHEMY_DATABASE_URI'))
+
+    # Initialize SQLAlchemy and Flask-Migrate with the Flask app
+    configure_replica_binds(app)
+    db.init_app(app)
+    migrate.init_app(app, db)
+
+    # GET requests read from the replicas in REPLICA_URLS, if any
+    init_replicas(app, db)
+
+    # Response cache for the catalog endpoints, invalidated on commit
+    init_cache(app)
+
+    # Connection pool metrics (checkouts, wait times, churn), served at /metrics/pool
+    init_pool_metrics(app, db)
+
+    # Per-endpoint latency, SQL statement counts and timings, slow-query log; served at /metrics
+    init_request_metrics(app, db)
+
+    # Per-client token buckets (429) and per-worker admission control (503), weighted by endpoint cost
+    init_rate_limits(app)
+
+    # gzip / brotli compression of larger responses, negotiated with Accept-Encoding
+    init_compression(app)
+
+    # Write-behind enrollment queue (ENROLLMENT_QUEUE = 'memory' or 'sqlite')
+    init_enrollment_queue(app)
+
+    # Register every resource added to `api` in this module
+    api.init_app(app)
+
+    # flask counters check / rebuild
+    app.cli.add_command(counters_cli)
+    # flask reports check / rebuild
+    app.cli.add_command(reports_cli)
+    # flask export enrollments
+    app.cli.add_command(export_cli)
+    # flask import students / enrollments
+    app.cli.add_command(import_cli)
+    return app
 
-# Set up Flask-Restful API
-api = Api(app)
 
 # ---------------------Define resource endpoints---------------------------------------------
 # -------------------------STUDENT RESOURCES-------------------------------------------------
 
 class StudentResource(Resource):
+    # Fields a PUT may change: {field: (type, required)}, checked by bulk.read_update()
+    fields = {'name': (str, True), 'email': (str, True), 'reg_no': (str, True), 'date_of_birth': (date, True)}
+
+    def stamp(self):
+        """
+        Change stamp of the student looked up by student_id, reg_no or email (see conditional.py).
+        """
+        if 'ids' in request.args:
+            return None
+        for field in ('student_id', 'reg_no', 'email'):
+            value = request.args.get(field)
+            if value:
+                return row_stamp(Student, getattr(Student, field) == value)
+        return None
+
+    @expandable(Student)
+    @conditional
     def get(self):
         """
-        Fetches either all students or a specific student by student_id, reg_no, email, or name.
+        Fetches either all students, several students by ?ids=, or a specific student by
+        student_id, reg_no, email, or name.
+        The full list is paginated by student_id (?limit=, ?after=) or streamed with ?format=ndjson.
         """
+        ids = parse_ids()
         student_id = request.args.get('student_id')
         reg_no = request.args.get('reg_no')
         email = request.args.get('email')
         name = request.args.get('name')
 
-        if student_id:
-            student = Student.query.filter_by(student_id=student_id).first()
+        fields = student_serializer.parse_fields()
+        serialize = student_serializer.row_serializer(fields)
+        stmt = student_serializer.select(fields)
+        lookup = stmt.add_columns(*stamp_columns(Student))
+
+        if ids is not None:
+            return multi_get(stmt, Student.student_id, ids, 'students', serialize)
+
+        elif student_id:
+            student = db.session.execute(lookup.where(Student.student_id == student_id)).first()
             if student:
-                return {'student': student.to_dict()}
+                record_stamp(student)
+                return {'student': serialize(student)}
             else:
                 return {'message': 'Student not found'}, 404
 
         elif reg_no:
-            student = Student.query.filter_by(reg_no=reg_no).first()
+            student = db.session.execute(lookup.where(Student.reg_no == reg_no)).first()
             if student:
-                return {'student': student.to_dict()}
+                record_stamp(student)
+                return {'student': serialize(student)}
             else:
                 return {'message': 'Student not found'}, 404
 
         elif email:
-            student = Student.query.filter_by(email=email).first()
+            student = db.session.execute(lookup.where(Student.email == email)).first()
             if student:
-                return {'student': student.to_dict()}
+                record_stamp(student)
+                return {'student': serialize(student)}
             else:
                 return {'message': 'Student not found'}, 404
 
         elif name:
-            students = Student.query.filter(Student.name.ilike(f'%{name}%')).all()
-            if students:
-                return {'students': [student.to_dict() for student in students]}
+            body = search_page('students', stmt, name, serialize)
+            if body['students']:
+                return body
             else:
                 return {'message': 'Student not found'}, 404
 
         else:
-            students = Student.query.all()
-            return {'students': [student.to_dict() for student in students]}
+            if wants_ndjson():
+                return stream_ndjson(stmt, Student.student_id, serialize)
+            return keyset_page(stmt, Student.student_id, 'students', serialize)
 
     def post(self):
         """
@@ -94,46 +205,39 @@ class StudentResource(Resource):
         data = request.get_json()
         new_student = Student(
             name=data.get('name'),
-            date_of_birth=data.get('date_of_birth'),
+            # SQLite's Date type only accepts date objects, so parse the ISO string here
+            date_of_birth=date.fromisoformat(data['date_of_birth']) if data.get('date_of_birth') else None,
             email=data.get('email'),
             reg_no=data.get('reg_no')
             # Add other fields if necessary
         )
         db.session.add(new_student)
-        db.session.commit()
-        return new_student.to_dict(), 201
+        try:
+            db.session.commit()
+        except IntegrityError as error:
+            abort_on_unique_violation(error, Student)
+        return student_serializer.dump(new_student), 201
 
     def put(self, student_id):
         """
-        Updates information for a specific student identified by student_id.
+        Updates information for a specific student identified by student_id, in one UPDATE
+        statement. With If-Match, only if the student is still at that version (412 otherwise).
         """
-        data = request.get_json()
-        student = Student.query.get(student_id)
-        if not student:
-            return {'message': 'Student not found'}, 404
-
-        # Update student fields based on data provided
-        if 'name' in data:
-            student.name = data['name']
-        if 'date_of_birth' in data:
-            student.date_of_birth = data['date_of_birth']
-        if 'email' in data:
-            student.email = data['email']
-        if 'reg_no' in data:
-            student.reg_no = data['reg_no']
+        values = read_update(self.fields)
 
+        student = update_row(Student, [Student.student_id == student_id], values, 'Student')
+        record_search_change(Student, student.student_id, student.name)
+        body, headers = student_serializer.dump(student), row_validators(student)
         db.session.commit()
-        return student.to_dict()
+        return body, 200, headers
 
     def delete(self, student_id):
         """
         Deletes a specific student identified by student_id.
+        With If-Match, only if the student is still at that version (412 otherwise).
         """
-        student = Student.query.get(student_id)
-        if not student:
-            return {'message': 'Student not found'}, 404
-
-        db.session.delete(student)
+        delete_row(Student, [Student.student_id == student_id], 'Student')
+        record_search_change(Student, student_id)
         db.session.commit()
         return {'message': 'Student deleted'}, 204
 
@@ -141,16 +245,22 @@ class StudentResource(Resource):
 api.add_resource(StudentResource, '/students', '/students/<int:student_id>')
 
 # View all students:        GET /students
+# Page through students:    GET /students?limit=<n>&after=<student_id>
+# Stream all students:      GET /students?format=ndjson
+# Pick returned fields:     GET /students?fields=name,email
 # Add new student:          POST /students
 # Change student data:      PUT /students/<student_id>
 # Delete students:          DELETE /students/<student_id>
 # Search student by id:     GET /students?student_id=<student_id>
+# Fetch several students:   GET /students?ids=3,1,2 (one query, in the given order, unknown ids under "missing")
+# Embed related rows:       GET /students?student_id=<id>&expand=student_profile,courses[.teachers] (see expand.py)
 # Search student by reg_no: GET /students?reg_no=<reg_no>
 # Search student by email:  GET /students?email=<email>
-# Search student by name:   GET /students?name=<name>
-
-if __name__ == '__main__':
-    app.run(port=os.getenv('FLASK_RUN_PORT', 5555), debug=app.config['DEBUG'])
+# Search student by name:   GET /students?name=<name>[&limit=<n>&offset=<n>] (ranked best match first)
+# Lookups by id, reg_no or email send ETag and Last-Modified; repeat with If-None-Match or
+# If-Modified-Since to get 304 when the student is unchanged.
+# PUT and DELETE take that ETag in If-Match and answer 412 if the student changed since; PUT
+# responses carry the new ETag.
 
 
 
@@ -159,38 +269,70 @@ if __name__ == '__main__':
 # -------------------------Teacher RESOURCES--------------------------------------------------
 
 class TeacherResource(Resource):
+    # Fields a PUT may change: {field: (type, required)}, checked by bulk.read_update()
+    fields = {'name': (str, False), 'email': (str, False)}
+
+    def stamp(self):
+        """
+        Change stamp of the teacher looked up by teacher_id or email (see conditional.py).
+        """
+        if 'ids' in request.args:
+            return None
+        for field in ('teacher_id', 'email'):
+            value = request.args.get(field)
+            if value:
+                return row_stamp(Teacher, getattr(Teacher, field) == value)
+        return None
+
+    @expandable(Teacher)
+    @cached('teachers')
+    @conditional
     def get(self):
         """
-        Fetches either all teachers or a specific teacher by teacher_id, email, or name.
+        Fetches either all teachers, several teachers by ?ids=, or a specific teacher by
+        teacher_id, email, or name.
+        The full list is paginated by teacher_id (?limit=, ?after=) or streamed with ?format=ndjson.
         """
+        ids = parse_ids()
         teacher_id = request.args.get('teacher_id')
         email = request.args.get('email')
         name = request.args.get('name')
 
-        if teacher_id:
-            teacher = Teacher.query.filter_by(teacher_id=teacher_id).first()
+        fields = teacher_serializer.parse_fields()
+        serialize = teacher_serializer.row_serializer(fields)
+        stmt = teacher_serializer.select(fields)
+        lookup = stmt.add_columns(*stamp_columns(Teacher))
+
+        if ids is not None:
+            return multi_get(stmt, Teacher.teacher_id, ids, 'teachers', serialize)
+
+        elif teacher_id:
+            teacher = db.session.execute(lookup.where(Teacher.teacher_id == teacher_id)).first()
             if teacher:
-                return {'teacher': teacher.to_dict()}
+                record_stamp(teacher)
+                return {'teacher': serialize(teacher)}
             else:
                 return {'message': 'Teacher not found'}, 404
 
         elif email:
-            teacher = Teacher.query.filter_by(email=email).first()
+            teacher = db.session.execute(lookup.where(Teacher.email == email)).first()
             if teacher:
-                return {'teacher': teacher.to_dict()}
+                record_stamp(teacher)
+                return {'teacher': serialize(teacher)}
             else:
                 return {'message': 'Teacher not found'}, 404
 
         elif name:
-            teachers = Teacher.query.filter(Teacher.name.ilike(f'%{name}%')).all()
-            if teachers:
-                return {'teachers': [teacher.to_dict() for teacher in teachers]}
+            body = search_page('teachers', stmt, name, serialize)
+            if body['teachers']:
+                return body
             else:
                 return {'message': 'Teacher not found'}, 404
 
         else:
-            teachers = Teacher.query.all()
-            return {'teachers': [teacher.to_dict() for teacher in teachers]}
+            if wants_ndjson():
+                return stream_ndjson(stmt, Teacher.teacher_id, serialize)
+            return keyset_page(stmt, Teacher.teacher_id, 'teachers', serialize)
 
     def post(self):
         """
@@ -203,36 +345,32 @@ class TeacherResource(Resource):
             # Add other fields if necessary
         )
         db.session.add(new_teacher)
-        db.session.commit()
-        return new_teacher.to_dict(), 201
+        try:
+            db.session.commit()
+        except IntegrityError as error:
+            abort_on_unique_violation(error, Teacher)
+        return teacher_serializer.dump(new_teacher), 201
 
     def put(self, teacher_id):
         """
-        Updates information for a specific teacher identified by teacher_id.
+        Updates information for a specific teacher identified by teacher_id, in one UPDATE
+        statement. With If-Match, only if the teacher is still at that version (412 otherwise).
         """
-        data = request.get_json()
-        teacher = Teacher.query.get(teacher_id)
-        if not teacher:
-            return {'message': 'Teacher not found'}, 404
-
-        # Update teacher fields based on data provided
-        if 'name' in data:
-            teacher.name = data['name']
-        if 'email' in data:
-            teacher.email = data['email']
+        values = read_update(self.fields)
 
+        teacher = update_row(Teacher, [Teacher.teacher_id == teacher_id], values, 'Teacher')
+        record_search_change(Teacher, teacher.teacher_id, teacher.name)
+        body, headers = teacher_serializer.dump(teacher), row_validators(teacher)
         db.session.commit()
-        return teacher.to_dict()
+        return body, 200, headers
 
     def delete(self, teacher_id):
         """
         Deletes a specific teacher identified by teacher_id.
+        With If-Match, only if the teacher is still at that version (412 otherwise).
         """
-        teacher = Teacher.query.get(teacher_id)
-        if not teacher:
-            return {'message': 'Teacher not found'}, 404
-
-        db.session.delete(teacher)
+        delete_row(Teacher, [Teacher.teacher_id == teacher_id], 'Teacher')
+        record_search_change(Teacher, teacher_id)
         db.session.commit()
         return {'message': 'Teacher deleted'}, 204
 
@@ -240,42 +378,76 @@ class TeacherResource(Resource):
 api.add_resource(TeacherResource, '/teachers', '/teachers/<int:teacher_id>')
 
 # View all teachers:         GET /teachers
+# Page through teachers:     GET /teachers?limit=<n>&after=<teacher_id>
+# Stream all teachers:       GET /teachers?format=ndjson
+# Pick returned fields:      GET /teachers?fields=name,email
 # Add new teacher:           POST /teachers
 # Change teacher data:       PUT /teachers/<teacher_id>
 # Delete teacher:            DELETE /teachers/<teacher_id>
+# PUT and DELETE take an ETag of the teacher in If-Match (412 if it changed since)
 # Search teacher by id:      GET /teachers?teacher_id=<teacher_id>
+# Fetch several teachers:    GET /teachers?ids=<id>,<id>,...
+# Embed related rows:        GET /teachers?teacher_id=<id>&expand=teacher_profile,courses[.students]
 # Search teacher by email:   GET /teachers?email=<email>
-# Search teacher by name:    GET /teachers?name=<name>
+# Search teacher by name:    GET /teachers?name=<name>[&limit=<n>&offset=<n>] (ranked best match first)
 
 #_______________________________________________________________________________________________________________
 
 # --------------------------Course RESOURCES--------------------------------------------------
 
 class CourseResource(Resource):
+    # Fields a PUT may change: {field: (type, required)}, checked by bulk.read_update()
+    fields = {'course_name': (str, True), 'description': (str, False), 'capacity': (int, False)}
+
+    def stamp(self):
+        """
+        Change stamp of the course looked up by course_id (see conditional.py).
+        """
+        course_id = request.args.get('course_id')
+        if 'ids' in request.args or not course_id:
+            return None
+        return row_stamp(Course, Course.course_id == course_id)
+
+    @expandable(Course)
+    @cached('courses')
+    @conditional
     def get(self):
         """
-        Fetches either all courses or a specific course by course_id or name.
+        Fetches either all courses, several courses by ?ids=, or a specific course by course_id or name.
+        The full list is paginated by course_id (?limit=, ?after=) or streamed with ?format=ndjson.
         """
+        ids = parse_ids()
         course_id = request.args.get('course_id')
         name = request.args.get('name')
 
-        if course_id:
-            course = Course.query.filter_by(course_id=course_id).first()
+        fields = course_serializer.parse_fields()
+        serialize = course_serializer.row_serializer(fields)
+        stmt = course_serializer.select(fields)
+
+        if ids is not None:
+            return multi_get(stmt, Course.course_id, ids, 'courses', serialize)
+
+        elif course_id:
+            course = db.session.execute(
+                stmt.add_columns(*stamp_columns(Course)).where(Course.course_id == course_id)
+            ).first()
             if course:
-                return {'course': course.to_dict()}
+                record_stamp(course)
+                return {'course': serialize(course)}
             else:
                 return {'message': 'Course not found'}, 404
 
         elif name:
-            courses = Course.query.filter(Course.course_name.ilike(f'%{name}%')).all()
-            if courses:
-                return {'courses': [course.to_dict() for course in courses]}
+            body = search_page('courses', stmt, name, serialize)
+            if body['courses']:
+                return body
             else:
                 return {'message': 'Course not found'}, 404
 
         else:
-            courses = Course.query.all()
-            return {'courses': [course.to_dict() for course in courses]}
+            if wants_ndjson():
+                return stream_ndjson(stmt, Course.course_id, serialize)
+            return keyset_page(stmt, Course.course_id, 'courses', serialize)
 
     def post(self):
         """
@@ -285,39 +457,33 @@ class CourseResource(Resource):
         new_course = Course(
             course_name=data.get('course_name'),
             description=data.get('description'),
+            capacity=data.get('capacity'),
             # Add other fields if necessary
         )
         db.session.add(new_course)
         db.session.commit()
-        return new_course.to_dict(), 201
+        return course_serializer.dump(new_course), 201
 
     def put(self, course_id):
         """
-        Updates information for a specific course identified by course_id.
+        Updates information for a specific course identified by course_id, in one UPDATE
+        statement. With If-Match, only if the course is still at that version (412 otherwise).
         """
-        data = request.get_json()
-        course = Course.query.get(course_id)
-        if not course:
-            return {'message': 'Course not found'}, 404
-
-        # Update course fields based on data provided
-        if 'course_name' in data:
-            course.course_name = data['course_name']
-        if 'description' in data:
-            course.description = data['description']
+        values = read_update(self.fields)
 
+        course = update_row(Course, [Course.course_id == course_id], values, 'Course')
+        record_search_change(Course, course.course_id, course.course_name)
+        body, headers = course_serializer.dump(course), row_validators(course)
         db.session.commit()
-        return course.to_dict()
+        return body, 200, headers
 
     def delete(self, course_id):
         """
         Deletes a specific course identified by course_id.
+        With If-Match, only if the course is still at that version (412 otherwise).
         """
-        course = Course.query.get(course_id)
-        if not course:
-            return {'message': 'Course not found'}, 404
-
-        db.session.delete(course)
+        delete_row(Course, [Course.course_id == course_id], 'Course')
+        record_search_change(Course, course_id)
         db.session.commit()
         return {'message': 'Course deleted'}, 204
 
@@ -325,11 +491,19 @@ class CourseResource(Resource):
 api.add_resource(CourseResource, '/courses', '/courses/<int:course_id>')
 
 # View all courses:          GET /courses
+# Page through courses:      GET /courses?limit=<n>&after=<course_id>
+# Stream all courses:        GET /courses?format=ndjson
+# Pick returned fields:      GET /courses?fields=course_name
+# Course and teacher catalog GETs are cached and send an ETag; repeat with If-None-Match to get 304 when unchanged.
+# Lookups by course_id also send Last-Modified and answer If-Modified-Since.
 # Add new course:            POST /courses
 # Change course data:        PUT /courses/<course_id>
 # Delete course:             DELETE /courses/<course_id>
+# PUT and DELETE take an ETag of the course in If-Match (412 if it changed since)
 # Search course by id:       GET /courses?course_id=<course_id>
-# Search course by name:     GET /courses?name=<name>
+# Fetch several courses:     GET /courses?ids=<id>,<id>,...
+# Embed related rows:        GET /courses?course_id=<id>&expand=students,teachers[.teacher_profile]
+# Search course by name:     GET /courses?name=<name>[&limit=<n>&offset=<n>] (ranked best match first)
 
 
 
@@ -340,17 +514,40 @@ api.add_resource(CourseResource, '/courses', '/courses/<int:course_id>')
 # --------------------------Student Profiles RESOURCES--------------------------------------------------
 
 class StudentProfileResource(Resource):
+    # Fields a PUT may change: {field: (type, required)}, checked by bulk.read_update()
+    fields = {'bio': (str, False), 'photo_url': (str, False)}
+
+    def stamp(self, student_id):
+        """
+        Change stamp of the student and its profile (see conditional.py).
+        """
+        return stamp_from(
+            select(Student.version, Student.updated_at, StudentProfile.version, StudentProfile.updated_at)
+            .join(StudentProfile, Student.student_profile)
+            .where(Student.student_id == student_id)
+        )
+
+    @conditional
     def get(self, student_id):
         """
         Fetches the profile of a specific student identified by student_id.
         The profile includes bio, photo_url, name, and reg_no of the student.
         """
-        student_profile = StudentProfile.query.filter_by(student_id=student_id).first()
+        # One joined statement instead of loading the profile and then lazily loading .student
+        student_profile = db.session.execute(
+            select(
+                Student.name, Student.reg_no, StudentProfile.bio, StudentProfile.photo_url,
+                *stamp_columns(Student, StudentProfile),
+            )
+            .join(StudentProfile, Student.student_profile)
+            .where(Student.student_id == student_id)
+        ).first()
         if student_profile:
+            record_stamp(student_profile, models=2)
             return {
                 'student_id': student_id,
-                'name': student_profile.student.name,
-                'reg_no': student_profile.student.reg_no,
+                'name': student_profile.name,
+                'reg_no': student_profile.reg_no,
                 'bio': student_profile.bio,
                 'photo_url': student_profile.photo_url
             }
@@ -362,42 +559,47 @@ class StudentProfileResource(Resource):
         Creates a new profile for the student identified by student_id.
         """
         data = request.get_json()
+        student = db.session.get(Student, student_id)
+        if not student:
+            return {'message': 'Student not found'}, 404
+
+        # The link lives on the student row (students.student_profile_id)
         new_profile = StudentProfile(
             bio=data.get('bio'),
-            photo_url=data.get('photo_url'),
-            student_id=student_id
+            photo_url=data.get('photo_url')
         )
-        db.session.add(new_profile)
+        student.student_profile = new_profile
         db.session.commit()
-        return new_profile.to_dict(), 201
+        return student_profile_serializer.dump(new_profile), 201
 
     def put(self, student_id):
         """
-        Updates the profile of the student identified by student_id.
+        Updates the profile of the student identified by student_id, in one UPDATE statement.
+        With If-Match, only if the profile is still at that version (412 otherwise).
         """
-        data = request.get_json()
-        student_profile = StudentProfile.query.filter_by(student_id=student_id).first()
-        if not student_profile:
-            return {'message': 'Student profile not found'}, 404
-
-        # Update profile fields based on data provided
-        if 'bio' in data:
-            student_profile.bio = data['bio']
-        if 'photo_url' in data:
-            student_profile.photo_url = data['photo_url']
+        values = read_update(self.fields)
 
+        profile_id = select(Student.student_profile_id).where(Student.student_id == student_id).scalar_subquery()
+        student_profile = update_row(
+            StudentProfile, [StudentProfile.student_profile_id == profile_id], values, 'Student profile'
+        )
+        body, headers = student_profile_serializer.dump(student_profile), row_validators(student_profile)
         db.session.commit()
-        return student_profile.to_dict()
+        return body, 200, headers
 
     def delete(self, student_id):
         """
         Deletes the profile of the student identified by student_id.
+        With If-Match, only if the profile is still at that version (412 otherwise).
         """
-        student_profile = StudentProfile.query.filter_by(student_id=student_id).first()
-        if not student_profile:
-            return {'message': 'Student profile not found'}, 404
+        profile_id = select(Student.student_profile_id).where(Student.student_id == student_id).scalar_subquery()
+        profile_id = delete_row(StudentProfile, [StudentProfile.student_profile_id == profile_id], 'Student profile')
 
-        db.session.delete(student_profile)
+        # Unlink every student sharing this profile (the foreign key is only checked at commit)
+        db.session.execute(
+            update(Student).where(Student.student_profile_id == profile_id).values(student_profile_id=None),
+            execution_options={'synchronize_session': False},
+        )
         db.session.commit()
         return {'message': 'Student profile deleted'}, 204
 
@@ -406,6 +608,7 @@ api.add_resource(StudentProfileResource, '/student-profiles/<int:student_id>')
 
 # Fetch student profile:      GET /student-profiles/<student_id>
 # Returns the profile information (bio, photo_url) along with the student's name and reg_no.
+# Sends ETag and Last-Modified; conditional requests get 304 when unchanged.
 
 # Create new student profile: POST /student-profiles/<student_id>
 # Creates a new profile for the student identified by student_id.
@@ -415,6 +618,7 @@ api.add_resource(StudentProfileResource, '/student-profiles/<int:student_id>')
 
 # Delete student profile:     DELETE /student-profiles/<student_id>
 # Deletes the profile of the student identified by student_id.
+# PUT and DELETE take the profile's ETag in If-Match and answer 412 if it changed since.
 
 
 
@@ -424,17 +628,40 @@ api.add_resource(StudentProfileResource, '/student-profiles/<int:student_id>')
 # Display All
 
 class TeacherProfileResource(Resource):
+    # Fields a PUT may change: {field: (type, required)}, checked by bulk.read_update()
+    fields = {'bio': (str, False), 'photo_url': (str, False), 'phone_no': (str, False)}
+
+    def stamp(self, teacher_id):
+        """
+        Change stamp of the teacher and its profile (see conditional.py).
+        """
+        return stamp_from(
+            select(Teacher.version, Teacher.updated_at, TeacherProfile.version, TeacherProfile.updated_at)
+            .join(TeacherProfile, Teacher.teacher_profile)
+            .where(Teacher.teacher_id == teacher_id)
+        )
+
+    @conditional
     def get(self, teacher_id):
         """
         Fetches the profile of a specific teacher identified by teacher_id.
         The profile includes bio, photo_url, name, email, and other details.
         """
-        teacher_profile = TeacherProfile.query.filter_by(teacher_id=teacher_id).first()
+        # One joined statement instead of loading the profile and then lazily loading .teacher
+        teacher_profile = db.session.execute(
+            select(
+                Teacher.name, Teacher.email, TeacherProfile.bio, TeacherProfile.photo_url, TeacherProfile.phone_no,
+                *stamp_columns(Teacher, TeacherProfile),
+            )
+            .join(TeacherProfile, Teacher.teacher_profile)
+            .where(Teacher.teacher_id == teacher_id)
+        ).first()
         if teacher_profile:
+            record_stamp(teacher_profile, models=2)
             return {
                 'teacher_id': teacher_id,
-                'name': teacher_profile.teacher.name,
-                'email': teacher_profile.teacher.email,
+                'name': teacher_profile.name,
+                'email': teacher_profile.email,
                 'bio': teacher_profile.bio,
                 'photo_url': teacher_profile.photo_url,
                 'phone_no': teacher_profile.phone_no
@@ -447,45 +674,48 @@ class TeacherProfileResource(Resource):
         Creates a new profile for the teacher identified by teacher_id.
         """
         data = request.get_json()
+        teacher = db.session.get(Teacher, teacher_id)
+        if not teacher:
+            return {'message': 'Teacher not found'}, 404
+
+        # The link lives on the teacher row (teachers.teacher_profile_id)
         new_profile = TeacherProfile(
             bio=data.get('bio'),
             photo_url=data.get('photo_url'),
-            phone_no=data.get('phone_no'),
-            teacher_id=teacher_id
+            phone_no=data.get('phone_no')
         )
-        db.session.add(new_profile)
+        teacher.teacher_profile = new_profile
         db.session.commit()
-        return new_profile.to_dict(), 201
+        return teacher_profile_serializer.dump(new_profile), 201
 
     def put(self, teacher_id):
         """
-        Updates the profile of the teacher identified by teacher_id.
+        Updates the profile of the teacher identified by teacher_id, in one UPDATE statement.
+        With If-Match, only if the profile is still at that version (412 otherwise).
         """
-        data = request.get_json()
-        teacher_profile = TeacherProfile.query.filter_by(teacher_id=teacher_id).first()
-        if not teacher_profile:
-            return {'message': 'Teacher profile not found'}, 404
-
-        # Update profile fields based on data provided
-        if 'bio' in data:
-            teacher_profile.bio = data['bio']
-        if 'photo_url' in data:
-            teacher_profile.photo_url = data['photo_url']
-        if 'phone_no' in data:
-            teacher_profile.phone_no = data['phone_no']
+        values = read_update(self.fields)
 
+        profile_id = select(Teacher.teacher_profile_id).where(Teacher.teacher_id == teacher_id).scalar_subquery()
+        teacher_profile = update_row(
+            TeacherProfile, [TeacherProfile.teacher_profile_id == profile_id], values, 'Teacher profile'
+        )
+        body, headers = teacher_profile_serializer.dump(teacher_profile), row_validators(teacher_profile)
         db.session.commit()
-        return teacher_profile.to_dict()
+        return body, 200, headers
 
     def delete(self, teacher_id):
         """
         Deletes the profile of the teacher identified by teacher_id.
+        With If-Match, only if the profile is still at that version (412 otherwise).
         """
-        teacher_profile = TeacherProfile.query.filter_by(teacher_id=teacher_id).first()
-        if not teacher_profile:
-            return {'message': 'Teacher profile not found'}, 404
+        profile_id = select(Teacher.teacher_profile_id).where(Teacher.teacher_id == teacher_id).scalar_subquery()
+        profile_id = delete_row(TeacherProfile, [TeacherProfile.teacher_profile_id == profile_id], 'Teacher profile')
 
-        db.session.delete(teacher_profile)
+        # Unlink every teacher sharing this profile (the foreign key is only checked at commit)
+        db.session.execute(
+            update(Teacher).where(Teacher.teacher_profile_id == profile_id).values(teacher_profile_id=None),
+            execution_options={'synchronize_session': False},
+        )
         db.session.commit()
         return {'message': 'Teacher profile deleted'}, 204
     
@@ -494,6 +724,7 @@ api.add_resource(TeacherProfileResource, '/teacher-profiles/<int:teacher_id>')
 
 # Fetch teacher profile:      GET /teacher-profiles/<teacher_id>
 # Returns the profile information (bio, photo_url, phone_no) along with the teacher's name and email.
+# Sends ETag and Last-Modified; conditional requests get 304 when unchanged.
 
 # Create new teacher profile: POST /teacher-profiles/<teacher_id>
 # Creates a new profile for the teacher identified by teacher_id.
@@ -503,6 +734,7 @@ api.add_resource(TeacherProfileResource, '/teacher-profiles/<int:teacher_id>')
 
 # Delete teacher profile:     DELETE /teacher-profiles/<teacher_id>
 # Deletes the profile of the teacher identified by teacher_id.
+# PUT and DELETE take the profile's ETag in If-Match and answer 412 if it changed since.
 
 
 #_________________________________________________________________________________________________________
@@ -511,58 +743,111 @@ api.add_resource(TeacherProfileResource, '/teacher-profiles/<int:teacher_id>')
 
 # Define Resource for fetching courses enrolled by a specific student
 class StudentCoursesResource(Resource):
+    def stamp(self, student_id):
+        """
+        Change stamp of the student and its enrolled courses (see conditional.py).
+        """
+        return collection_stamp(
+            Student.student_id, student_id, Enrollment.student_id, Enrollment.course_id, Course.course_id
+        )
+
+    @conditional
     def get(self, student_id):
         """
         Fetches all courses enrolled by a specific student identified by student_id.
         """
-        student = Student.query.get(student_id)
-        if not student:
+        fields = course_serializer.parse_fields()
+        serialize = course_serializer.row_serializer(fields)
+        # One round trip: the student is the outer side of the joins, so an unknown student
+        # returns no row and a student without courses returns a single row of NULLs
+        stmt = (
+            course_serializer.select(fields)
+            .add_columns(*stamp_columns(Student, Course))
+            .select_from(Student)
+            .outerjoin(Enrollment, Enrollment.student_id == Student.student_id)
+            .outerjoin(Course, Course.course_id == Enrollment.course_id)
+            .where(Student.student_id == student_id)
+        )
+        rows = db.session.execute(stmt).all()
+        if not rows:
             return {'message': 'Student not found'}, 404
 
-        courses = Course.query.join(Enrollment).filter(Enrollment.student_id == student_id).all()
+        courses = [row for row in rows if row.course_id is not None]
         if not courses:
             return {'message': 'No courses enrolled by this student'}, 404
 
-        return {'courses_enrolled': [course.to_dict() for course in courses]}
+        record_collection_stamp(rows)
+        return {'courses_enrolled': [serialize(course) for course in courses]}
 
 # Define Resource for fetching students enrolled in a specific course
 class CourseStudentsResource(Resource):
+    def stamp(self, course_id):
+        """
+        Change stamp of the course and its enrolled students (see conditional.py).
+        """
+        return collection_stamp(
+            Course.course_id, course_id, Enrollment.course_id, Enrollment.student_id, Student.student_id
+        )
+
+    @conditional
     def get(self, course_id):
         """
         Fetches all students enrolled in a specific course identified by course_id.
         """
-        course = Course.query.get(course_id)
-        if not course:
+        fields = student_serializer.parse_fields()
+        serialize = student_serializer.row_serializer(fields)
+        # One round trip: the course is the outer side of the joins, so an unknown course
+        # returns no row and a course without students returns a single row of NULLs
+        stmt = (
+            student_serializer.select(fields)
+            .add_columns(*stamp_columns(Course, Student))
+            .select_from(Course)
+            .outerjoin(Enrollment, Enrollment.course_id == Course.course_id)
+            .outerjoin(Student, Student.student_id == Enrollment.student_id)
+            .where(Course.course_id == course_id)
+        )
+        rows = db.session.execute(stmt).all()
+        if not rows:
             return {'message': 'Course not found'}, 404
 
-        students = Student.query.join(Enrollment).filter(Enrollment.course_id == course_id).all()
+        students = [row for row in rows if row.student_id is not None]
         if not students:
             return {'message': 'No students enrolled in this course'}, 404
 
-        return {'students_enrolled': [student.to_dict() for student in students]}
+        record_collection_stamp(rows)
+        return {'students_enrolled': [serialize(student) for student in students]}
 
 # Define Resource for enrolling a student in a course
 class EnrollCourseResource(Resource):
     def post(self, student_id, course_id):
         """
         Enrolls a student identified by student_id in a course identified by course_id.
+        With ENROLLMENT_QUEUE set, the enrollment is queued and a ticket is returned (202).
         """
-        student = Student.query.get(student_id)
-        if not student:
-            return {'message': 'Student not found'}, 404
-
-        course = Course.query.get(course_id)
-        if not course:
-            return {'message': 'Course not found'}, 404
-
-        enrollment = Enrollment.query.filter_by(student_id=student_id, course_id=course_id).first()
-        if enrollment:
-            return {'message': 'Student already enrolled in this course'}, 400
-
-        new_enrollment = Enrollment(student_id=student_id, course_id=course_id)
-        db.session.add(new_enrollment)
-        db.session.commit()
-        return {'message': 'Enrolled successfully'}, 201
+        queue = enrollment_queue()
+        if queue is not None:
+            ticket_id = queue.submit(student_id, course_id)
+            return (
+                {'message': 'Enrollment queued', 'ticket_id': ticket_id, 'status': 'queued'},
+                202,
+                {'Location': f'/enrollments/tickets/{ticket_id}'},
+            )
+
+        code, message = enroll(student_id, course_id)
+        return {'message': message}, code
+
+# Define Resource for polling a queued enrollment
+class EnrollmentTicketResource(Resource):
+    def get(self, ticket_id):
+        """
+        Returns the state of a queued enrollment: 'queued', 'processing', or 'done' with the
+        code and message the direct enrollment would have answered.
+        """
+        queue = enrollment_queue()
+        ticket = queue.get(ticket_id) if queue is not None else None
+        if ticket is None:
+            return {'message': 'Ticket not found'}, 404
+        return {'ticket': ticket}
 
 # Define Resource for deleting a student's enrollment in a course
 class DeleteEnrollmentResource(Resource):
@@ -570,49 +855,110 @@ class DeleteEnrollmentResource(Resource):
         """
         Deletes the enrollment of a student identified by student_id in a course identified by course_id.
         """
-        enrollment = Enrollment.query.filter_by(student_id=student_id, course_id=course_id).first()
-        if not enrollment:
+        deleted = db.session.execute(
+            delete(Enrollment).where(Enrollment.student_id == student_id, Enrollment.course_id == course_id),
+            execution_options={'synchronize_session': False},
+        ).rowcount
+        if not deleted:
             return {'message': 'Enrollment not found'}, 404
 
-        db.session.delete(enrollment)
         db.session.commit()
         return {'message': 'Enrollment deleted successfully'}, 204
 
 # Define Resource for fetching all courses or searching for courses by name
 class CourseListResource(Resource):
+    @cached('courses')
     def get(self):
         """
         Fetches all courses or searches for courses by name.
         """
         parser = reqparse.RequestParser()
-        parser.add_argument('name', type=str, help='Search courses by name')
+        parser.add_argument('name', type=str, location='args', help='Search courses by name')
 
         args = parser.parse_args()
         course_name = args.get('name')
 
+        fields = course_serializer.parse_fields()
+        serialize = course_serializer.row_serializer(fields)
+        stmt = course_serializer.select(fields)
+
         if course_name:
-            courses = Course.query.filter(Course.course_name.ilike(f'%{course_name}%')).all()
-            if not courses:
+            body = search_page('courses', stmt, course_name, serialize)
+            if not body['courses']:
                 return {'message': 'No courses found with that name'}, 404
-            return {'courses': [course.to_dict() for course in courses]}
+            return body
+
+        courses = db.session.execute(stmt).all()
+        return {'courses': [serialize(course) for course in courses]}
+
 
-        courses = Course.query.all()
-        return {'courses': [course.to_dict() for course in courses]}
+class CourseStatsResource(Resource):
+    @cached('courses')
+    def get(self):
+        """
+        Returns enrollment totals, capacity fill and the ?top= (default 10) most popular courses.
+        Reads the maintained courses.student_count counters in one query: window aggregates
+        compute the totals over all courses before the LIMIT keeps the top rows.
+        """
+        top = min(max(request.args.get('top', 10, type=int), 1), 100)
+        limited = Course.capacity.isnot(None)
+        stmt = (
+            select(
+                Course.course_id, Course.course_name, Course.student_count, Course.capacity,
+                func.count().over().label('total_courses'),
+                func.sum(Course.student_count).over().label('total_enrollments'),
+                func.sum(Course.capacity).over().label('total_capacity'),
+                func.sum(case((limited, Course.student_count), else_=0)).over().label('enrolled_in_limited'),
+                func.sum(case((Course.student_count >= Course.capacity, 1), else_=0)).over().label('full_courses'),
+            )
+            .order_by(Course.student_count.desc(), Course.course_id)
+            .limit(top)
+        )
+        rows = db.session.execute(stmt).all()
+
+        first = rows[0] if rows else None
+        total_courses = first.total_courses if first else 0
+        total_enrollments = int(first.total_enrollments or 0) if first else 0
+        total_capacity = int(first.total_capacity or 0) if first else 0
+        enrolled_in_limited = int(first.enrolled_in_limited or 0) if first else 0
+        return {
+            'courses': total_courses,
+            'enrollments': total_enrollments,
+            'average_students_per_course': total_enrollments / total_courses if total_courses else 0,
+            'capacity': total_capacity,
+            'capacity_fill': enrolled_in_limited / total_capacity if total_capacity else None,
+            'full_courses': int(first.full_courses or 0) if first else 0,
+            'top_courses': [
+                {
+                    'course_id': row.course_id,
+                    'course_name': row.course_name,
+                    'student_count': row.student_count,
+                    'capacity': row.capacity,
+                    'fill': row.student_count / row.capacity if row.capacity else None,
+                }
+                for row in rows
+            ],
+        }
 
 # # Add Resource endpoints to API
 api.add_resource(StudentCoursesResource, '/students/<int:student_id>/std_courses')
 api.add_resource(CourseStudentsResource, '/courses/<int:course_id>/students')
 api.add_resource(EnrollCourseResource, '/students/<int:student_id>/enroll/<int:course_id>')
 api.add_resource(DeleteEnrollmentResource, '/students/<int:student_id>/enroll/<int:course_id>')
-api.add_resource(CourseListResource, '/courses', '/courses/search')
+api.add_resource(EnrollmentTicketResource, '/enrollments/tickets/<int:ticket_id>')
+api.add_resource(CourseListResource, '/courses/search')
+api.add_resource(CourseStatsResource, '/courses/stats')
 
 # Endpoint details:
 # - GET /students/<student_id>/courses: Fetches all courses enrolled by a specific student
 # - GET /courses/<course_id>/students: Fetches all students enrolled in a specific course
-# - POST /students/<student_id>/enroll/<course_id>: Enrolls a student in a course
+# - POST /students/<student_id>/enroll/<course_id>: Enrolls a student in a course; with ENROLLMENT_QUEUE set,
+#   queues the enrollment and answers 202 with a ticket_id (see enrollments.py)
+# - GET /enrollments/tickets/<ticket_id>: State and outcome of a queued enrollment
 # - DELETE /students/<student_id>/enroll/<course_id>: Deletes a student's enrollment in a course
-# - GET /courses: Fetches all courses
 # - GET /courses/search?name=<name>: Searches for courses by name
+# - GET /courses/stats?top=<n>: Enrollment totals, capacity fill and the n most popular courses
+# The per-student and per-course lists send ETag and Last-Modified and answer conditional requests with 304.
 
 
 #_____________________________________________________________________________________________________
@@ -620,19 +966,42 @@ api.add_resource(CourseListResource, '/courses', '/courses/search')
 
 # Define Resource for fetching courses taught by a specific teacher
 class TeacherCoursesResource(Resource):
+    def stamp(self, teacher_id):
+        """
+        Change stamp of the teacher and the courses assigned to it (see conditional.py).
+        """
+        return collection_stamp(
+            Teacher.teacher_id, teacher_id, TeacherCourse.teacher_id, TeacherCourse.course_id, Course.course_id
+        )
+
+    @cached('teachers', 'teacher_courses', 'courses')
+    @conditional
     def get(self, teacher_id):
         """
         Fetches all courses taught by a specific teacher identified by teacher_id.
         """
-        teacher = Teacher.query.get(teacher_id)
-        if not teacher:
+        fields = course_serializer.parse_fields()
+        serialize = course_serializer.row_serializer(fields)
+        # One round trip: the teacher is the outer side of the joins, so an unknown teacher
+        # returns no row and a teacher without courses returns a single row of NULLs
+        stmt = (
+            course_serializer.select(fields)
+            .add_columns(*stamp_columns(Teacher, Course))
+            .select_from(Teacher)
+            .outerjoin(TeacherCourse, TeacherCourse.teacher_id == Teacher.teacher_id)
+            .outerjoin(Course, Course.course_id == TeacherCourse.course_id)
+            .where(Teacher.teacher_id == teacher_id)
+        )
+        rows = db.session.execute(stmt).all()
+        if not rows:
             return {'message': 'Teacher not found'}, 404
 
-        courses = Course.query.join(TeacherCourse).filter(TeacherCourse.teacher_id == teacher_id).all()
+        courses = [row for row in rows if row.course_id is not None]
         if not courses:
             return {'message': 'No courses taught by this teacher'}, 404
 
-        return {'courses_taught': [course.to_dict() for course in courses]}
+        record_collection_stamp(rows)
+        return {'courses_taught': [serialize(course) for course in courses]}
 
 # Define Resource for assigning a course to a teacher
 class AssignCourseResource(Resource):
@@ -640,20 +1009,25 @@ class AssignCourseResource(Resource):
         """
         Assigns a course identified by course_id to a teacher identified by teacher_id.
         """
-        teacher = Teacher.query.get(teacher_id)
-        if not teacher:
-            return {'message': 'Teacher not found'}, 404
-
-        course = Course.query.get(course_id)
-        if not course:
-            return {'message': 'Course not found'}, 404
-
-        teacher_course = TeacherCourse.query.filter_by(teacher_id=teacher_id, course_id=course_id).first()
-        if teacher_course:
+        teacher_course_id = insert_link(
+            TeacherCourse, TeacherCourse.teacher_course_id,
+            {'teacher_id': teacher_id, 'course_id': course_id},
+            parents=[(Teacher.teacher_id, teacher_id), (Course.course_id, course_id)],
+            conflict_columns=['teacher_id', 'course_id'],
+        )
+        if teacher_course_id is None:
+            db.session.rollback()
+            # Nothing was inserted: work out why with one probe query
+            teacher_exists, course_exists = db.session.execute(select(
+                exists().where(Teacher.teacher_id == teacher_id),
+                exists().where(Course.course_id == course_id),
+            )).one()
+            if not teacher_exists:
+                return {'message': 'Teacher not found'}, 404
+            if not course_exists:
+                return {'message': 'Course not found'}, 404
             return {'message': 'Teacher already assigned to this course'}, 400
 
-        new_teacher_course = TeacherCourse(teacher_id=teacher_id, course_id=course_id)
-        db.session.add(new_teacher_course)
         db.session.commit()
         return {'message': 'Course assigned successfully'}, 201
 
@@ -663,40 +1037,116 @@ class WithdrawCourseResource(Resource):
         """
         Withdraws the course identified by course_id from the teacher identified by teacher_id.
         """
-        teacher_course = TeacherCourse.query.filter_by(teacher_id=teacher_id, course_id=course_id).first()
-        if not teacher_course:
+        withdrawn = db.session.execute(
+            delete(TeacherCourse).where(TeacherCourse.teacher_id == teacher_id, TeacherCourse.course_id == course_id),
+            execution_options={'synchronize_session': False},
+        ).rowcount
+        if not withdrawn:
             return {'message': 'Teacher not assigned to this course'}, 404
 
-        db.session.delete(teacher_course)
         db.session.commit()
         return {'message': 'Course withdrawn successfully'}, 204
 
-# Define Resource for fetching all teachers and their courses
-class TeacherListResource(Resource):
-    def get(self):
-        """
-        Fetches all teachers and their assigned courses.
-        """
-        teachers = Teacher.query.all()
-        return {'teachers': [teacher.to_dict() for teacher in teachers]}
-
 # Add Resource endpoints to API
 api.add_resource(TeacherCoursesResource, '/teachers/<int:teacher_id>/courses')
 api.add_resource(AssignCourseResource, '/teachers/<int:teacher_id>/assign/<int:course_id>')
 api.add_resource(WithdrawCourseResource, '/teachers/<int:teacher_id>/withdraw/<int:course_id>')
-api.add_resource(TeacherListResource, '/teachers')
 
 # Endpoint details:
 # - GET /teachers/<teacher_id>/courses: Fetches all courses taught by a specific teacher
+#   (sends ETag and Last-Modified; conditional requests get 304 when unchanged)
 # - POST /teachers/<teacher_id>/assign/<course_id>: Assigns a course to a specific teacher
 # - DELETE /teachers/<teacher_id>/withdraw/<course_id>: Withdraws a course from a specific teacher
-# - GET /teachers: Fetches all teachers and their assigned courses
 
 
 
 
 
 
+#_____________________________________________________________________________________________________
+
+# --------------------------Bulk RESOURCES--------------------------------------------------
+
+# Add Resource endpoints to API
+api.add_resource(BulkStudentsResource, '/students/bulk')
+api.add_resource(BulkCoursesResource, '/courses/bulk')
+api.add_resource(BulkEnrollmentsResource, '/enrollments/bulk')
+
+# Endpoint details (bodies are JSON arrays, or NDJSON with Content-Type: application/x-ndjson):
+# - POST /students/bulk: Creates students, e.g. [{"name": ..., "date_of_birth": "2004-01-31", "email": ..., "reg_no": ...}]
+# - PUT /students/bulk: Updates students, e.g. [{"student_id": 1, "email": ...}]
+# - DELETE /students/bulk: Deletes students and their enrollments, e.g. [1, 2, 3]
+# - POST/PUT/DELETE /courses/bulk: Same for courses
+# - POST /enrollments/bulk: Enrolls students, e.g. [{"student_id": 1, "course_id": 2}]
+# - DELETE /enrollments/bulk: Deletes enrollments, same body as POST
+# Every response lists one result per input row; the status is 207 if any row failed.
+
+
+# --------------------------Batch RESOURCES--------------------------------------------------
+
+# Add Resource endpoints to API
+api.add_resource(BatchResource, '/batch')
+
+# Endpoint details:
+# - POST /batch: Runs up to BATCH_MAX_REQUESTS GET sub-requests in one request and one database session,
+#   e.g. {"requests": ["/students?ids=1,2", {"path": "/courses/7", "headers": {"If-None-Match": ...}}]};
+#   answers {"responses": [{"path", "status", "headers", "body"}, ...]} in the same order
+
+
+# --------------------------Export RESOURCES--------------------------------------------------
+
+# Add Resource endpoints to API
+api.add_resource(EnrollmentExportResource, '/exports/enrollments')
+
+# Endpoint details:
+# - GET /exports/enrollments: Streams every enrollment with its student, course and teachers as ?format=csv
+#   (default), ndjson or parquet; filters ?course_id=, ?teacher_id=, ?since=<ISO 8601 time> (made, or student
+#   changed, since); ?after=<enrollment_id> resumes an interrupted export (see exports.py)
+
+
+# --------------------------Import RESOURCES--------------------------------------------------
+
+# Add Resource endpoints to API
+api.add_resource(ImportResource, '/imports/<string:kind>')
+
+# Endpoint details (bodies are CSV files with a header line, Content-Type: text/csv):
+# - POST /imports/students: Creates students from the columns name, date_of_birth, email, reg_no and
+#   optionally course_ids (e.g. "3;7") to enroll them
+# - POST /imports/enrollments: Enrolls existing students from the columns reg_no, course_id
+# The valid rows are loaded in one transaction; the response lists the invalid rows by line (status 207
+# if any) and the time spent validating, staging and merging (see imports.py)
+
+
+# --------------------------Report RESOURCES--------------------------------------------------
+
+# Add Resource endpoints to API
+api.add_resource(TeacherStudentsReportResource, '/reports/teachers/<int:teacher_id>/students')
+api.add_resource(CoEnrollmentReportResource, '/reports/courses/<int:course_id>/co-enrollment')
+api.add_resource(TeacherLoadReportResource, '/reports/teacher-load')
+
+# Endpoint details (read from the report tables maintained by triggers, see models.py):
+# - GET /reports/teachers/<teacher_id>/students: Students taught by a teacher, with the number of its
+#   courses each one takes (shared_courses); keyset paginated with ?limit= and ?after=
+# - GET /reports/courses/<course_id>/co-enrollment: Courses sharing students with a course, most shared
+#   first (shared_students), up to ?limit=
+# - GET /reports/teacher-load: Every teacher with course_count, student_count (distinct students) and
+#   enrollment_count (enrollments in its courses); keyset paginated
+
+
+# --------------------------Metrics RESOURCES--------------------------------------------------
+
+# Add Resource endpoints to API
+api.add_resource(MetricsResource, '/metrics')
+api.add_resource(PoolMetricsResource, '/metrics/pool')
+
+# Endpoint details:
+# - GET /metrics: Prometheus text format: request latency and count per endpoint, SQL statements per
+#   request and statement durations (sampled, METRICS_SAMPLE_RATE), slow queries, pool gauges
+# - GET /metrics/pool: Connection pool size, checked out connections, saturation, connect/close/invalidate
+#   counts and checkout wait times of the worker that answers (each gunicorn worker has its own pool)
+
+
 # --------------------------Main entry point--------------------------------------------------
 if __name__ == '__main__':
+    app = create_app()
     app.run(port=os.getenv('FLASK_RUN_PORT', 5555), debug=app.config['DEBUG'])
@@ -0,0 +1,135 @@
+"""
+Async serving mode: the same Flask app and routes, served by an ASGI server on an asyncio
+database engine (asyncpg on PostgreSQL, aiosqlite on SQLite).
+
+    uvicorn asgi:create_asgi_app --factory --port 5555 --workers 2
+
+Each request runs the unchanged Flask-RESTful resources inside a greenlet (SQLAlchemy's
+greenlet_spawn). The app's engine is the sync facade of an AsyncEngine (SQLALCHEMY_ASYNC, see
+models.AppSQLAlchemy), so whenever a resource waits for the database its greenlet yields to the
+event loop and other requests run. One worker can therefore keep many requests waiting on the
+database at once, limited by the connection pool rather than by threads.
+
+Code called by the resources must not block on anything but the database: Flask contexts are
+context variables and follow each greenlet, but a threading lock held across a query, or a
+blocking network client (e.g. the 'redis' cache backend), stalls every request of the worker.
+"""
+import io
+import sys
+from sqlalchemy.util import await_only, greenlet_spawn
+from app import create_app
+from models import db
+
+
+def build_environ(scope, body):
+    """
+    WSGI environ (PEP 3333) for an ASGI HTTP `scope` and its request `body`.
+    """
+    server_name, server_port = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf8').decode('latin1'),
+        'PATH_INFO': scope['path'].encode('utf8').decode('latin1'),
+        'QUERY_STRING': scope['query_string'].decode('latin1'),
+        'SERVER_NAME': server_name,
+        'SERVER_PORT': str(server_port),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': (scope.get('client') or ('', 0))[0],
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': False,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for raw_name, raw_value in scope['headers']:
+        name = raw_name.decode('latin1').upper().replace('-', '_')
+        value = raw_value.decode('latin1')
+        if name == 'CONTENT_TYPE':
+            environ['CONTENT_TYPE'] = value
+        elif name == 'CONTENT_LENGTH':
+            environ['CONTENT_LENGTH'] = value
+        else:
+            key = f'HTTP_{name}'
+            environ[key] = f'{environ[key]},{value}' if key in environ else value
+    return environ
+
+
+class GreenletWSGIAdapter:
+    """
+    ASGI application that runs a WSGI app in a greenlet per request. Response chunks are sent as
+    the WSGI iterable yields them, so streamed responses (?format=ndjson) stay streamed.
+    """
+
+    def __init__(self, wsgi_app, on_shutdown=None):
+        self.wsgi_app = wsgi_app
+        self.on_shutdown = on_shutdown
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            raise NotImplementedError(f"Unsupported ASGI scope {scope['type']!r}")
+
+        body = bytearray()
+        while True:
+            message = await receive()
+            body += message.get('body', b'')
+            if not message.get('more_body'):
+                break
+        await greenlet_spawn(self._respond, build_environ(scope, bytes(body)), send)
+
+    def _respond(self, environ, send):
+        # Runs in the request greenlet: await_only() suspends it until `send` has completed
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            response['status'] = int(status.split(' ', 1)[0])
+            response['headers'] = [(name.lower().encode('latin1'), value.encode('latin1')) for name, value in headers]
+
+        result = self.wsgi_app(environ, start_response)
+        try:
+            chunks = iter(result)
+            # Flask calls start_response before returning; a generator may only call it on the first chunk
+            first = next(chunks, b'')
+            await_only(send({'type': 'http.response.start', 'status': response['status'], 'headers': response['headers']}))
+            if first:
+                await_only(send({'type': 'http.response.body', 'body': first, 'more_body': True}))
+            for chunk in chunks:
+                if chunk:
+                    await_only(send({'type': 'http.response.body', 'body': chunk, 'more_body': True}))
+            await_only(send({'type': 'http.response.body', 'body': b'', 'more_body': False}))
+        finally:
+            close = getattr(result, 'close', None)
+            if close is not None:
+                close()
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                if self.on_shutdown is not None:
+                    await self.on_shutdown()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+def create_asgi_app(config=None, **settings):
+    """
+    ASGI application factory: create_app() on an asyncio engine, wrapped for an ASGI server.
+    Takes the same arguments as create_app().
+    """
+    settings['SQLALCHEMY_ASYNC'] = True
+    app = create_app(config, **settings)
+
+    async def dispose_engines():
+        with app.app_context():
+            engines = list(db.engines.values())
+        for engine in engines:
+            await greenlet_spawn(engine.dispose)
+
+    return GreenletWSGIAdapter(app, on_shutdown=dispose_engines)
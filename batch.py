@@ -0,0 +1,96 @@
+"""
+POST /batch: several GET sub-requests answered in one HTTP request.
+
+    {"requests": ["/students?ids=1,2,3", {"path": "/courses/7", "headers": {"If-None-Match": "\\"...\\""}}]}
+
+Each sub-request is dispatched to its resource in a request context nested in the /batch one,
+so they all run in the same app context, with the same database session and connection.
+The before/after request hooks (metrics, compression) run once, for the /batch request.
+Entries are read whole into the batch response, so streamed responses (?format=ndjson lists,
+exports) are refused with a 400 entry: request them on their own.
+"""
+import json
+from flask import current_app, request
+from flask_restful import Resource, abort
+from werkzeug.exceptions import HTTPException
+from pagination import wants_ndjson
+
+# Headers of a sub-response copied into its entry
+FORWARDED_HEADERS = ('ETag', 'Last-Modified', 'Location')
+# Request headers a sub-request may set
+ALLOWED_HEADERS = {'if-none-match', 'if-modified-since'}
+
+
+def read_batch():
+    """
+    Reads the sub-requests of the body as (path, headers) pairs. Aborts with 400 if the body is
+    not a list of paths or {"path": ..., "headers": {...}} objects, or holds more than BATCH_MAX_REQUESTS.
+    """
+    body = request.get_json(silent=True)
+    items = body.get('requests') if isinstance(body, dict) else None
+    if not isinstance(items, list):
+        abort(400, message='Expected {"requests": [...]}')
+    max_requests = current_app.config['BATCH_MAX_REQUESTS']
+    if len(items) > max_requests:
+        abort(400, message=f'At most {max_requests} requests per batch')
+
+    subrequests = []
+    for index, item in enumerate(items):
+        if isinstance(item, str):
+            item = {'path': item}
+        path = item.get('path') if isinstance(item, dict) else None
+        headers = item.get('headers', {}) if isinstance(item, dict) else None
+        if not isinstance(path, str) or not path.startswith('/') or not isinstance(headers, dict):
+            abort(400, message=f'Request {index}: expected a path or {{"path": ..., "headers": {{...}}}}')
+        if path.split('?', 1)[0].rstrip('/') == '/batch':
+            abort(400, message=f'Request {index}: batches cannot be nested')
+        unknown = [name for name in headers if name.lower() not in ALLOWED_HEADERS]
+        if unknown:
+            abort(400, message=f'Request {index}: unsupported headers {", ".join(unknown)}')
+        subrequests.append((path, headers))
+    return subrequests
+
+
+def refused(path, message):
+    """
+    The 400 entry of a sub-request the batch does not run.
+    """
+    return {'path': path, 'status': 400, 'headers': {}, 'body': {'message': message}}
+
+
+def dispatch(path, headers):
+    """
+    Runs GET `path` in a nested request context and returns its entry of the batch response.
+    """
+    app = current_app._get_current_object()
+    with app.test_request_context(path, method='GET', headers=headers):
+        if wants_ndjson():
+            return refused(path, 'NDJSON streams are not available in a batch')
+        try:
+            response = app.make_response(app.dispatch_request())
+        except HTTPException as error:
+            response = app.make_response(app.handle_user_exception(error))
+        if response.is_streamed:
+            response.close()
+            return refused(path, 'Streamed responses are not available in a batch')
+        data = response.get_data(as_text=True)
+
+    if response.mimetype == 'application/json' and data:
+        body = json.loads(data)
+    else:
+        body = data or None
+    return {
+        'path': path,
+        'status': response.status_code,
+        'headers': {name: response.headers[name] for name in FORWARDED_HEADERS if name in response.headers},
+        'body': body,
+    }
+
+
+class BatchResource(Resource):
+    def post(self):
+        """
+        Answers the GET sub-requests of the body in order, one entry per request.
+        The batch itself is 200 even when sub-requests fail; see each entry's status.
+        """
+        return {'responses': [dispatch(path, headers) for path, headers in read_batch()]}
@@ -0,0 +1,83 @@
+"""
+Latency of student lookups while other threads loop on whole-list NDJSON streams of the students,
+without and with admission control (ADMISSION_MAX_COST), plus the streams it shed.
+
+    python -m benchmarks.bench_admission [--students 20000] [--flooders 8] [--seconds 5]
+
+Runs on a temporary SQLite file by default; set BENCH_DATABASE_URI to use PostgreSQL.
+"""
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+from benchmarks.common import make_app, populate
+from models import db
+
+
+def run(app, students, flooders, seconds):
+    stop = threading.Event()
+    shed = [0]
+
+    def flood():
+        client = app.test_client()
+        while not stop.is_set():
+            with client.get('/students?format=ndjson') as response:
+                response.get_data()
+            if response.status_code == 503:
+                shed[0] += 1
+                time.sleep(0.01)
+
+    threads = [threading.Thread(target=flood) for _ in range(flooders)]
+    for thread in threads:
+        thread.start()
+    client = app.test_client()
+    latencies = []
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        response = client.get(f'/students?student_id={random.randint(1, students)}')
+        latencies.append(time.perf_counter() - start)
+        assert response.status_code == 200, response.status_code
+    stop.set()
+    for thread in threads:
+        thread.join()
+    latencies.sort()
+    return latencies, shed[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--students', type=int, default=20000)
+    parser.add_argument('--flooders', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        uri = os.environ.get('BENCH_DATABASE_URI') or f'sqlite:///{workdir}/admission.db'
+        setup = make_app(uri)
+        with setup.app_context():
+            db.drop_all()
+            db.create_all()
+            populate(students=args.students, courses=10, enrollments_per_student=1)
+            db.session.remove()
+            db.engine.dispose()
+
+        print(f'{"admission":<12} {"lookups":>8} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} {"shed":>6}')
+        for capacity in (0, 120):
+            app = make_app(uri, METRICS_SAMPLE_RATE=0.0, CACHE_BACKEND='null', ADMISSION_MAX_COST=capacity)
+            latencies, shed = run(app, args.students, args.flooders, args.seconds)
+
+            def percentile(share):
+                return latencies[min(len(latencies) - 1, int(len(latencies) * share))] * 1000
+
+            label = str(capacity) if capacity else 'off'
+            print(f'{label:<12} {len(latencies):>8} {percentile(0.5):>8.1f} {percentile(0.95):>8.1f} '
+                  f'{percentile(0.99):>8.1f} {shed:>6}')
+            with app.app_context():
+                db.engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+"""
+Compares how many concurrent requests the sync (gunicorn threads) and async (uvicorn, asgi.py)
+serving modes sustain while every SQL statement waits on the database.
+
+    python -m benchmarks.bench_async [--latency-ms 50] [--threads 8] [--duration 5]
+
+Both servers run one worker process on the same SQLite file, with the same 20-connection pool.
+Each statement is delayed by --latency-ms to stand in for the network round trip to PostgreSQL
+(time.sleep in the sync server, asyncio.sleep in the async one). Against a real PostgreSQL
+server, set BENCH_DATABASE_URI and --latency-ms 0.
+"""
+import argparse
+import asyncio
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import event
+from sqlalchemy.util import await_only
+from benchmarks.common import make_app, populate
+from models import db
+
+URLS = ['/student-profiles/{n}', '/courses?course_id={c}', '/students/{n}/std_courses', '/students?student_id={n}']
+STUDENTS = 5000
+COURSES = 50
+
+
+def _settings():
+    return {
+        'SQLALCHEMY_DATABASE_URI': os.environ['BENCH_DATABASE_URI'],
+        'SQLALCHEMY_ENGINE_OPTIONS': {'pool_size': 20, 'max_overflow': 0, 'pool_timeout': 60},
+        'METRICS_SAMPLE_RATE': 0.0,
+    }
+
+
+def _inject_latency(app):
+    seconds = float(os.environ.get('BENCH_DB_LATENCY_MS', 0)) / 1000
+    if not seconds:
+        return
+    with app.app_context():
+        engine = db.engine
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def delay(*args):
+        if engine.dialect.is_async:
+            await_only(asyncio.sleep(seconds))
+        else:
+            time.sleep(seconds)
+
+
+def sync_app():
+    """
+    gunicorn 'benchmarks.bench_async:sync_app()'
+    """
+    from app import create_app
+    app = create_app('config.TestingConfig', **_settings())
+    _inject_latency(app)
+    return app
+
+
+def async_app():
+    """
+    uvicorn benchmarks.bench_async:async_app --factory
+    """
+    from asgi import create_asgi_app
+    adapter = create_asgi_app('config.TestingConfig', **_settings())
+    _inject_latency(adapter.wsgi_app)
+    return adapter
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _wait_until_up(url, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'server exited with status {process.returncode}')
+        try:
+            urllib.request.urlopen(url + '/courses?course_id=1', timeout=1).read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f'server at {url} did not start')
+
+
+def _drive(url, clients, duration):
+    latencies = []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def client(index):
+        rng = random.Random(index)
+        local = []
+        while time.perf_counter() < deadline:
+            path = rng.choice(URLS).format(n=rng.randint(1, STUDENTS), c=rng.randint(1, COURSES))
+            start = time.perf_counter()
+            try:
+                urllib.request.urlopen(url + path, timeout=60).read()
+            except urllib.error.HTTPError:
+                pass
+            local.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(local)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(clients) as pool:
+        list(pool.map(client, range(clients)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return len(latencies) / elapsed, latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--latency-ms', type=float, default=50)
+    parser.add_argument('--threads', type=int, default=8, help='threads of the sync gunicorn worker')
+    parser.add_argument('--duration', type=float, default=5, help='seconds per measurement')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32, 64])
+    args = parser.parse_args()
+
+    db_file = None
+    if 'BENCH_DATABASE_URI' not in os.environ:
+        db_file = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+        os.environ['BENCH_DATABASE_URI'] = f'sqlite:///{db_file.name}'
+        app = make_app(os.environ['BENCH_DATABASE_URI'])
+        with app.app_context():
+            populate(students=STUDENTS, courses=COURSES)
+    os.environ['BENCH_DB_LATENCY_MS'] = str(args.latency_ms)
+
+    modes = {
+        f'sync ({args.threads} threads)': [
+            sys.executable, '-m', 'gunicorn', '--workers', '1', '--threads', str(args.threads),
+            '--log-level', 'warning', '--bind', '127.0.0.1:{port}', 'benchmarks.bench_async:sync_app()',
+        ],
+        'async (uvicorn)': [
+            sys.executable, '-m', 'uvicorn', 'benchmarks.bench_async:async_app', '--factory',
+            '--log-level', 'warning', '--port', '{port}',
+        ],
+    }
+    print(f'{args.latency_ms:g} ms per statement')
+    print(f'{"mode":<20} {"clients":>7} {"req/s":>8} {"p50 ms":>8} {"p99 ms":>8}')
+    try:
+        for mode, command in modes.items():
+            port = _free_port()
+            process = subprocess.Popen([part.format(port=port) for part in command])
+            url = f'http://127.0.0.1:{port}'
+            try:
+                _wait_until_up(url, process)
+                for clients in args.concurrency:
+                    rate, p50, p99 = _drive(url, clients, args.duration)
+                    print(f'{mode:<20} {clients:>7} {rate:>8.0f} {p50 * 1000:>8.1f} {p99 * 1000:>8.1f}')
+            finally:
+                process.terminate()
+                process.wait()
+    finally:
+        if db_file is not None:
+            os.unlink(db_file.name)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""
+Compares loading students and enrollments one request per row with the bulk endpoints.
+
+    python -m benchmarks.bench_bulk [rows]
+
+Uses a temporary SQLite file so every commit really reaches the disk, as it would in production.
+"""
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.common import make_app
+from models import db, Course
+
+
+def student(prefix, i):
+    return {
+        'name': f'Student {prefix}{i}',
+        'date_of_birth': '2004-05-06',
+        'email': f'{prefix}{i}@example.com',
+        'reg_no': f'{prefix}-{i:08d}',
+    }
+
+
+def rate(label, rows, seconds):
+    print(f'{label:<28} {rows:>7} rows {seconds:8.2f} s {rows / seconds:10.0f} rows/s')
+    return rows / seconds
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    db_file = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+    app = make_app(f'sqlite:///{db_file.name}')
+    client = app.test_client()
+    with app.app_context():
+        db.session.add_all([Course(course_name=f'Course {i}') for i in range(10)])
+        db.session.commit()
+
+    start = time.perf_counter()
+    ids = [client.post('/students', json=student('single', i)).json['student_id'] for i in range(rows)]
+    single_students = rate('POST /students', rows, time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for i, student_id in enumerate(ids):
+        client.post(f'/students/{student_id}/enroll/{1 + i % 10}')
+    single_enrollments = rate('POST .../enroll/<course_id>', rows, time.perf_counter() - start)
+
+    start = time.perf_counter()
+    response = client.post('/students/bulk', json=[student('bulk', i) for i in range(rows)])
+    ids = [result['student_id'] for result in response.json['results']]
+    bulk_students = rate('POST /students/bulk', rows, time.perf_counter() - start)
+
+    start = time.perf_counter()
+    client.post('/enrollments/bulk', json=[
+        {'student_id': student_id, 'course_id': 1 + i % 10} for i, student_id in enumerate(ids)
+    ])
+    bulk_enrollments = rate('POST /enrollments/bulk', rows, time.perf_counter() - start)
+
+    print(f'students speedup:    {bulk_students / single_students:6.0f}x')
+    print(f'enrollments speedup: {bulk_enrollments / single_enrollments:6.0f}x')
+    os.unlink(db_file.name)
+
+
+if __name__ == '__main__':
+    main()
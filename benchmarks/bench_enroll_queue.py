@@ -0,0 +1,80 @@
+"""
+Sustained enrollment throughput, direct (a transaction per request) against the write-behind
+queue (enrollments.py), with concurrent clients hitting a few popular courses.
+
+    python -m benchmarks.bench_enroll_queue [--requests 5000] [--threads 16] [--courses 5]
+
+Runs on a temporary SQLite file by default; set BENCH_DATABASE_URI to a PostgreSQL database to
+measure row contention for real. Queued throughput is counted until every ticket is done, and
+both modes are checked for lost or duplicated enrollments.
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import func, select
+from benchmarks.common import make_app, populate
+from models import db, Enrollment
+
+STUDENTS = 20000
+
+
+def run(mode, args, workdir):
+    uri = os.environ.get('BENCH_DATABASE_URI') or f'sqlite:///{workdir}/{mode}.db'
+    settings = {'METRICS_SAMPLE_RATE': 0.0, 'CACHE_BACKEND': 'null'}
+    if mode != 'direct':
+        settings.update(ENROLLMENT_QUEUE=mode, ENROLLMENT_QUEUE_PATH=f'{workdir}/{mode}-queue.sqlite3')
+    app = make_app(uri, **settings)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        populate(students=STUDENTS, courses=args.courses, enrollments_per_student=0)
+
+    rng = random.Random(1)
+    # Some requests repeat an earlier pair: they must be answered "already enrolled", not inserted twice
+    pairs = [(rng.randint(1, STUDENTS), rng.randint(1, args.courses)) for _ in range(args.requests)]
+    expected = len(set(pairs))
+
+    def enroll(pair):
+        response = app.test_client().post(f'/students/{pair[0]}/enroll/{pair[1]}')
+        return response.json.get('ticket_id')
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(args.threads) as pool:
+        tickets = [ticket for ticket in pool.map(enroll, pairs) if ticket is not None]
+    accepted = time.perf_counter() - start
+    if tickets:
+        client = app.test_client()
+        while any(client.get(f'/enrollments/tickets/{t}').json['ticket']['status'] != 'done' for t in tickets):
+            time.sleep(0.01)
+    elapsed = time.perf_counter() - start
+
+    with app.app_context():
+        enrollments = db.session.execute(select(func.count()).select_from(Enrollment)).scalar()
+        db.session.remove()
+        db.engine.dispose()
+    status = 'ok' if enrollments == expected else f'MISMATCH (expected {expected})'
+    print(
+        f'{mode:<8} {args.requests / elapsed:>10,.0f} {args.requests / accepted:>12,.0f} '
+        f'{enrollments:>12,}  {status}'
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--courses', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f'{args.requests} enrollments, {args.threads} client threads, {args.courses} courses')
+    print(f'{"mode":<8} {"enrolled/s":>10} {"accepted/s":>12} {"enrollments":>12}')
+    with tempfile.TemporaryDirectory() as workdir:
+        for mode in ('direct', 'memory', 'sqlite'):
+            run(mode, args, workdir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+"""
+Throughput and peak Python memory of GET /exports/enrollments per format, at two data sizes:
+memory should stay flat as the export grows (exports.py streams it batch by batch).
+
+    python -m benchmarks.bench_export [--students 20000] [--enrollments-per-student 3]
+
+Runs on a temporary SQLite file by default; set BENCH_DATABASE_URI to use PostgreSQL.
+"""
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+from benchmarks.common import make_app, populate
+from models import db
+
+
+def measure(app, fmt):
+    client = app.test_client()
+    tracemalloc.start()
+    start = time.perf_counter()
+    response = client.get(f'/exports/enrollments?format={fmt}', buffered=False)
+    size = sum(len(chunk) for chunk in response.response)
+    response.close()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return size, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--students', type=int, default=20000)
+    parser.add_argument('--enrollments-per-student', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f'{"rows":>9} {"format":<8} {"MB":>8} {"rows/s":>10} {"peak MB":>8}')
+    with tempfile.TemporaryDirectory() as workdir:
+        for students in (args.students // 10, args.students):
+            uri = os.environ.get('BENCH_DATABASE_URI') or f'sqlite:///{workdir}/export-{students}.db'
+            app = make_app(uri, METRICS_SAMPLE_RATE=0.0)
+            with app.app_context():
+                db.drop_all()
+                db.create_all()
+                populate(students=students, courses=50, enrollments_per_student=args.enrollments_per_student)
+            rows = students * args.enrollments_per_student
+            for fmt in ('csv', 'ndjson', 'parquet'):
+                size, elapsed, peak = measure(app, fmt)
+                print(f'{rows:>9,} {fmt:<8} {size / 1e6:>8.1f} {rows / elapsed:>10,.0f} {peak / 1e6:>8.1f}')
+            with app.app_context():
+                db.session.remove()
+                db.engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
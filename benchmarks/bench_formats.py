@@ -0,0 +1,67 @@
+"""
+Bytes on the wire and encoding CPU per response format: JSON with Flask-RESTful's standard
+library encoder, JSON with orjson, MessagePack, each sent as is, gzip'd and brotli'd.
+
+    python -m benchmarks.bench_formats [students]
+
+The payloads are the real responses of GET /students?limit=1000 and GET /courses/1/students.
+CPU is process time per response for encoding plus compression, best of several runs.
+"""
+import sys
+import time
+from flask_restful.representations.json import output_json as stdlib_output_json
+from benchmarks.common import make_app, populate
+from compression import ENCODERS, compress
+from representations import msgpack, output_json, output_msgpack
+
+PATHS = ['/students?limit=1000', '/courses/1/students']
+
+
+def cpu_time(fn, number=20, repeat=5):
+    """
+    Best process time of `fn` in seconds, averaged over `number` calls.
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.process_time()
+        for _ in range(number):
+            fn()
+        best = min(best, (time.process_time() - start) / number)
+    return best
+
+
+def main():
+    students = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    app = make_app(CACHE_BACKEND='null')
+    with app.app_context():
+        populate(students=students, courses=10)
+
+    formats = [('json (stdlib)', stdlib_output_json), ('json (orjson)', output_json)]
+    if msgpack is not None:
+        formats.append(('msgpack', output_msgpack))
+    encodings = ['identity', *sorted(ENCODERS)]
+
+    client = app.test_client()
+    for path in PATHS:
+        body = client.get(path).get_json()
+        print(f'GET {path}')
+        print(f'{"format":<16} {"encoding":<9} {"bytes":>10} {"ratio":>6} {"CPU ms":>8}')
+        with app.test_request_context(path):
+            for label, represent in formats:
+                raw = represent(body, 200).get_data()
+                for encoding in encodings:
+                    if encoding == 'identity':
+                        data = raw
+                        encode = lambda: represent(body, 200).get_data()
+                    else:
+                        data = compress(raw, encoding, app.config)
+                        encode = lambda: compress(represent(body, 200).get_data(), encoding, app.config)
+                    print(
+                        f'{label:<16} {encoding:<9} {len(data):>10,} {len(raw) / len(data):>6.1f} '
+                        f'{cpu_time(encode) * 1000:>8.2f}'
+                    )
+        print()
+
+
+if __name__ == '__main__':
+    main()
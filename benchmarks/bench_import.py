@@ -0,0 +1,59 @@
+"""
+Compares creating and enrolling students with the bulk JSON endpoints and with one CSV import
+(POST /imports/students with a course_ids column), and prints the import's stage timings.
+
+    python -m benchmarks.bench_import [rows]
+
+Runs on a temporary SQLite file by default; set BENCH_DATABASE_URI to use PostgreSQL (where the
+import stages its chunks with COPY from IMPORT_WORKERS processes).
+"""
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.bench_bulk import rate, student
+from benchmarks.common import make_app
+from models import db, Course
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    with tempfile.TemporaryDirectory() as workdir:
+        uri = os.environ.get('BENCH_DATABASE_URI') or f'sqlite:///{workdir}/import.db'
+        app = make_app(uri, METRICS_SAMPLE_RATE=0.0, BULK_MAX_ROWS=rows)
+        client = app.test_client()
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            db.session.add_all([Course(course_name=f'Course {i}') for i in range(10)])
+            db.session.commit()
+
+        start = time.perf_counter()
+        response = client.post('/students/bulk', json=[student('bulk', i) for i in range(rows)])
+        ids = [result['student_id'] for result in response.json['results']]
+        client.post('/enrollments/bulk', json=[
+            {'student_id': student_id, 'course_id': 1 + i % 10} for i, student_id in enumerate(ids)
+        ])
+        bulk = rate('POST .../bulk (JSON)', rows, time.perf_counter() - start)
+
+        lines = ['name,date_of_birth,email,reg_no,course_ids']
+        for i in range(rows):
+            item = student('csv', i)
+            lines.append(f"{item['name']},{item['date_of_birth']},{item['email']},{item['reg_no']},{1 + i % 10}")
+        body = '\n'.join(lines) + '\n'
+        start = time.perf_counter()
+        response = client.post('/imports/students', data=body, content_type='text/csv')
+        imported = rate('POST /imports/students (CSV)', rows, time.perf_counter() - start)
+        assert response.status_code == 201, response.json
+
+        stats = response.json['stats']
+        print(', '.join(f'{key} {value}' for key, value in stats.items()))
+        print(f'speedup: {imported / bulk:6.1f}x')
+        with app.app_context():
+            db.session.remove()
+            db.engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
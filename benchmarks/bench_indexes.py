@@ -0,0 +1,68 @@
+"""
+Measures the lookups the API performs with and without the indexes declared in models.py.
+
+    python -m benchmarks.bench_indexes [students]
+
+The schema is created with every index, timed, then the indexes are dropped and the same
+lookups are timed again on the same data.
+"""
+import random
+import sys
+from sqlalchemy import select
+from benchmarks.common import make_app, populate, timeit
+from models import db, Student, Enrollment
+
+LOOKUPS = 500
+
+
+def lookups(students):
+    rng = random.Random(42)
+    ids = [rng.randint(1, students) for _ in range(LOOKUPS)]
+    return {
+        'students by reg_no': lambda: [
+            db.session.execute(select(Student.student_id).where(Student.reg_no == f'REG-{i:08d}')).first()
+            for i in ids
+        ],
+        'students by email': lambda: [
+            db.session.execute(select(Student.student_id).where(Student.email == f'student{i}@example.com')).first()
+            for i in ids
+        ],
+        'enrollment by (student, course)': lambda: [
+            db.session.execute(select(Enrollment.enrollment_id).where(
+                Enrollment.student_id == i, Enrollment.course_id == 1 + i % 50
+            )).first()
+            for i in ids
+        ],
+        'enrollments by course': lambda: [
+            db.session.execute(select(Enrollment.student_id).where(Enrollment.course_id == 1 + i % 50).limit(20)).all()
+            for i in ids[:50]
+        ],
+    }
+
+
+def run_all(students):
+    return {label: timeit(fn, repeat=3) for label, fn in lookups(students).items()}
+
+
+def main():
+    students = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    app = make_app()
+    with app.app_context():
+        populate(students=students)
+        indexed = run_all(students)
+
+        for table in db.metadata.sorted_tables:
+            for index in table.indexes:
+                index.drop(db.engine)
+        unindexed = run_all(students)
+
+    print(f'{students} students, {LOOKUPS} lookups each (ms per lookup)')
+    print(f'{"lookup":<34} {"no index":>10} {"indexed":>10} {"speedup":>8}')
+    for label in indexed:
+        before = unindexed[label] * 1000 / LOOKUPS
+        after = indexed[label] * 1000 / LOOKUPS
+        print(f'{label:<34} {before:10.3f} {after:10.3f} {before / after:7.0f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,38 @@
+"""
+Measures the overhead of request profiling at different sample rates.
+
+    python -m benchmarks.bench_metrics [requests]
+"""
+import sys
+from benchmarks.common import make_app, populate, timeit
+from models import db
+
+URLS = ['/students?limit=20', '/students?student_id=5', '/students/5/std_courses', '/courses/3/students']
+
+
+def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    print(f'{"profiling":<22} {"us/request":>10}')
+    baseline = None
+    for label, settings in [
+        ('disabled', {'METRICS_ENABLED': False}),
+        ('sample rate 0', {'METRICS_SAMPLE_RATE': 0.0}),
+        ('sample rate 0.05', {'METRICS_SAMPLE_RATE': 0.05}),
+        ('sample rate 1', {'METRICS_SAMPLE_RATE': 1.0}),
+    ]:
+        app = make_app(**settings)
+        with app.app_context():
+            populate(students=1000, courses=10)
+        client = app.test_client()
+
+        def run():
+            for i in range(requests):
+                client.get(URLS[i % len(URLS)])
+
+        per_request = timeit(run, repeat=3) / requests * 1e6
+        baseline = baseline or per_request
+        print(f'{label:<22} {per_request:10.1f}   {100 * (per_request / baseline - 1):+5.1f}%')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+"""
+Compares SerializerMixin.to_dict() with the column-projected ModelSerializer on a full student list.
+
+    python -m benchmarks.bench_serializer [rows]
+"""
+import sys
+from benchmarks.common import make_app, populate, timeit
+from models import db, Student
+from serializers import student_serializer
+
+
+def with_to_dict():
+    return [student.to_dict() for student in Student.query.all()]
+
+
+def with_model_serializer():
+    serialize = student_serializer.row_serializer()
+    return [serialize(row) for row in db.session.execute(student_serializer.select()).all()]
+
+
+def with_sparse_fields():
+    fields = ('student_id', 'name')
+    serialize = student_serializer.row_serializer(fields)
+    return [serialize(row) for row in db.session.execute(student_serializer.select(fields)).all()]
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    app = make_app()
+    with app.app_context():
+        populate(students=rows)
+        results = {}
+        for label, fn in [
+            ('to_dict', with_to_dict),
+            ('ModelSerializer', with_model_serializer),
+            ('ModelSerializer fields=name', with_sparse_fields),
+        ]:
+            # Start every run from an empty identity map so to_dict pays its real loading cost
+            def run():
+                db.session.expunge_all()
+                fn()
+            results[label] = timeit(run)
+
+        baseline = results['to_dict']
+        print(f'{rows} students')
+        for label, seconds in results.items():
+            print(f'{label:<30} {seconds * 1000:9.1f} ms  {baseline / seconds:6.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""
+Measures how long a fresh process takes from `import app` to the answer of its first request.
+
+    python -m benchmarks.bench_startup [runs]
+
+Each run is a new Python process, as a gunicorn worker or a CLI command would be. The phases are
+import, create_app() and the first request; the database connection count is sampled right
+after create_app() and should be 0 (no I/O at startup).
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from benchmarks.common import make_app, populate
+
+CHILD = '''
+import json, sys, time
+start = time.perf_counter()
+import app as app_module
+imported = time.perf_counter()
+app = app_module.create_app('config.TestingConfig', SQLALCHEMY_DATABASE_URI=sys.argv[1])
+created = time.perf_counter()
+connections = app.extensions['pool_metrics'].counters['connect']
+response = app.test_client().get('/students?limit=10')
+assert response.status_code == 200, response.status_code
+answered = time.perf_counter()
+print(json.dumps({
+    'import': imported - start, 'create_app': created - imported,
+    'first_request': answered - created, 'total': answered - start,
+    'connections_before_first_request': connections,
+}))
+'''
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    db_file = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+    uri = f'sqlite:///{db_file.name}'
+    app = make_app(uri)
+    with app.app_context():
+        populate(students=1000, courses=10)
+
+    results = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, '-c', CHILD, uri], check=True, capture_output=True, text=True,
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+    os.unlink(db_file.name)
+
+    for phase in ('import', 'create_app', 'first_request', 'total'):
+        times = sorted(result[phase] * 1000 for result in results)
+        print(f'{phase:<14} median {statistics.median(times):8.1f} ms   max {times[-1]:8.1f} ms')
+    connections = max(result['connections_before_first_request'] for result in results)
+    print(f'database connections opened before the first request: {connections}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,216 @@
+"""
+SQL statements and latency of the PUT and DELETE endpoints, against the load-then-mutate handlers
+they replaced (load the row and its links with the ORM, then write), registered on the same app
+under /legacy.
+
+    python -m benchmarks.bench_writes [--operations 200] [--latency-ms 1]
+
+Each statement is delayed by --latency-ms to stand in for the network round trip to the database.
+Runs on a temporary SQLite file by default; set BENCH_DATABASE_URI to use PostgreSQL.
+"""
+import argparse
+import os
+import tempfile
+import time
+from flask_restful import Api, Resource
+from sqlalchemy import bindparam, delete, event, select, update
+from benchmarks.common import make_app, populate
+from instrumentation import count_statements
+from models import db, Student, StudentProfile, Teacher, Course, Enrollment, TeacherCourse
+from serializers import student_serializer
+
+# Links deleted with each entity, as (model, foreign key column)
+LINKS = {
+    Student: [(Enrollment, Enrollment.student_id)],
+    Teacher: [(TeacherCourse, TeacherCourse.teacher_id)],
+    Course: [(Enrollment, Enrollment.course_id), (TeacherCourse, TeacherCourse.course_id)],
+}
+
+
+def legacy_delete(model, pk):
+    """
+    The statements the ORM sent to delete an entity with its links: load the row, load the links,
+    delete them (one executemany per table), delete the row.
+    """
+    pk_column = model.__mapper__.primary_key[0]
+    if db.session.execute(select(model).where(pk_column == pk)).scalar() is None:
+        return {'message': 'Not found'}, 404
+    for link, column in LINKS[model]:
+        link_pk = link.__mapper__.primary_key[0]
+        ids = db.session.execute(select(link).where(column == pk)).scalars().all()
+        if ids:
+            db.session.execute(
+                delete(link.__table__).where(link_pk == bindparam('link_id')),
+                [{'link_id': getattr(row, link_pk.key)} for row in ids],
+            )
+    db.session.execute(delete(model).where(pk_column == pk))
+    db.session.commit()
+    return '', 204
+
+
+class LegacyStudentResource(Resource):
+    def put(self, student_id):
+        student = db.session.get(Student, student_id)
+        if not student:
+            return {'message': 'Student not found'}, 404
+        student.name = 'Renamed'
+        db.session.commit()
+        return student_serializer.dump(student)
+
+    def delete(self, student_id):
+        return legacy_delete(Student, student_id)
+
+
+class LegacyTeacherResource(Resource):
+    def delete(self, teacher_id):
+        return legacy_delete(Teacher, teacher_id)
+
+
+class LegacyCourseResource(Resource):
+    def delete(self, course_id):
+        return legacy_delete(Course, course_id)
+
+
+class LegacyEnrollmentResource(Resource):
+    def delete(self, student_id, course_id):
+        enrollment = Enrollment.query.filter_by(student_id=student_id, course_id=course_id).first()
+        if not enrollment:
+            return {'message': 'Enrollment not found'}, 404
+        db.session.delete(enrollment)
+        db.session.commit()
+        return '', 204
+
+
+class LegacyWithdrawResource(Resource):
+    def delete(self, teacher_id, course_id):
+        teacher_course = TeacherCourse.query.filter_by(teacher_id=teacher_id, course_id=course_id).first()
+        if not teacher_course:
+            return {'message': 'Teacher not assigned to this course'}, 404
+        db.session.delete(teacher_course)
+        db.session.commit()
+        return '', 204
+
+
+class LegacyStudentProfileResource(Resource):
+    def delete(self, student_id):
+        stmt = select(StudentProfile).join(StudentProfile.student).where(Student.student_id == student_id)
+        student_profile = db.session.execute(stmt).scalar()
+        if not student_profile:
+            return {'message': 'Student profile not found'}, 404
+        db.session.execute(
+            update(Student)
+            .where(Student.student_profile_id == student_profile.student_profile_id)
+            .values(student_profile_id=None)
+        )
+        db.session.delete(student_profile)
+        db.session.commit()
+        return '', 204
+
+
+def register_legacy(app):
+    api = Api(app, prefix='/legacy')
+    api.add_resource(LegacyStudentResource, '/students/<int:student_id>')
+    api.add_resource(LegacyTeacherResource, '/teachers/<int:teacher_id>')
+    api.add_resource(LegacyCourseResource, '/courses/<int:course_id>')
+    api.add_resource(LegacyEnrollmentResource, '/students/<int:student_id>/enroll/<int:course_id>')
+    api.add_resource(LegacyWithdrawResource, '/teachers/<int:teacher_id>/withdraw/<int:course_id>')
+    api.add_resource(LegacyStudentProfileResource, '/student-profiles/<int:student_id>')
+
+
+def seed(operations, courses):
+    """
+    Students with enrollments and a profile each, and teachers with course assignments; every
+    operation below writes rows of its own.
+    """
+    students = operations * 8
+    populate(students=students, courses=courses, enrollments_per_student=3)
+    db.session.execute(StudentProfile.__table__.insert(), [
+        {'student_profile_id': i, 'bio': f'Bio {i}'} for i in range(1, students + 1)
+    ])
+    db.session.execute(
+        update(Student.__table__).where(Student.student_id == bindparam('b_id')).values(student_profile_id=bindparam('b_id')),
+        [{'b_id': i} for i in range(1, students + 1)],
+    )
+    teachers = operations * 4
+    db.session.execute(Teacher.__table__.insert(), [
+        {'teacher_id': i, 'name': f'Teacher {i}', 'email': f'teacher{i}@example.com'} for i in range(1, teachers + 1)
+    ])
+    db.session.execute(TeacherCourse.__table__.insert(), [
+        {'teacher_id': i, 'course_id': 1 + (i + k) % courses} for i in range(1, teachers + 1) for k in range(3)
+    ])
+    db.session.commit()
+
+
+def operations_of(n, courses):
+    """
+    (label, method, path, ids for the legacy run, ids for the endpoint run) of every benchmarked write.
+    """
+    def halves(offset):
+        return range(offset + 1, offset + n + 1), range(offset + n + 1, offset + 2 * n + 1)
+
+    return [
+        ('PUT /students/<id>', 'PUT', lambda i: f'/students/{i}', *halves(0)),
+        ('DELETE /students/<id>', 'DELETE', lambda i: f'/students/{i}', *halves(2 * n)),
+        ('DELETE /students/<id>/enroll/<c>', 'DELETE',
+         lambda i: f'/students/{i}/enroll/{1 + (i + 1) % courses}', *halves(4 * n)),
+        ('DELETE /student-profiles/<id>', 'DELETE', lambda i: f'/student-profiles/{i}', *halves(6 * n)),
+        ('DELETE /teachers/<id>', 'DELETE', lambda i: f'/teachers/{i}', *halves(0)),
+        ('DELETE /teachers/<id>/withdraw/<c>', 'DELETE',
+         lambda i: f'/teachers/{i}/withdraw/{1 + (i + 1) % courses}', *halves(2 * n)),
+        ('DELETE /courses/<id>', 'DELETE', lambda i: f'/courses/{i}', range(1, 6), range(6, 11)),
+    ]
+
+
+def measure(app, client, method, paths):
+    statements = 0
+    latencies = []
+    with app.app_context():
+        engine = db.engine
+    for path in paths:
+        start = time.perf_counter()
+        with count_statements(engine) as counter:
+            response = client.open(path, method=method, json={'name': 'Renamed'} if method == 'PUT' else None)
+        latencies.append(time.perf_counter() - start)
+        assert response.status_code in (200, 204), (path, response.status_code, response.get_data())
+        statements += counter.count
+    latencies.sort()
+    return statements / len(paths), latencies[len(latencies) // 2] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--operations', type=int, default=200)
+    parser.add_argument('--latency-ms', type=float, default=1)
+    args = parser.parse_args()
+    courses = 20
+
+    with tempfile.TemporaryDirectory() as workdir:
+        uri = os.environ.get('BENCH_DATABASE_URI') or f'sqlite:///{workdir}/writes.db'
+        app = make_app(uri, METRICS_SAMPLE_RATE=0.0, CACHE_BACKEND='null')
+        register_legacy(app)
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            seed(args.operations, courses)
+            engine = db.engine
+
+        if args.latency_ms:
+            @event.listens_for(engine, 'before_cursor_execute')
+            def delay(*_):
+                time.sleep(args.latency_ms / 1000)
+
+        client = app.test_client()
+        print(f'{args.latency_ms:g} ms per statement')
+        print(f'{"endpoint":<38} {"statements":>10} {"(legacy)":>9} {"p50 ms":>8} {"(legacy)":>9}')
+        for label, method, path, legacy_ids, new_ids in operations_of(args.operations, courses):
+            legacy_statements, legacy_p50 = measure(app, client, method, ['/legacy' + path(i) for i in legacy_ids])
+            statements, p50 = measure(app, client, method, [path(i) for i in new_ids])
+            print(f'{label:<38} {statements:>10.1f} {legacy_statements:>9.1f} {p50:>8.2f} {legacy_p50:>9.2f}')
+
+        with app.app_context():
+            db.session.remove()
+            db.engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+Checks the read-replica routing of replicas.py on two local databases. Fails (exit status 1) if
+a read or write is routed to the wrong one.
+
+    python -m benchmarks.check_replicas
+
+By default the primary and the replica are two SQLite files in a temporary directory; the
+replica starts as a copy of the primary, then gets different student and course names so every
+response shows where it was read. To use PostgreSQL, set CHECK_PRIMARY_URI and CHECK_REPLICA_URI
+to two empty databases (the replica is written directly, not through replication).
+"""
+import os
+import sys
+import tempfile
+from sqlalchemy import create_engine, text
+from benchmarks.common import make_app, populate
+from models import db
+
+
+def setup(primary_uri, replica_uri):
+    for uri in (primary_uri, replica_uri):
+        app = make_app(uri, REPLICA_URLS=[])
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            populate(students=20, courses=3)
+            db.session.remove()
+            db.engine.dispose()
+    engine = create_engine(replica_uri)
+    with engine.begin() as connection:
+        connection.execute(text("UPDATE students SET name = 'Replica ' || student_id"))
+        connection.execute(text("UPDATE courses SET course_name = 'Replica ' || course_id"))
+        connection.execute(text('CREATE TABLE replica_lag (seconds FLOAT)'))
+        connection.execute(text('INSERT INTO replica_lag VALUES (0)'))
+    return engine
+
+
+def main():
+    checks = []
+
+    def check(label, response, expected):
+        entity = response.json.get('student') or response.json.get('course') or {}
+        name = entity.get('name') or entity.get('course_name') or ''
+        source = 'replica' if name.startswith('Replica') else 'primary'
+        checks.append(source == expected)
+        print(f"{'ok  ' if source == expected else 'FAIL'}  {expected:<8} {label}")
+
+    with tempfile.TemporaryDirectory() as workdir:
+        primary_uri = os.environ.get('CHECK_PRIMARY_URI') or f'sqlite:///{workdir}/primary.db'
+        replica_uri = os.environ.get('CHECK_REPLICA_URI') or f'sqlite:///{workdir}/replica.db'
+        replica = setup(primary_uri, replica_uri)
+
+        app = make_app(
+            primary_uri, REPLICA_URLS=[replica_uri], REPLICA_CHECK_INTERVAL=0,
+            REPLICA_LAG_QUERY='SELECT seconds FROM replica_lag', CACHE_BACKEND='memory',
+        )
+        client = app.test_client()
+        check('GET is read from the replica', client.get('/students?student_id=1'), 'replica')
+        check('X-Read-Primary: true', client.get('/students?student_id=1', headers={'X-Read-Primary': 'true'}), 'primary')
+
+        client.put('/students/2', json={'name': 'Written'})
+        check('GET after a write, same client', client.get('/students?student_id=2'), 'primary')
+        check('GET after a write, other client', app.test_client().get('/students?student_id=2'), 'replica')
+
+        check('cached GET', app.test_client().get('/courses?course_id=1'), 'replica')
+        client.put('/courses/1', json={'description': 'Changed'})
+        check('cached GET refilled after a write', app.test_client().get('/courses?course_id=1'), 'primary')
+
+        with replica.begin() as connection:
+            connection.execute(text('UPDATE replica_lag SET seconds = 60'))
+        check('replica lagging behind', app.test_client().get('/students?student_id=3'), 'primary')
+        with replica.begin() as connection:
+            connection.execute(text('UPDATE replica_lag SET seconds = 0'))
+        check('replica caught up', app.test_client().get('/students?student_id=3'), 'replica')
+        replica.dispose()
+
+        down = make_app(primary_uri, REPLICA_URLS=[f'sqlite:///{workdir}/missing/replica.db'])
+        check('replica unreachable', down.test_client().get('/students?student_id=4'), 'primary')
+        print(down.test_client().get('/metrics/pool').json['replicas'])
+
+    sys.exit(0 if all(checks) else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""
+Shared helpers for the benchmark scripts.
+
+Run every benchmark from the repository root as a module, e.g.:
+    python -m benchmarks.bench_serializer
+"""
+import time
+from datetime import date
+from app import create_app
+from models import db, Student, Course, Enrollment
+
+
+def make_app(database_uri='sqlite://', **settings):
+    """
+    Builds the app bound to `database_uri` (in-memory SQLite by default) with the schema created
+    (on the primary only, if read replicas are configured).
+    `settings` override config values.
+    """
+    app = create_app('config.TestingConfig', SQLALCHEMY_DATABASE_URI=database_uri, **settings)
+    with app.app_context():
+        db.create_all(bind_key=None)
+    return app
+
+
+def populate(students=10000, courses=50, enrollments_per_student=3):
+    """
+    Inserts synthetic rows with executemany so the benchmark setup itself stays fast.
+    Must be called inside an app context.
+    """
+    db.session.execute(Course.__table__.insert(), [
+        {'course_id': i, 'course_name': f'Course {i}', 'description': f'Description of course {i}'}
+        for i in range(1, courses + 1)
+    ])
+    db.session.execute(Student.__table__.insert(), [
+        {
+            'student_id': i,
+            'name': f'Student {i}',
+            'date_of_birth': date(2000, 1, 1 + i % 28),
+            'email': f'student{i}@example.com',
+            'reg_no': f'REG-{i:08d}',
+        }
+        for i in range(1, students + 1)
+    ])
+    enrollments = [
+        {'student_id': i, 'course_id': 1 + (i + k) % courses}
+        for i in range(1, students + 1)
+        for k in range(enrollments_per_student)
+    ]
+    if enrollments:
+        db.session.execute(Enrollment.__table__.insert(), enrollments)
+    db.session.commit()
+
+
+def timeit(fn, repeat=5):
+    """
+    Runs `fn` `repeat` times and returns the best wall-clock time in seconds.
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
@@ -0,0 +1,211 @@
+"""
+Drives every endpoint of app.py with concurrent clients and reports p50/p95/p99 latency and
+throughput per endpoint.
+
+Against a running server (gunicorn on SQLite or PostgreSQL, loaded with datagen.py):
+    python -m benchmarks.loadtest --url http://localhost:5555 --students 100000 --courses 500 --teachers 1000
+
+In-process through the Flask test client, on a database loaded with datagen.py:
+    python -m benchmarks.loadtest --database-uri sqlite:////tmp/load.db
+
+--students/--courses/--teachers must match the datagen.py arguments, so the requests hit
+existing rows. Reads are weighted towards the hot endpoints; writes create their own students
+and clean them up again, so the run can be repeated.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+
+class HttpTarget:
+    """
+    Sends requests to a server over HTTP with the standard library.
+    """
+
+    def __init__(self, url):
+        self.url = url.rstrip('/')
+
+    def request(self, method, path, body=None):
+        data = json.dumps(body).encode() if body is not None else None
+        req = urllib.request.Request(self.url + path, data=data, method=method)
+        if data is not None:
+            req.add_header('Content-Type', 'application/json')
+        try:
+            with urllib.request.urlopen(req, timeout=30) as response:
+                return response.status, json.loads(response.read() or 'null')
+        except urllib.error.HTTPError as error:
+            return error.code, None
+
+
+class AppTarget:
+    """
+    Calls the app in this process through one Flask test client per thread.
+    """
+
+    def __init__(self, database_uri):
+        from app import create_app
+        self.app = create_app(SQLALCHEMY_DATABASE_URI=database_uri, METRICS_SAMPLE_RATE=0.0)
+        self.local = threading.local()
+
+    def request(self, method, path, body=None):
+        client = getattr(self.local, 'client', None)
+        if client is None:
+            client = self.local.client = self.app.test_client()
+        response = client.open(path, method=method, json=body)
+        return response.status_code, response.get_json(silent=True)
+
+
+def reads(args):
+    """
+    (name, weight, function(target, rng)) for every read endpoint.
+    """
+    def student_id(rng):
+        return rng.randint(1, args.students)
+
+    def course_id(rng):
+        # Popular courses are requested more often, like their enrollments in datagen.py
+        return min(int(rng.paretovariate(1.0)), args.courses)
+
+    def teacher_id(rng):
+        return rng.randint(1, args.teachers)
+
+    def get(path):
+        return lambda target, rng: target.request('GET', path(rng))
+
+    return [
+        ('GET /students', 5, get(lambda rng: '/students?limit=100')),
+        ('GET /students?after=', 5, get(lambda rng: f'/students?limit=100&after={student_id(rng)}')),
+        ('GET /students?student_id=', 20, get(lambda rng: f'/students?student_id={student_id(rng)}')),
+        ('GET /students?reg_no=', 5, get(lambda rng: f'/students?reg_no=REG-{student_id(rng):09d}')),
+        ('GET /students?email=', 5, get(lambda rng: f'/students?email=student{student_id(rng)}@example.com')),
+        ('GET /students?name=', 3, get(lambda rng: f'/students?name={rng.choice(["Amina", "Kamau", "Joy O"])}&limit=20')),
+        ('GET /students?fields=', 5, get(lambda rng: f'/students?fields=name&limit=100&after={student_id(rng)}')),
+        ('GET /teachers', 3, get(lambda rng: '/teachers?limit=100')),
+        ('GET /teachers?teacher_id=', 5, get(lambda rng: f'/teachers?teacher_id={teacher_id(rng)}')),
+        ('GET /courses', 5, get(lambda rng: '/courses?limit=100')),
+        ('GET /courses?course_id=', 10, get(lambda rng: f'/courses?course_id={course_id(rng)}')),
+        ('GET /courses/search', 3, get(lambda rng: f'/courses/search?name={rng.choice(["Physics", "Intro", "Data"])}')),
+        ('GET /student-profiles/<id>', 5, get(lambda rng: f'/student-profiles/{student_id(rng)}')),
+        ('GET /teacher-profiles/<id>', 3, get(lambda rng: f'/teacher-profiles/{teacher_id(rng)}')),
+        ('GET /students/<id>/std_courses', 15, get(lambda rng: f'/students/{student_id(rng)}/std_courses')),
+        ('GET /courses/<id>/students', 5, get(lambda rng: f'/courses/{course_id(rng)}/students?limit=100')),
+        ('GET /teachers/<id>/courses', 5, get(lambda rng: f'/teachers/{teacher_id(rng)}/courses')),
+    ]
+
+
+def write_session(args):
+    """
+    One student's life cycle through every write endpoint; yields (name, status, expected statuses).
+    """
+    def run(target, rng):
+        tag = uuid.uuid4().hex[:12]
+        course, other_course = rng.sample(range(1, args.courses + 1), 2)
+        teacher = rng.randint(1, args.teachers)
+        steps = []
+
+        def step(name, expected, method, path, body=None):
+            start = time.perf_counter()
+            status, payload = target.request(method, path, body)
+            steps.append((name, time.perf_counter() - start, status in expected))
+            return payload
+
+        created = step('POST /students', (201,), 'POST', '/students', {
+            'name': f'Load {tag}', 'date_of_birth': '2004-02-03',
+            'email': f'{tag}@load.example.com', 'reg_no': f'LOAD-{tag}',
+        })
+        if not created:
+            return steps
+        sid = created['student_id']
+        step('PUT /students/<id>', (200,), 'PUT', f'/students/{sid}', {'name': f'Load {tag} updated'})
+        step('POST /student-profiles/<id>', (201,), 'POST', f'/student-profiles/{sid}', {'bio': 'load test'})
+        step('PUT /student-profiles/<id>', (200,), 'PUT', f'/student-profiles/{sid}', {'bio': 'load test 2'})
+        step('POST /students/<id>/enroll/<id>', (201,), 'POST', f'/students/{sid}/enroll/{course}')
+        step('DELETE /students/<id>/enroll/<id>', (200, 204), 'DELETE', f'/students/{sid}/enroll/{course}')
+        step('POST /enrollments/bulk', (200, 201, 207), 'POST', '/enrollments/bulk',
+             [{'student_id': sid, 'course_id': other_course}])
+        step('DELETE /enrollments/bulk', (200, 207), 'DELETE', '/enrollments/bulk',
+             [{'student_id': sid, 'course_id': other_course}])
+        step('POST /teachers/<id>/assign/<id>', (201, 400), 'POST', f'/teachers/{teacher}/assign/{course}')
+        step('DELETE /teachers/<id>/withdraw/<id>', (200, 204, 404), 'DELETE', f'/teachers/{teacher}/withdraw/{course}')
+        step('DELETE /student-profiles/<id>', (200, 204), 'DELETE', f'/student-profiles/{sid}')
+        step('DELETE /students/<id>', (200, 204), 'DELETE', f'/students/{sid}')
+        return steps
+
+    return run
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--url', help='base URL of a running server')
+    target.add_argument('--database-uri', help='run the app in-process on this database')
+    parser.add_argument('--students', type=int, default=100000)
+    parser.add_argument('--teachers', type=int, default=1000)
+    parser.add_argument('--courses', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=30, help='seconds')
+    parser.add_argument('--write-share', type=float, default=0.05, help='share of iterations that run the write session')
+    parser.add_argument('--seed', type=int, default=1)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    target = HttpTarget(args.url) if args.url else AppTarget(args.database_uri)
+    read_scenarios = reads(args)
+    weights = [weight for _, weight, _ in read_scenarios]
+    writes = write_session(args)
+
+    samples = {}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + args.duration
+
+    def worker(index):
+        rng = random.Random(f'{args.seed}:{index}')
+        local = []
+        while time.perf_counter() < deadline:
+            if rng.random() < args.write_share:
+                local.extend(writes(target, rng))
+            else:
+                name, _, run = rng.choices(read_scenarios, weights=weights)[0]
+                start = time.perf_counter()
+                status, _ = run(target, rng)
+                local.append((name, time.perf_counter() - start, status in (200, 304, 404)))
+        with lock:
+            for name, seconds, ok in local:
+                latencies, errors = samples.setdefault(name, ([], [0]))
+                latencies.append(seconds)
+                errors[0] += not ok
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(args.concurrency) as pool:
+        list(pool.map(worker, range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+
+    total = sum(len(latencies) for latencies, _ in samples.values())
+    print(f'{"endpoint":<38} {"requests":>8} {"errors":>6} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} {"req/s":>8}')
+    for name in sorted(samples):
+        latencies, errors = samples[name]
+        latencies.sort()
+        print(
+            f'{name:<38} {len(latencies):>8} {errors[0]:>6} '
+            f'{percentile(latencies, 0.50) * 1000:>8.1f} {percentile(latencies, 0.95) * 1000:>8.1f} '
+            f'{percentile(latencies, 0.99) * 1000:>8.1f} {len(latencies) / elapsed:>8.1f}'
+        )
+    print(f'{total} requests in {elapsed:.1f} s with {args.concurrency} clients: {total / elapsed:.1f} req/s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""
+Fails (exit status 1) if any read or write endpoint runs more SQL statements than its budget.
+
+    python -m benchmarks.query_budget
+"""
+import sys
+from benchmarks.common import make_app, populate
+from instrumentation import StatementBudgetExceeded, assert_statement_budget
+from models import db, Student, StudentProfile, Teacher, TeacherProfile, TeacherCourse
+
+# (url, maximum number of statements) for every read endpoint
+BUDGETS = [
+    ('/students', 1),
+    ('/students?student_id=1', 1),
+    ('/students?reg_no=REG-00000001', 1),
+    ('/students?email=student1@example.com', 1),
+    ('/students?ids=' + ','.join(map(str, range(1, 101))), 1),
+    ('/students?student_id=1&expand=student_profile,courses', 3),  # one statement per expansion
+    ('/students?limit=100&expand=courses.teachers', 3),
+    ('/students?name=Student 1', 2),  # first search loads the in-process n-gram index
+    ('/students?name=Student 2', 1),
+    ('/teachers', 1),
+    ('/teachers?teacher_id=1', 1),
+    ('/teachers?ids=1,2', 1),
+    ('/courses', 1),
+    ('/courses?course_id=1', 1),
+    ('/courses?ids=3,1,2', 1),
+    ('/courses?ids=1,2&expand=teachers.teacher_profile,students', 4),
+    ('/courses/search?name=Course', 2),
+    ('/student-profiles/1', 1),
+    ('/teacher-profiles/1', 1),
+    ('/students/1/std_courses', 1),
+    ('/students/999999/std_courses', 1),
+    ('/courses/1/students', 1),
+    ('/teachers/1/courses', 1),
+    ('/reports/teachers/1/students', 1),
+    ('/reports/courses/1/co-enrollment', 1),
+    ('/reports/teacher-load', 1),
+]
+
+# (method, url, JSON body, maximum number of statements) for the single-statement writes, run
+# after the reads, in order
+WRITE_BUDGETS = [
+    ('PUT', '/students/2', {'name': 'Renamed'}, 1),
+    # pk check, then one executemany per set of changed columns
+    ('PUT', '/students/bulk', [{'student_id': 4, 'name': 'Bulk'}, {'student_id': 5, 'name': 'Bulk'}], 2),
+    ('PUT', '/courses/bulk', [{'course_id': 4, 'capacity': 10}, {'course_id': 5, 'description': 'Bulk'}], 3),
+    ('PUT', '/courses/2', {'capacity': 30}, 1),
+    ('PUT', '/teachers/1', {'name': 'Renamed'}, 1),
+    ('PUT', '/student-profiles/1', {'bio': 'Renamed'}, 1),
+    ('DELETE', '/students/2/enroll/3', None, 1),
+    ('DELETE', '/teachers/1/withdraw/1', None, 1),
+    ('DELETE', '/student-profiles/1', None, 2),  # the delete, then unlinking the students that shared it
+    ('DELETE', '/teacher-profiles/1', None, 2),
+    ('DELETE', '/students/3', None, 1),  # enrollments go with it (ON DELETE CASCADE)
+    ('DELETE', '/teachers/1', None, 1),
+    ('DELETE', '/courses/2', None, 1),
+    ('DELETE', '/courses/999999', None, 1),
+]
+
+
+def seed_profiles_and_teachers():
+    student = db.session.get(Student, 1)
+    student.student_profile = StudentProfile(bio='Bio', photo_url='https://example.com/1.png')
+    teacher = Teacher(name='Teacher 1', email='teacher1@example.com')
+    teacher.teacher_profile = TeacherProfile(bio='Bio', photo_url='https://example.com/t.png', phone_no='0700000000')
+    db.session.add(teacher)
+    db.session.flush()
+    db.session.add(TeacherCourse(teacher_id=teacher.teacher_id, course_id=1))
+    db.session.commit()
+
+
+def main():
+    app = make_app()
+    with app.app_context():
+        populate(students=200, courses=10)
+        seed_profiles_and_teachers()
+        engine = db.engine
+
+    client = app.test_client()
+    client.get('/courses')  # warm up the connection so dialect setup is not counted
+
+    failures = 0
+    for url, budget in BUDGETS:
+        try:
+            response = assert_statement_budget(client, engine, 'GET', url, budget)
+            print(f'ok    {budget}  {response.status_code}  {url}')
+        except StatementBudgetExceeded as exc:
+            failures += 1
+            print(f'FAIL  {exc}')
+    for method, url, body, budget in WRITE_BUDGETS:
+        try:
+            response = assert_statement_budget(client, engine, method, url, budget, json=body)
+            # Server errors, and bulk writes with failed rows (207), fail the run as well
+            if response.status_code >= 500 or response.status_code == 207:
+                failures += 1
+                print(f'FAIL  {method} {url} answered {response.status_code}: {response.get_data(as_text=True)}')
+                continue
+            print(f'ok    {budget}  {response.status_code}  {method} {url}')
+        except StatementBudgetExceeded as exc:
+            failures += 1
+            print(f'FAIL  {exc}')
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
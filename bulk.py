@@ -0,0 +1,458 @@
+import json
+from datetime import date
+from flask import current_app, request
+from flask_restful import Resource, abort
+from sqlalchemy import bindparam, delete, insert, or_, select, tuple_, update
+from sqlalchemy.exc import IntegrityError
+from models import db, Student, Course, Enrollment
+from db_helpers import copy_rows, dialect_insert, dialect_name
+from pagination import NDJSON_MIMETYPE
+from search import invalidate_search_index
+
+
+def read_items():
+    """
+    Reads the request body as a JSON array or as NDJSON (one JSON value per line).
+    Aborts with 400 if the body cannot be parsed or holds more than BULK_MAX_ROWS items.
+    """
+    if request.mimetype == NDJSON_MIMETYPE:
+        items = []
+        for line_no, line in enumerate(request.get_data(as_text=True).splitlines(), start=1):
+            if not line.strip():
+                continue
+            try:
+                items.append(json.loads(line))
+            except ValueError:
+                abort(400, message=f'Line {line_no} is not valid JSON')
+    else:
+        items = request.get_json(silent=True)
+        if not isinstance(items, list):
+            abort(400, message='Expected a JSON array or an NDJSON body')
+
+    max_rows = current_app.config['BULK_MAX_ROWS']
+    if len(items) > max_rows:
+        abort(400, message=f'At most {max_rows} rows per request')
+    return items
+
+
+def chunks(items):
+    """
+    Splits (index, item) pairs into lists of BULK_CHUNK_SIZE; each list is loaded and committed on its own.
+    """
+    size = current_app.config['BULK_CHUNK_SIZE']
+    pairs = list(enumerate(items))
+    for start in range(0, len(pairs), size):
+        yield pairs[start:start + size]
+
+
+def parse_value(value, kind):
+    if kind is date:
+        return value if isinstance(value, date) else date.fromisoformat(value)
+    if kind is int:
+        if isinstance(value, bool) or not isinstance(value, (int, str)):
+            raise ValueError
+        return int(value)
+    if not isinstance(value, str):
+        raise ValueError
+    return value
+
+
+def validate(item, fields, partial=False):
+    """
+    Checks one item against `fields` ({name: (type, required)}).
+    Returns (clean values, list of error messages). With partial=True missing fields are allowed,
+    but a required field sent as null is still an error.
+    """
+    if not isinstance(item, dict):
+        return None, ['Expected a JSON object']
+
+    clean, errors = {}, []
+    for name, (kind, required) in fields.items():
+        value = item.get(name)
+        if value is None:
+            if name in item and not required:
+                clean[name] = None
+            elif required and (name in item or not partial):
+                errors.append(f'{name} is required')
+            continue
+        try:
+            clean[name] = parse_value(value, kind)
+        except (TypeError, ValueError):
+            errors.append(f'{name} must be {"an ISO date" if kind is date else kind.__name__}')
+
+    unknown = set(item) - set(fields)
+    if unknown:
+        errors.append(f"Unknown field(s): {', '.join(sorted(unknown))}")
+    return clean, errors
+
+
+def read_update(fields):
+    """
+    Reads the JSON body of a single-row PUT: the values of `fields` ({name: (type, required)}) it
+    carries, checked like bulk items; other keys, such as the read-only columns of a GET body
+    sent back, are ignored. Aborts with 400 if the body is not a JSON object or a value is
+    invalid (null for a required field included).
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        abort(400, message='Expected a JSON object')
+    item = {name: value for name, value in data.items() if name in fields}
+    clean, errors = validate(item, fields, partial=True)
+    if errors:
+        abort(400, message='; '.join(errors))
+    return clean
+
+
+def summary(results, success_status):
+    """
+    Builds the response: per-row results plus counts. 201/200 when every row succeeded, 207 otherwise.
+    """
+    failed = sum(1 for result in results if result['status'] == 'error')
+    body = {'succeeded': len(results) - failed, 'failed': failed, 'results': results}
+    return body, (success_status if not failed else 207)
+
+
+class BulkEntityResource(Resource):
+    """
+    Bulk create (POST), update (PUT) and delete (DELETE) for one model.
+
+    Items are validated in bulk: types per row, unique columns against the rest of the batch
+    and against the database with one query per chunk. Valid rows are then written with one
+    multi-row statement per chunk (COPY on PostgreSQL for creates) and each chunk is committed
+    on its own. The response has one result per input row, in input order.
+    """
+    model = None
+    # Name of the primary key attribute
+    pk_name = None
+    # {field: (type, required)} accepted on create and update
+    fields = {}
+    # Columns that must be unique across the table
+    unique_columns = ()
+    # Name used by the search index for this model
+    search_target = None
+
+    @property
+    def pk_column(self):
+        return getattr(self.model, self.pk_name)
+
+    def _existing_unique(self, values_by_column):
+        """
+        Returns {(column, value): pk} for values that are already taken in the database.
+        """
+        conditions = [
+            getattr(self.model, column).in_(values)
+            for column, values in values_by_column.items() if values
+        ]
+        if not conditions:
+            return {}
+        columns = [getattr(self.model, column) for column in self.unique_columns]
+        rows = db.session.execute(select(self.pk_column, *columns).where(or_(*conditions))).all()
+        taken = {}
+        for row in rows:
+            for column, value in zip(self.unique_columns, row[1:]):
+                taken[(column, value)] = row[0]
+        return taken
+
+    def _check_unique(self, chunk, seen):
+        """
+        Adds an error to every (index, clean, errors) entry whose unique values clash with an
+        earlier row of the batch (`seen`) or with another row in the database. A row may keep
+        its own values on update.
+        """
+        values_by_column = {
+            column: {clean[column] for _, clean, errors in chunk if not errors and clean.get(column) is not None}
+            for column in self.unique_columns
+        }
+        taken = self._existing_unique(values_by_column)
+        for index, clean, errors in chunk:
+            if errors:
+                continue
+            own_id = clean.get(self.pk_name)
+            # Rows being created have no id yet; their position in the batch identifies them
+            identity = own_id if own_id is not None else ('row', index)
+            for column in self.unique_columns:
+                value = clean.get(column)
+                if value is None:
+                    continue
+                owner = taken.get((column, value))
+                if owner is not None and owner != own_id:
+                    errors.append(f'{column} {value!r} already exists')
+                elif seen.setdefault((column, value), identity) != identity:
+                    errors.append(f'{column} {value!r} is duplicated in this batch')
+
+    def _insert(self, rows):
+        """
+        Inserts `rows` (dicts) and returns their new primary keys in the same order.
+        """
+        columns = list(self.fields)
+        if dialect_name() == 'postgresql' and self.unique_columns:
+            # COPY is the fastest load path; the new ids are read back through the first unique column
+            copy_rows(self.model.__table__, columns, [tuple(row.get(column) for column in columns) for row in rows])
+            key = getattr(self.model, self.unique_columns[0])
+            keys = [row[key.key] for row in rows]
+            ids = dict(db.session.execute(select(key, self.pk_column).where(key.in_(keys))).all())
+            return [ids[value] for value in keys]
+
+        # executemany of INSERT ... RETURNING, batched into multi-row VALUES by SQLAlchemy
+        stmt = insert(self.model).returning(self.pk_column, sort_by_parameter_order=True)
+        return list(db.session.execute(stmt, [{column: row.get(column) for column in columns} for row in rows]).scalars())
+
+    def post(self):
+        """
+        Creates every valid item of a JSON array or NDJSON body.
+        """
+        items = read_items()
+        results = [None] * len(items)
+        seen = {}
+        for chunk in chunks(items):
+            checked = [(index, *validate(item, self.fields)) for index, item in chunk]
+            self._check_unique(checked, seen)
+
+            valid = [(index, clean) for index, clean, errors in checked if not errors]
+            for index, _, errors in checked:
+                if errors:
+                    results[index] = {'index': index, 'status': 'error', 'errors': errors}
+            if not valid:
+                continue
+
+            try:
+                ids = self._insert([clean for _, clean in valid])
+                db.session.commit()
+            except IntegrityError:
+                # A concurrent writer took one of the unique values after we checked
+                db.session.rollback()
+                for index, _ in valid:
+                    results[index] = {'index': index, 'status': 'error', 'errors': ['Conflicts with an existing row']}
+                continue
+
+            for (index, _), pk in zip(valid, ids):
+                results[index] = {'index': index, 'status': 'created', self.pk_name: pk}
+
+        invalidate_search_index(self.search_target)
+        return summary(results, 201)
+
+    def put(self):
+        """
+        Updates every valid item; each item must carry the primary key and the fields to change.
+        """
+        items = read_items()
+        results = [None] * len(items)
+        seen = {}
+        pk_name = self.pk_name
+        update_fields = dict(self.fields, **{pk_name: (int, True)})
+        for chunk in chunks(items):
+            checked = []
+            for index, item in chunk:
+                clean, errors = validate(item, update_fields, partial=True)
+                if not errors and pk_name not in clean:
+                    errors.append(f'{pk_name} is required')
+                checked.append((index, clean, errors))
+
+            ids = {clean[pk_name] for _, clean, errors in checked if not errors}
+            existing = set(db.session.execute(select(self.pk_column).where(self.pk_column.in_(ids))).scalars())
+            for _, clean, errors in checked:
+                if not errors and clean[pk_name] not in existing:
+                    errors.append(f'{self.model.__name__} not found')
+            self._check_unique(checked, seen)
+
+            valid = [(index, clean) for index, clean, errors in checked if not errors]
+            for index, _, errors in checked:
+                if errors:
+                    results[index] = {'index': index, 'status': 'error', 'errors': errors}
+            if not valid:
+                continue
+
+            try:
+                # One Core executemany per distinct set of changed columns; the columns' onupdate
+                # still bumps the change stamp (an ORM bulk UPDATE would require each row's version)
+                by_columns = {}
+                for _, clean in valid:
+                    columns = tuple(sorted(key for key in clean if key != pk_name))
+                    by_columns.setdefault(columns, []).append(clean)
+                for columns, rows in by_columns.items():
+                    if not columns:
+                        continue
+                    stmt = (
+                        update(self.model.__table__)
+                        .where(self.model.__table__.c[pk_name] == bindparam('b_pk'))
+                        .values({column: bindparam(f'b_{column}') for column in columns})
+                    )
+                    db.session.execute(stmt, [
+                        {'b_pk': row[pk_name], **{f'b_{column}': row[column] for column in columns}} for row in rows
+                    ])
+                db.session.commit()
+            except IntegrityError:
+                db.session.rollback()
+                for index, _ in valid:
+                    results[index] = {'index': index, 'status': 'error', 'errors': ['Conflicts with an existing row']}
+                continue
+
+            for index, clean in valid:
+                results[index] = {'index': index, 'status': 'updated', pk_name: clean[pk_name]}
+
+        invalidate_search_index(self.search_target)
+        return summary(results, 200)
+
+    def delete(self):
+        """
+        Deletes the rows whose primary keys are given as a JSON array or NDJSON body of ids.
+        """
+        items = read_items()
+        results = [None] * len(items)
+        pk_name = self.pk_name
+        for chunk in chunks(items):
+            ids = {}
+            for index, item in chunk:
+                value = item.get(pk_name) if isinstance(item, dict) else item
+                try:
+                    ids[index] = parse_value(value, int)
+                except (TypeError, ValueError):
+                    results[index] = {'index': index, 'status': 'error', 'errors': [f'{pk_name} must be int']}
+            if not ids:
+                continue
+
+            # Enrollments and course assignments go with their rows (ON DELETE CASCADE)
+            deleted = set(db.session.execute(
+                delete(self.model).where(self.pk_column.in_(set(ids.values()))).returning(self.pk_column)
+            ).scalars())
+            db.session.commit()
+
+            for index, pk in ids.items():
+                if pk in deleted:
+                    results[index] = {'index': index, 'status': 'deleted', pk_name: pk}
+                else:
+                    results[index] = {'index': index, 'status': 'error', 'errors': [f'{self.model.__name__} not found']}
+
+        invalidate_search_index(self.search_target)
+        return summary(results, 200)
+
+
+class BulkStudentsResource(BulkEntityResource):
+    model = Student
+    pk_name = 'student_id'
+    fields = {
+        'name': (str, True),
+        'date_of_birth': (date, True),
+        'email': (str, True),
+        'reg_no': (str, True),
+        'student_profile_id': (int, False),
+    }
+    unique_columns = ('reg_no', 'email')
+    search_target = 'students'
+
+
+class BulkCoursesResource(BulkEntityResource):
+    model = Course
+    pk_name = 'course_id'
+    fields = {
+        'course_name': (str, True),
+        'description': (str, False),
+        'capacity': (int, False),
+    }
+    search_target = 'courses'
+
+
+class BulkEnrollmentsResource(Resource):
+    """
+    Bulk enroll (POST) and unenroll (DELETE) of {student_id, course_id} pairs.
+    """
+    fields = {'student_id': (int, True), 'course_id': (int, True)}
+
+    def _checked(self, chunk):
+        checked = [(index, *validate(item, self.fields)) for index, item in chunk]
+        student_ids = {clean['student_id'] for _, clean, errors in checked if not errors}
+        course_ids = {clean['course_id'] for _, clean, errors in checked if not errors}
+        # Preload the parents referenced by the chunk: two IN queries instead of two per row
+        students = set(db.session.execute(
+            select(Student.student_id).where(Student.student_id.in_(student_ids))
+        ).scalars())
+        courses = set(db.session.execute(
+            select(Course.course_id).where(Course.course_id.in_(course_ids))
+        ).scalars())
+        for _, clean, errors in checked:
+            if errors:
+                continue
+            if clean['student_id'] not in students:
+                errors.append('Student not found')
+            if clean['course_id'] not in courses:
+                errors.append('Course not found')
+        return checked
+
+    def post(self):
+        """
+        Enrolls every valid pair. Pairs that are already enrolled are reported, not duplicated.
+        """
+        items = read_items()
+        results = [None] * len(items)
+        for chunk in chunks(items):
+            checked = self._checked(chunk)
+            pending = {}
+            for index, clean, errors in checked:
+                if errors:
+                    results[index] = {'index': index, 'status': 'error', 'errors': errors}
+                    continue
+                pair = (clean['student_id'], clean['course_id'])
+                if pair in pending:
+                    results[index] = {'index': index, 'status': 'error', 'errors': ['Duplicated in this batch']}
+                else:
+                    pending[pair] = index
+            if not pending:
+                continue
+
+            # ON CONFLICT DO NOTHING makes the load safe against existing and concurrent enrollments;
+            # RETURNING tells us which pairs were actually inserted
+            stmt = dialect_insert(Enrollment).values([
+                {'student_id': student_id, 'course_id': course_id} for student_id, course_id in pending
+            ])
+            if hasattr(stmt, 'on_conflict_do_nothing'):
+                stmt = stmt.on_conflict_do_nothing(index_elements=['student_id', 'course_id'])
+            inserted = {
+                (row.student_id, row.course_id): row.enrollment_id
+                for row in db.session.execute(
+                    stmt.returning(Enrollment.enrollment_id, Enrollment.student_id, Enrollment.course_id)
+                )
+            }
+            db.session.commit()
+
+            for pair, index in pending.items():
+                if pair in inserted:
+                    results[index] = {'index': index, 'status': 'created', 'enrollment_id': inserted[pair]}
+                else:
+                    results[index] = {'index': index, 'status': 'error', 'errors': ['Student already enrolled in this course']}
+
+        return summary(results, 201)
+
+    def delete(self):
+        """
+        Deletes the enrollment of every given pair.
+        """
+        items = read_items()
+        results = [None] * len(items)
+        for chunk in chunks(items):
+            pending = {}
+            for index, item in chunk:
+                clean, errors = validate(item, self.fields)
+                if errors:
+                    results[index] = {'index': index, 'status': 'error', 'errors': errors}
+                else:
+                    pending.setdefault((clean['student_id'], clean['course_id']), []).append(index)
+            if not pending:
+                continue
+
+            # One DELETE per chunk, matching the (student_id, course_id) pairs with a row-value IN
+            rows = db.session.execute(
+                delete(Enrollment)
+                .where(tuple_(Enrollment.student_id, Enrollment.course_id).in_(list(pending)))
+                .returning(Enrollment.student_id, Enrollment.course_id)
+            ).all()
+            deleted = {(row.student_id, row.course_id) for row in rows}
+            db.session.commit()
+
+            for pair, indexes in pending.items():
+                for index in indexes:
+                    if pair in deleted:
+                        results[index] = {'index': index, 'status': 'deleted'}
+                    else:
+                        results[index] = {'index': index, 'status': 'error', 'errors': ['Enrollment not found']}
+
+        return summary(results, 200)
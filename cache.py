@@ -0,0 +1,211 @@
+"""
+Read-through response cache for the catalog endpoints, with ETag / If-None-Match support.
+
+Every cached GET names the tables it reads. Each table has a version counter. It is part of
+the cache key and is bumped after any commit that wrote the table (see changes.py), so a write
+invalidates exactly the entries that depend on it. Entries also expire after CACHE_TTL seconds.
+
+Backends:
+- 'memory': per-process LRU, the development default. Other workers' writes are only seen once the
+  TTL expires, so production (several gunicorn workers) uses 'redis', or 'null' without a Redis.
+- 'redis': shared across workers; CACHE_REDIS_URL or a redis client. Eviction is left to the
+  server's maxmemory-policy (allkeys-lru).
+- 'fakeredis': the redis backend on an in-process fakeredis server, for tests.
+- 'null': caching disabled.
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import current_app, request
+from werkzeug.http import parse_date
+from werkzeug.wrappers import Response as ResponseBase
+from changes import on_commit
+from conditional import is_not_modified
+from replicas import read_primary_after_write
+
+
+class NullCache:
+    """
+    Backend that stores nothing, used when CACHE_BACKEND = 'null'.
+    """
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value, ttl):
+        pass
+
+    def versions(self, tables):
+        return [0] * len(tables)
+
+    def bump(self, tables):
+        pass
+
+
+class MemoryCache(NullCache):
+    """
+    In-process LRU cache with per-entry expiry.
+    """
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.table_versions = {}
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def versions(self, tables):
+        return [self.table_versions.get(table, 0) for table in tables]
+
+    def bump(self, tables):
+        with self.lock:
+            for table in tables:
+                self.table_versions[table] = self.table_versions.get(table, 0) + 1
+
+
+class RedisCache(NullCache):
+    """
+    Cache shared by every worker through Redis. Values are stored as JSON with SETEX, table
+    versions are plain counters read with one MGET and bumped with INCR.
+    """
+
+    def __init__(self, client, prefix='global-learn:cache:'):
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key, value, ttl):
+        self.client.setex(self.prefix + key, ttl, json.dumps(value))
+
+    def versions(self, tables):
+        raw = self.client.mget([f'{self.prefix}version:{table}' for table in tables])
+        return [int(value) if value is not None else 0 for value in raw]
+
+    def bump(self, tables):
+        pipe = self.client.pipeline()
+        for table in tables:
+            pipe.incr(f'{self.prefix}version:{table}')
+        pipe.execute()
+
+
+def create_backend(config):
+    kind = config.get('CACHE_BACKEND', 'memory')
+    if kind == 'memory':
+        return MemoryCache(config.get('CACHE_MAX_ENTRIES', 1024))
+    if kind == 'redis':
+        import redis
+        return RedisCache(redis.Redis.from_url(config['CACHE_REDIS_URL']))
+    if kind == 'fakeredis':
+        import fakeredis
+        return RedisCache(fakeredis.FakeRedis())
+    if kind == 'null':
+        return NullCache()
+    raise ValueError(f'Unknown CACHE_BACKEND {kind!r}')
+
+
+def init_cache(app):
+    """
+    Creates the cache backend configured for `app`.
+    """
+    app.extensions['response_cache'] = create_backend(app.config)
+
+
+def get_cache():
+    return current_app.extensions.get('response_cache') or NullCache()
+
+
+@on_commit
+def _invalidate(session, tables):
+    # Commits always happen inside an app context with Flask-SQLAlchemy
+    get_cache().bump(sorted(tables))
+
+
+def _etag(body):
+    return hashlib.sha1(json.dumps(body, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _validators(etag, last_modified):
+    headers = {'ETag': f'"{etag}"'}
+    if last_modified:
+        headers['Last-Modified'] = last_modified
+    return headers
+
+
+def _not_modified(etag):
+    return '', 304, {'ETag': f'"{etag}"'}
+
+
+def cached(*tables):
+    """
+    Decorates a Resource GET method whose response only depends on the request URL and the
+    given `tables`.
+
+    A hit returns the stored body (or 304 Not Modified if the client's If-None-Match or
+    If-Modified-Since matches) without touching the database or serializing anything. A miss calls the method and stores
+    successful responses. Streamed responses and errors are passed through uncached.
+    """
+    tables = tuple(sorted(tables))
+
+    def decorator(method):
+        @wraps(method)
+        def wrapper(*args, **kwargs):
+            cache = get_cache()
+            versions = cache.versions(tables)
+            query = '&'.join(f'{k}={v}' for k, v in sorted(request.args.items(multi=True)))
+            key = '|'.join([
+                request.path, query, request.headers.get('Accept', ''),
+                ','.join(f'{table}:{version}' for table, version in zip(tables, versions)),
+            ])
+
+            entry = cache.get(key)
+            if entry is not None:
+                etag, body, *rest = entry
+                last_modified = rest[0] if rest else None
+                if is_not_modified(etag, parse_date(last_modified) if last_modified else None):
+                    return _not_modified(etag)
+                return body, 200, _validators(etag, last_modified)
+
+            read_primary_after_write(tables)
+            result = method(*args, **kwargs)
+            if isinstance(result, ResponseBase):
+                return result
+            body, status = (result[0], result[1]) if isinstance(result, tuple) else (result, 200)
+            if status != 200:
+                return result
+
+            # Keep the validators of @conditional resources; hash the body otherwise
+            headers = result[2] if isinstance(result, tuple) and len(result) > 2 else {}
+            etag = headers['ETag'].strip('"') if 'ETag' in headers else _etag(body)
+            last_modified = headers.get('Last-Modified')
+            cache.set(key, [etag, body, last_modified], current_app.config.get('CACHE_TTL', 60))
+            if is_not_modified(etag, parse_date(last_modified) if last_modified else None):
+                return _not_modified(etag)
+            return body, 200, _validators(etag, last_modified)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,79 @@
+"""
+Tracks which tables a session wrote to and tells subscribers once the transaction commits.
+
+Unit-of-work flushes are seen through `after_flush`, ORM-enabled INSERT/UPDATE/DELETE
+statements (bulk endpoints, insert_link) through `do_orm_execute`. Writes that bypass both,
+such as COPY, call `mark_changed()` themselves.
+"""
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+_subscribers = []
+
+# Tables written by database triggers when the key table is written (see models.py)
+TRIGGERED_WRITES = {
+    'enrollments': ('courses', 'students', 'report_teacher_students', 'report_course_pairs'),
+    'teacher_courses': ('teachers', 'report_teacher_students'),
+}
+# Tables whose rows the database deletes (ON DELETE CASCADE) when a row of the key table is deleted
+CASCADED_DELETES = {
+    'students': ('enrollments',),
+    'teachers': ('teacher_courses',),
+    'courses': ('enrollments', 'teacher_courses'),
+}
+
+
+def on_commit(callback):
+    """
+    Registers `callback(session, tables)`, called after every commit that changed at least one table.
+    Can be used as a decorator.
+    """
+    _subscribers.append(callback)
+    return callback
+
+
+def mark_changed(session, *tables):
+    """
+    Records that `tables` (table names) were written in the current transaction of `session`.
+    """
+    changed = session.info.setdefault('changed_tables', set())
+    for table in tables:
+        changed.add(table)
+        changed.update(TRIGGERED_WRITES.get(table, ()))
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_flushed(session, flush_context):
+    tables = {
+        obj.__table__.name
+        for obj in (*session.new, *session.dirty, *session.deleted)
+        if hasattr(obj, '__table__')
+    }
+    tables.update(
+        table for obj in session.deleted if hasattr(obj, '__table__')
+        for table in CASCADED_DELETES.get(obj.__table__.name, ())
+    )
+    if tables:
+        mark_changed(session, *tables)
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _collect_statement(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        table = getattr(orm_execute_state.statement, 'table', None)
+        if table is not None:
+            cascaded = CASCADED_DELETES.get(table.name, ()) if orm_execute_state.is_delete else ()
+            mark_changed(orm_execute_state.session, table.name, *cascaded)
+
+
+@event.listens_for(Session, 'after_commit')
+def _notify(session):
+    tables = session.info.pop('changed_tables', None)
+    if tables:
+        for callback in _subscribers:
+            callback(session, tables)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard(session):
+    session.info.pop('changed_tables', None)
@@ -0,0 +1,142 @@
+"""
+Response compression negotiated with Accept-Encoding: brotli (when the brotli package is
+installed) or gzip, for API responses of at least COMPRESS_MIN_SIZE bytes. Streamed responses
+(?format=ndjson) are compressed as they stream.
+
+A compressed response is a different representation, so its ETag gets an encoding suffix
+("<etag>-gzip"). The suffix is removed again from incoming If-None-Match headers, so the
+conditional GETs of cache.py and conditional.py keep matching.
+"""
+import re
+import zlib
+from flask import current_app, g, request
+from pagination import NDJSON_MIMETYPE
+from representations import MSGPACK_MIMETYPES
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional encoding
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = {'application/json', NDJSON_MIMETYPE, 'text/csv', 'text/plain', *MSGPACK_MIMETYPES}
+# A streamed response is flushed to the client after about this much input
+STREAM_FLUSH_BYTES = 64 * 1024
+
+_ETAG_SUFFIX = re.compile(r'-(gzip|br)"')
+
+
+class GzipEncoder:
+    def __init__(self, config):
+        # wbits 31: deflate with a gzip header and trailer
+        self._compressor = zlib.compressobj(config.get('COMPRESS_GZIP_LEVEL', 6), zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._compressor.flush()
+
+
+class BrotliEncoder:
+    def __init__(self, config):
+        # Quality 4 compresses better than gzip -6 at a similar cost; 11 is for static files
+        self._compressor = brotli.Compressor(quality=config.get('COMPRESS_BROTLI_QUALITY', 4))
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self):
+        return self._compressor.flush()
+
+    def finish(self):
+        return self._compressor.finish()
+
+
+ENCODERS = {'br': BrotliEncoder, 'gzip': GzipEncoder} if brotli is not None else {'gzip': GzipEncoder}
+
+
+def compress(data, encoding, config):
+    """
+    Compresses `data` (bytes) with `encoding` ('br' or 'gzip').
+    """
+    encoder = ENCODERS[encoding](config)
+    return encoder.compress(data) + encoder.finish()
+
+
+def _compress_stream(chunks, encoder):
+    pending = 0
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode()
+            out = encoder.compress(chunk)
+            pending += len(chunk)
+            if pending >= STREAM_FLUSH_BYTES:
+                out += encoder.flush()
+                pending = 0
+            if out:
+                yield out
+        yield encoder.finish()
+    finally:
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
+
+
+def _suffix_etag(response, encoding):
+    etag = response.headers.get('ETag')
+    if etag and etag.endswith('"'):
+        response.headers['ETag'] = f'{etag[:-1]}-{encoding}"'
+
+
+def _strip_etag_suffixes():
+    # Runs before anything reads request.if_none_match
+    value = request.environ.get('HTTP_IF_NONE_MATCH')
+    if value:
+        match = _ETAG_SUFFIX.search(value)
+        if match:
+            g.etag_encoding = match.group(1)
+            request.environ['HTTP_IF_NONE_MATCH'] = _ETAG_SUFFIX.sub('"', value)
+
+
+def _compress_response(response):
+    config = current_app.config
+    if response.status_code == 304:
+        if g.get('etag_encoding'):
+            _suffix_etag(response, g.etag_encoding)
+        return response
+    if (
+        request.method == 'HEAD' or response.status_code < 200 or response.status_code == 204
+        or 'Content-Encoding' in response.headers or response.mimetype not in COMPRESSIBLE_MIMETYPES
+    ):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = request.accept_encodings.best_match(list(ENCODERS))
+    if encoding is None:
+        return response
+
+    if response.is_streamed:
+        response.response = _compress_stream(response.response, ENCODERS[encoding](config))
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < config.get('COMPRESS_MIN_SIZE', 1024):
+            return response
+        response.set_data(compress(data, encoding, config))
+    response.headers['Content-Encoding'] = encoding
+    _suffix_etag(response, encoding)
+    return response
+
+
+def init_compression(app):
+    """
+    Compresses the responses of `app` when COMPRESS_ENABLED is set.
+    """
+    if not app.config.get('COMPRESS_ENABLED', True):
+        return
+    app.before_request(_strip_etag_suffixes)
+    app.after_request(_compress_response)
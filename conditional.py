@@ -0,0 +1,271 @@
+"""
+Conditional GET (ETag / Last-Modified) for the entity resources, driven by the change stamps
+of the rows they return (models.ChangeStampMixin).
+
+A stamp is (tag, last_modified): the versions of the rows behind a response and their latest
+updated_at. A resource provides it twice:
+
+- `stamp(*args, **kwargs)`, called with the arguments of its GET, reads only the version /
+  updated_at columns (usually one indexed row). It runs only when the request carries
+  If-None-Match or If-Modified-Since; if the client's copy is current the answer is
+  304 Not Modified and the full fetch and serialization are skipped.
+- the GET itself adds stamp_columns() to its SELECT and calls record_stamp() or
+  record_collection_stamp() on the result, so full responses get their ETag and
+  Last-Modified without another statement.
+
+Both return None / record nothing for requests that are not about one entity (lists, searches).
+
+ETags start with the stamp's versions ("<versions>/<digest>"), so PUT and DELETE can take one
+back in If-Match: update_row() and delete_row() write only if the row still has the version the
+client read, in the same UPDATE or DELETE statement, and answer 412 Precondition Failed otherwise. Without If-Match
+(or with If-Match: *) the write is unconditional, as before.
+"""
+import hashlib
+from datetime import timezone
+from functools import wraps
+from flask import g, request
+from flask_restful import abort
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.exc import IntegrityError
+from werkzeug.http import http_date
+from werkzeug.wrappers import Response as ResponseBase
+from models import db
+from db_helpers import abort_on_unique_violation
+
+
+def _combine(values):
+    # values: version, updated_at, version, updated_at, ...
+    updated = [value for value in values[1::2] if value is not None]
+    return '.'.join(str(version) for version in values[0::2]), max(updated, default=None)
+
+
+def stamp_from(stmt):
+    """
+    Runs `stmt`, a SELECT of (version, updated_at) column pairs (a row and the rows joined to
+    it), and combines them into one stamp. None if it returns no row.
+    """
+    row = db.session.execute(stmt).first()
+    return _combine(tuple(row)) if row is not None else None
+
+
+def row_stamp(model, *criteria):
+    """
+    Stamp of the single `model` row matching `criteria`.
+    """
+    return stamp_from(select(model.version, model.updated_at).where(*criteria))
+
+
+def collection_stamp(parent_key, parent_id, link_parent_key, link_child_key, child_key):
+    """
+    Stamp of a parent row and the children linked to it through a link table, e.g.
+    collection_stamp(Student.student_id, 5, Enrollment.student_id, Enrollment.course_id, Course.course_id).
+
+    Adding or removing a link bumps the parent's version (models.py triggers), and child
+    versions only grow, so the parent's version with the sum of the children's versions
+    changes whenever the collection does.
+    """
+    parent, child = parent_key.class_, child_key.class_
+    return stamp_from(
+        select(parent.version, parent.updated_at, func.sum(child.version), func.max(child.updated_at))
+        .select_from(parent)
+        .outerjoin(link_parent_key.class_, link_parent_key == parent_key)
+        .outerjoin(child, child_key == link_child_key)
+        .where(parent_key == parent_id)
+        .group_by(parent_key, parent.version, parent.updated_at)
+    )
+
+
+def stamp_columns(*models):
+    """
+    The version and updated_at columns of `models`, to add last to a resource's SELECT. The
+    serializers only read the leading columns, so the payload is unchanged.
+    """
+    return [
+        column
+        for model in models
+        for column in (
+            model.version.label(f'stamp_{model.__tablename__}_version'),
+            model.updated_at.label(f'stamp_{model.__tablename__}_updated_at'),
+        )
+    ]
+
+
+def record_stamp(row, models=1):
+    """
+    Records the stamp of the response from a row fetched with stamp_columns() of `models` models.
+    Same stamp as stamp_from() on those models.
+    """
+    g.response_stamp = _combine(tuple(row)[-2 * models:])
+
+
+def record_collection_stamp(rows):
+    """
+    Records the stamp of a collection response from its rows, fetched with
+    stamp_columns(parent, child) over outer joins. Same stamp as collection_stamp().
+    """
+    versions = [row[-2] for row in rows if row[-2] is not None]
+    updated = [row[-1] for row in rows if row[-1] is not None]
+    g.response_stamp = _combine((
+        rows[0][-4], rows[0][-3], sum(versions) if versions else None, max(updated, default=None),
+    ))
+
+
+def representation_etag(tag):
+    """
+    ETag of the representation of a resource whose rows have the stamp `tag`: the same rows
+    asked for with other query arguments (?fields=) or media type get another ETag.
+    """
+    query = '&'.join(f'{k}={v}' for k, v in sorted(request.args.items(multi=True)))
+    key = '|'.join([tag, request.path, query, request.headers.get('Accept', '')])
+    return f'{tag}/{hashlib.sha1(key.encode()).hexdigest()}'
+
+
+def _http_time(updated_at):
+    # Stored as naive UTC; HTTP dates have whole seconds
+    return updated_at.replace(tzinfo=timezone.utc, microsecond=0) if updated_at is not None else None
+
+
+def validator_headers(stamp):
+    """
+    ETag and Last-Modified headers for `stamp`.
+    """
+    tag, last_modified = stamp
+    headers = {'ETag': f'"{representation_etag(tag)}"'}
+    if last_modified is not None:
+        headers['Last-Modified'] = http_date(_http_time(last_modified))
+    return headers
+
+
+def is_not_modified(etag, last_modified):
+    """
+    True if the request's If-None-Match (or, without one, If-Modified-Since) matches.
+    `etag` is unquoted, `last_modified` an aware datetime or None.
+    """
+    # If-None-Match takes precedence over If-Modified-Since (RFC 9110, 13.2.2)
+    if request.if_none_match:
+        return request.if_none_match.contains(etag)
+    if request.if_modified_since and last_modified is not None:
+        return last_modified <= request.if_modified_since
+    return False
+
+
+def _with_headers(result, headers):
+    """
+    Adds `headers` to a Resource method result if it is a successful response.
+    """
+    if isinstance(result, ResponseBase):
+        if result.status_code == 200:
+            result.headers.update(headers)
+        return result
+    if not isinstance(result, tuple):
+        return result, 200, headers
+    body, status, *rest = result
+    if status != 200:
+        return result
+    return body, status, {**(rest[0] if rest else {}), **headers}
+
+
+def conditional(method):
+    """
+    Decorates a Resource GET method: answers 304 Not Modified from the resource's stamp() when
+    the client's copy is current, and sends ETag and Last-Modified with full responses.
+
+    Goes below @cached, which then stores and revalidates with the same validators.
+    """
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        stamp = None
+        if request.if_none_match or request.if_modified_since:
+            stamp = self.stamp(*args, **kwargs)
+            if stamp is not None:
+                headers = validator_headers(stamp)
+                if is_not_modified(headers['ETag'].strip('"'), _http_time(stamp[1])):
+                    return '', 304, headers
+
+        g.response_stamp = None
+        result = method(self, *args, **kwargs)
+        stamp = g.pop('response_stamp', None) or stamp
+        if stamp is None:
+            return result
+        return _with_headers(result, validator_headers(stamp))
+
+    return wrapper
+
+
+# ---------------------Preconditions of writes (If-Match)----------------------------------------
+
+def if_match_versions():
+    """
+    Versions of the written row that the request's If-Match accepts: None without If-Match or
+    with If-Match: *, else the last version of each listed ETag's stamp (the entity itself for
+    lookups, the profile for the profile GETs). A bare version ("3") is accepted too.
+    """
+    if not request.if_match or request.if_match.star_tag:
+        return None
+    versions = set()
+    for etag in request.if_match:
+        version = etag.split('/', 1)[0].rsplit('.', 1)[-1]
+        if version.isdigit():
+            versions.add(int(version))
+    return versions
+
+
+def precondition_failed(name):
+    abort(412, message=f'{name} was changed since the version in If-Match; fetch it again')
+
+
+def update_row(model, criteria, values, name):
+    """
+    Applies `values` to the `model` row matching `criteria` with one UPDATE ... RETURNING, guarded
+    by the request's If-Match (`AND version IN (...)`): no SELECT before the write, and an edit
+    committed since the client's read is refused rather than overwritten. Returns the updated
+    entity; aborts with 404 if no row matches `criteria`, 412 if the row has another version (one
+    more SELECT, on failure only), 409 if a unique column would be duplicated, and 400 if `values`
+    is empty: an UPDATE that changes nothing would still bump the version and fail other clients'
+    If-Match.
+    """
+    if not values:
+        abort(400, message=f'No {name.lower()} fields to update')
+    versions = if_match_versions()
+    stmt = update(model).where(*criteria).values(values).returning(model)
+    if versions is not None:
+        stmt = stmt.where(model.version.in_(versions))
+    try:
+        row = db.session.execute(stmt, execution_options={'synchronize_session': False}).scalar()
+    except IntegrityError as error:
+        abort_on_unique_violation(error, model)
+    if row is not None:
+        return row
+    _refuse_write(model, criteria, versions, name)
+
+
+def delete_row(model, criteria, name):
+    """
+    Deletes the `model` row matching `criteria` with one DELETE ... RETURNING, guarded by the
+    request's If-Match like update_row(). The rows referencing it are deleted or unlinked by the
+    database (ON DELETE rules, see models.py), so nothing is loaded first. Returns the primary key
+    of the deleted row; aborts with 404 or 412 like update_row().
+    """
+    versions = if_match_versions()
+    pk_column = model.__mapper__.primary_key[0]
+    stmt = delete(model).where(*criteria).returning(pk_column)
+    if versions is not None:
+        stmt = stmt.where(model.version.in_(versions))
+    pk = db.session.execute(stmt, execution_options={'synchronize_session': False}).scalar()
+    if pk is not None:
+        return pk
+    _refuse_write(model, criteria, versions, name)
+
+
+def _refuse_write(model, criteria, versions, name):
+    # Nothing was written: 412 if the row exists at another version (one more SELECT), else 404
+    if versions is not None and db.session.scalar(select(model.version).where(*criteria)) is not None:
+        precondition_failed(name)
+    abort(404, message=f'{name} not found')
+
+
+def row_validators(row):
+    """
+    ETag and Last-Modified of a written `row`, to send with the response of the write.
+    """
+    return validator_headers((str(row.version), row.updated_at))
@@ -1,16 +1,140 @@
 import os
+from sqlalchemy import make_url
+from instrumentation import TimedQueuePool
+
+
+def pool_options(url=None, workers=None, max_connections=None):
+    """
+    Engine options for the connection pool of each gunicorn worker, for the database at `url`.
+
+    Every worker process has its own pool, so the connection budget of the database
+    (DB_MAX_CONNECTIONS) is split across the WEB_CONCURRENCY workers: each worker gets
+    pool_size + max_overflow <= DB_MAX_CONNECTIONS // WEB_CONCURRENCY. The server-side
+    statement timeout is a libpq option, only set on PostgreSQL.
+    """
+    workers = workers or int(os.getenv('WEB_CONCURRENCY', 2))
+    max_connections = max_connections or int(os.getenv('DB_MAX_CONNECTIONS', 20))
+    per_worker = max(1, max_connections // workers)
+    max_overflow = int(os.getenv('DB_MAX_OVERFLOW', per_worker // 4))
+    pool_size = int(os.getenv('DB_POOL_SIZE', max(1, per_worker - max_overflow)))
+    statement_timeout_ms = int(os.getenv('DB_STATEMENT_TIMEOUT_MS', 5000))
+    options = {
+        'poolclass': TimedQueuePool,
+        'pool_size': pool_size,
+        'max_overflow': max_overflow,
+        # Seconds a request waits for a free connection before failing
+        'pool_timeout': int(os.getenv('DB_POOL_TIMEOUT', 10)),
+        # Test connections on checkout, so ones dropped by the server or a proxy are replaced
+        'pool_pre_ping': True,
+        # Replace connections before server-side idle timeouts close them
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', 1800)),
+    }
+    if url and make_url(url).get_backend_name() == 'postgresql':
+        # Abort runaway queries on the server instead of holding a connection forever
+        options['connect_args'] = {'options': f'-c statement_timeout={statement_timeout_ms}'}
+    return options
+
+
+def env_mapping(name, parse=int):
+    """
+    Reads an environment variable like 'a=1,b=2' as {'a': parse('1'), 'b': parse('2')}.
+    """
+    items = (item.split('=', 1) for item in os.getenv(name, '').split(',') if item.strip())
+    return {key.strip(): parse(value.strip()) for key, value in items}
+
+
+def rate_and_burst(value):
+    rate, burst = value.split('/')
+    return float(rate), float(burst)
+
 
 class Config:
     SECRET_KEY = os.getenv('SECRET_KEY', 'default_secret_key_here')
     SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Read replicas (replicas.py): comma-separated DB_REPLICA_URLS, the replication lag above which a
+    # replica is skipped, seconds between health checks, and how long a client's reads stay on the
+    # primary after it wrote
+    REPLICA_URLS = [url.strip() for url in os.getenv('DB_REPLICA_URLS', '').split(',') if url.strip()]
+    REPLICA_MAX_LAG_SECONDS = float(os.getenv('REPLICA_MAX_LAG_SECONDS', 5))
+    REPLICA_CHECK_INTERVAL = float(os.getenv('REPLICA_CHECK_INTERVAL', 5))
+    REPLICA_LAG_QUERY = os.getenv('REPLICA_LAG_QUERY')
+    READ_YOUR_WRITES_SECONDS = int(os.getenv('READ_YOUR_WRITES_SECONDS', 5))
+    # Bulk endpoints: rows committed per transaction, and the most rows accepted in one request
+    BULK_CHUNK_SIZE = int(os.getenv('BULK_CHUNK_SIZE', 1000))
+    BULK_MAX_ROWS = int(os.getenv('BULK_MAX_ROWS', 100000))
+    # GET sub-requests accepted in one POST /batch
+    BATCH_MAX_REQUESTS = int(os.getenv('BATCH_MAX_REQUESTS', 50))
+    # ?expand= (expand.py): deepest dotted path, items embedded per parent, rows per expansion statement
+    EXPAND_MAX_DEPTH = int(os.getenv('EXPAND_MAX_DEPTH', 2))
+    EXPAND_MAX_ITEMS = int(os.getenv('EXPAND_MAX_ITEMS', 50))
+    EXPAND_MAX_ROWS = int(os.getenv('EXPAND_MAX_ROWS', 5000))
+    # Exports (exports.py): rows fetched per round trip from the server-side cursor, and per Parquet row group
+    EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', 5000))
+    # CSV imports (imports.py): records per staged chunk, staging worker processes (each holds one
+    # database connection while the import runs) and invalid rows listed in the HTTP response
+    IMPORT_CHUNK_SIZE = int(os.getenv('IMPORT_CHUNK_SIZE', 5000))
+    IMPORT_WORKERS = int(os.getenv('IMPORT_WORKERS', min(4, os.cpu_count() or 1)))
+    IMPORT_MAX_ERRORS = int(os.getenv('IMPORT_MAX_ERRORS', 1000))
+    # Write-behind enrollments (enrollments.py): 'off', 'memory' or 'sqlite' (a local file shared by
+    # the workers of one host); tickets drained per transaction, wait before draining, and how long
+    # finished tickets can be polled
+    ENROLLMENT_QUEUE = os.getenv('ENROLLMENT_QUEUE', 'off')
+    ENROLLMENT_QUEUE_PATH = os.getenv('ENROLLMENT_QUEUE_PATH', 'enrollment_queue.sqlite3')
+    ENROLLMENT_QUEUE_BATCH_SIZE = int(os.getenv('ENROLLMENT_QUEUE_BATCH_SIZE', 500))
+    ENROLLMENT_QUEUE_INTERVAL_MS = int(os.getenv('ENROLLMENT_QUEUE_INTERVAL_MS', 20))
+    ENROLLMENT_QUEUE_CLAIM_TIMEOUT = int(os.getenv('ENROLLMENT_QUEUE_CLAIM_TIMEOUT', 60))
+    ENROLLMENT_TICKET_TTL = int(os.getenv('ENROLLMENT_TICKET_TTL', 3600))
+    # Response cache for the catalog endpoints: 'memory' (one per process, development only), 'redis',
+    # 'fakeredis' or 'null'
+    CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'memory')
+    CACHE_REDIS_URL = os.getenv('CACHE_REDIS_URL', 'redis://localhost:6379/0')
+    CACHE_TTL = int(os.getenv('CACHE_TTL', 60))
+    CACHE_MAX_ENTRIES = int(os.getenv('CACHE_MAX_ENTRIES', 1024))
+    # Rate limiting (ratelimit.py): token buckets ('off', 'memory', 'redis' or 'fakeredis'), each
+    # client's tokens per second and burst, buckets kept in memory, shared limits of some endpoints
+    # ('endpoint=rate/burst,...'), token costs (ratelimit.ENDPOINT_COSTS overridden by 'endpoint=cost,...',
+    # list pages, NDJSON streams of whole lists) and the proxies in front of the app (0: use the peer address)
+    RATE_LIMIT_BACKEND = os.getenv('RATE_LIMIT_BACKEND', 'off')
+    RATE_LIMIT_REDIS_URL = os.getenv('RATE_LIMIT_REDIS_URL', os.getenv('CACHE_REDIS_URL', 'redis://localhost:6379/0'))
+    RATE_LIMIT_RATE = float(os.getenv('RATE_LIMIT_RATE', 20))
+    RATE_LIMIT_BURST = float(os.getenv('RATE_LIMIT_BURST', 100))
+    RATE_LIMIT_MAX_CLIENTS = int(os.getenv('RATE_LIMIT_MAX_CLIENTS', 10000))
+    RATE_LIMIT_ENDPOINTS = env_mapping('RATE_LIMIT_ENDPOINTS', rate_and_burst)
+    RATE_LIMIT_COSTS = env_mapping('RATE_LIMIT_COSTS')
+    RATE_LIMIT_SCAN_COST = int(os.getenv('RATE_LIMIT_SCAN_COST', 10))
+    RATE_LIMIT_STREAM_COST = int(os.getenv('RATE_LIMIT_STREAM_COST', 100))
+    RATE_LIMIT_TRUSTED_PROXIES = int(os.getenv('RATE_LIMIT_TRUSTED_PROXIES', 0))
+    # Admission control (ratelimit.py): token cost of the requests a worker runs at once (0: unlimited),
+    # share of it open to requests costing more than 1, and the Retry-After of the requests it refuses
+    ADMISSION_MAX_COST = int(os.getenv('ADMISSION_MAX_COST', 0))
+    ADMISSION_HEAVY_SHARE = float(os.getenv('ADMISSION_HEAVY_SHARE', 0.5))
+    ADMISSION_RETRY_AFTER = int(os.getenv('ADMISSION_RETRY_AFTER', 1))
+    # Request profiling: share of requests whose SQL statements are timed, slow-query threshold,
+    # and whether slow SELECTs are logged with their EXPLAIN plan (PostgreSQL only)
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() == 'true'
+    METRICS_SAMPLE_RATE = float(os.getenv('METRICS_SAMPLE_RATE', 1.0))
+    SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', 250))
+    SLOW_QUERY_EXPLAIN = os.getenv('SLOW_QUERY_EXPLAIN', 'false').lower() == 'true'
+    # Response compression (compression.py): responses smaller than COMPRESS_MIN_SIZE bytes are sent as is
+    COMPRESS_ENABLED = os.getenv('COMPRESS_ENABLED', 'true').lower() == 'true'
+    COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', 1024))
+    COMPRESS_GZIP_LEVEL = int(os.getenv('COMPRESS_GZIP_LEVEL', 6))
+    COMPRESS_BROTLI_QUALITY = int(os.getenv('COMPRESS_BROTLI_QUALITY', 4))
 
 class DevelopmentConfig(Config):
     DEBUG = True
 
 class ProductionConfig(Config):
     DEBUG = False
-    # Other production configurations...
+    # create_app() sizes each worker's pool from the environment for the configured database (pool_options())
+    DB_POOL_FROM_ENV = True
+    METRICS_SAMPLE_RATE = float(os.getenv('METRICS_SAMPLE_RATE', 0.05))
+    SLOW_QUERY_EXPLAIN = os.getenv('SLOW_QUERY_EXPLAIN', 'true').lower() == 'true'
+    # Behind a proxy every client has the proxy's address: limit per client only once the proxies are declared
+    RATE_LIMIT_BACKEND = os.getenv('RATE_LIMIT_BACKEND', 'memory' if os.getenv('RATE_LIMIT_TRUSTED_PROXIES') else 'off')
+    # Invalidation must reach every worker: a per-process cache would serve stale catalogs for CACHE_TTL
+    CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'redis' if os.getenv('CACHE_REDIS_URL') else 'null')
 
 class TestingConfig(Config):
     TESTING = True
@@ -0,0 +1,78 @@
+"""
+Consistency check and rebuild of the denormalized enrollment counters
+(students.course_count, courses.student_count), which the triggers in models.py maintain.
+
+    flask counters check     # exit status 1 if any counter differs from the enrollments
+    flask counters rebuild   # recompute every counter from the enrollments
+"""
+import click
+from flask.cli import AppGroup
+from sqlalchemy import func, select, update
+from models import db, Student, Course, Enrollment
+
+# (model, counter column, key column of the model, key column in enrollments)
+COUNTERS = [
+    (Course, Course.student_count, Course.course_id, Enrollment.course_id),
+    (Student, Student.course_count, Student.student_id, Enrollment.student_id),
+]
+
+
+def _actual_count(key, enrollment_key):
+    return (
+        select(func.count())
+        .where(enrollment_key == key)
+        .correlate(key.table)
+        .scalar_subquery()
+    )
+
+
+def counter_drift(limit=20):
+    """
+    Returns {table name: (number of rows whose counter is wrong, up to `limit` of them as
+    (id, stored, actual))}.
+    """
+    drift = {}
+    for model, counter, key, enrollment_key in COUNTERS:
+        actual = _actual_count(key, enrollment_key)
+        wrong = counter != actual
+        total = db.session.scalar(select(func.count()).select_from(model).where(wrong))
+        sample = db.session.execute(select(key, counter, actual).where(wrong).order_by(key).limit(limit)).all()
+        drift[model.__tablename__] = (total, [tuple(row) for row in sample])
+    return drift
+
+
+def rebuild_counters():
+    """
+    Recomputes every counter from the enrollments in one UPDATE per table and commits.
+    Returns {table name: number of rows updated}.
+    """
+    updated = {}
+    for model, counter, key, enrollment_key in COUNTERS:
+        actual = _actual_count(key, enrollment_key)
+        result = db.session.execute(
+            update(model).where(counter != actual).values({counter.key: actual}),
+            execution_options={'synchronize_session': False},
+        )
+        updated[model.__tablename__] = result.rowcount
+    db.session.commit()
+    return updated
+
+
+counters_cli = AppGroup('counters', help='Check or rebuild the enrollment counters.')
+
+
+@counters_cli.command('check')
+def check_command():
+    drift = counter_drift()
+    for table, (total, sample) in drift.items():
+        click.echo(f'{table}: {total} wrong counter(s)')
+        for key, stored, actual in sample:
+            click.echo(f'  id {key}: stored {stored}, actual {actual}')
+    if any(total for total, _ in drift.values()):
+        raise SystemExit(1)
+
+
+@counters_cli.command('rebuild')
+def rebuild_command():
+    for table, count in rebuild_counters().items():
+        click.echo(f'{table}: {count} counter(s) corrected')
@@ -0,0 +1,272 @@
+"""
+Generates a large synthetic dataset for load tests, e.g. one million students:
+
+    python datagen.py --students 1000000 --courses 2000 --teachers 5000 --workers 4 --reset
+
+Unlike seed.py (a few Faker rows added one by one) rows are built from fixed word lists and
+written in batches: COPY on PostgreSQL, executemany INSERTs elsewhere. Course popularity follows
+a Zipf distribution, so a few courses hold most enrollments as in production.
+
+Every batch has its own random generator derived from --seed, so the same arguments always
+produce the same data, whatever the number of workers. With --workers > 1 batches are built in
+parallel processes; on PostgreSQL the workers also load them over their own connections, on
+SQLite (a single writer) the parent process loads them in order.
+"""
+import argparse
+import random
+import sys
+import time
+from datetime import date, timedelta
+from itertools import accumulate
+from multiprocessing import Pool
+from flask_migrate import upgrade
+from sqlalchemy import func, select, text
+from app import create_app
+from db_helpers import copy_rows, dialect_name
+from models import db, Student, StudentProfile, Teacher, TeacherProfile, Course, Enrollment, TeacherCourse
+
+FIRST_NAMES = (
+    'Amina', 'Brian', 'Chloe', 'David', 'Esther', 'Faith', 'George', 'Hannah', 'Ian', 'Joy',
+    'Kevin', 'Lucy', 'Moses', 'Nancy', 'Oscar', 'Purity', 'Quincy', 'Rose', 'Samuel', 'Tabitha',
+    'Umar', 'Violet', 'Walter', 'Ximena', 'Yusuf', 'Zawadi', 'Aaron', 'Beatrice', 'Caleb', 'Diana',
+)
+LAST_NAMES = (
+    'Achieng', 'Baraka', 'Chebet', 'Danso', 'Eze', 'Fofana', 'Gitau', 'Hassan', 'Ibrahim', 'Juma',
+    'Kamau', 'Langat', 'Mwangi', 'Njoroge', 'Odhiambo', 'Otieno', 'Rotich', 'Smith', 'Tanui', 'Wanjiru',
+    'Kamoni', 'Mensah', 'Nkosi', 'Okafor', 'Owino', 'Sang', 'Toure', 'Wafula', 'Yeboah', 'Zulu',
+)
+SUBJECTS = (
+    'Algebra', 'Biology', 'Chemistry', 'Databases', 'Economics', 'French', 'Geography', 'History',
+    'Literature', 'Machine Learning', 'Networks', 'Physics', 'Statistics', 'Web Development',
+)
+LEVELS = ('Introduction to', 'Intermediate', 'Advanced', 'Applied', 'Topics in')
+CAPACITIES = (None, 50, 100, 250, 1000, 5000)
+
+# Generated tables in load order: (model, columns)
+TABLES = {
+    'student_profiles': (StudentProfile, ('student_profile_id', 'bio', 'photo_url')),
+    'teacher_profiles': (TeacherProfile, ('teacher_profile_id', 'bio', 'photo_url', 'phone_no')),
+    'courses': (Course, ('course_id', 'course_name', 'description', 'capacity')),
+    'students': (Student, ('student_id', 'name', 'date_of_birth', 'email', 'reg_no', 'student_profile_id')),
+    'teachers': (Teacher, ('teacher_id', 'name', 'email', 'teacher_profile_id')),
+    'enrollments': (Enrollment, ('student_id', 'course_id')),
+    'teacher_courses': (TeacherCourse, ('teacher_id', 'course_id')),
+}
+
+
+def zipf_cum_weights(n, exponent):
+    """
+    Cumulative weights of ranks 1..n under Zipf's law (weight of rank k is 1 / k**exponent).
+    """
+    return list(accumulate(1 / rank ** exponent for rank in range(1, n + 1)))
+
+
+def _name(rng):
+    return f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}'
+
+
+def _pick_distinct(rng, population, cum_weights, count):
+    """
+    Up to `count` distinct Zipf-distributed picks from `population`.
+    """
+    picked = set()
+    for _ in range(3):
+        picked.update(rng.choices(population, cum_weights=cum_weights, k=count - len(picked)))
+        if len(picked) == count:
+            break
+    return sorted(picked)
+
+
+def generate_batch(table, start, stop, options):
+    """
+    Returns the rows of `table` for ids start..stop-1 (students/teachers for the join tables)
+    as tuples ordered like TABLES[table][1].
+    """
+    rng = random.Random(f'{options["seed"]}:{table}:{start}')
+    ids = range(start, stop)
+
+    if table == 'student_profiles':
+        return [(i, f'Bio of student {i}.', f'https://example.com/students/{i}.jpg') for i in ids]
+    if table == 'teacher_profiles':
+        return [
+            (i, f'Bio of teacher {i}.', f'https://example.com/teachers/{i}.jpg', f'+2547{i % 100000000:08d}')
+            for i in ids
+        ]
+    if table == 'courses':
+        return [
+            (
+                i, f'{rng.choice(LEVELS)} {rng.choice(SUBJECTS)} {i}', f'Description of course {i}.',
+                rng.choice(CAPACITIES),
+            )
+            for i in ids
+        ]
+    if table == 'students':
+        profiles = options['student_profiles']
+        first_day = date(1998, 1, 1)
+        return [
+            (
+                i, _name(rng), first_day + timedelta(days=rng.randrange(3650)),
+                f'student{i}@example.com', f'REG-{i:09d}', i if i <= profiles else None,
+            )
+            for i in ids
+        ]
+    if table == 'teachers':
+        profiles = options['teacher_profiles']
+        return [(i, _name(rng), f'teacher{i}@example.com', i if i <= profiles else None) for i in ids]
+
+    courses = range(1, options['courses'] + 1)
+    cum_weights = options['course_weights']
+    if table == 'enrollments':
+        low, high = options['enrollments_per_student']
+        return [
+            (i, course_id)
+            for i in ids
+            for course_id in _pick_distinct(rng, courses, cum_weights, rng.randint(low, high))
+        ]
+    if table == 'teacher_courses':
+        return [
+            (i, course_id)
+            for i in ids
+            for course_id in _pick_distinct(rng, courses, None, rng.randint(1, 3))
+        ]
+    raise ValueError(f'Unknown table {table!r}')
+
+
+def load_batch(table, rows):
+    """
+    Inserts `rows` into `table` and commits. Must be called inside an app context.
+    """
+    model, columns = TABLES[table]
+    if dialect_name() == 'postgresql':
+        copy_rows(model.__table__, columns, rows)
+    else:
+        db.session.execute(model.__table__.insert(), [dict(zip(columns, row)) for row in rows])
+    db.session.commit()
+    return len(rows)
+
+
+# Each worker process builds its own app (and engine) once
+_worker_app = None
+
+
+def _init_worker():
+    global _worker_app
+    _worker_app = create_app()
+
+
+def _generate(job):
+    return job[0], generate_batch(*job)
+
+
+def _generate_and_load(job):
+    with _worker_app.app_context():
+        return job[0], load_batch(job[0], generate_batch(*job))
+
+
+def batch_jobs(counts, options):
+    # Parents before children, so foreign keys are satisfied batch by batch
+    sizes = {
+        'student_profiles': options['student_profiles'], 'teacher_profiles': options['teacher_profiles'],
+        'courses': counts['courses'], 'students': counts['students'], 'teachers': counts['teachers'],
+        'enrollments': counts['students'], 'teacher_courses': counts['teachers'],
+    }
+    for table in TABLES:
+        for start in range(1, sizes[table] + 1, options['batch_size']):
+            yield table, start, min(start + options['batch_size'], sizes[table] + 1), options
+
+
+def reset_sequences():
+    """
+    Moves the PostgreSQL id sequences past the explicit ids written by the generator.
+    """
+    if dialect_name() != 'postgresql':
+        return
+    for model, _ in TABLES.values():
+        table = model.__table__
+        pk = table.primary_key.columns.values()[0]
+        db.session.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{table.name}', '{pk.name}'), "
+            f"COALESCE((SELECT MAX({pk.name}) FROM {table.name}), 0) + 1, false)"
+        ))
+    db.session.commit()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--students', type=int, default=100000)
+    parser.add_argument('--teachers', type=int, default=1000)
+    parser.add_argument('--courses', type=int, default=500)
+    parser.add_argument('--enrollments-per-student', type=int, nargs=2, default=(1, 6), metavar=('MIN', 'MAX'))
+    parser.add_argument('--profile-ratio', type=float, default=0.2, help='share of students and teachers with a profile')
+    parser.add_argument('--zipf-exponent', type=float, default=1.1, help='skew of course popularity')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--batch-size', type=int, default=10000)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--reset', action='store_true', help='delete existing rows first')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    counts = {'students': args.students, 'teachers': args.teachers, 'courses': args.courses}
+    options = {
+        'seed': args.seed,
+        'batch_size': args.batch_size,
+        'courses': args.courses,
+        'course_weights': zipf_cum_weights(args.courses, args.zipf_exponent),
+        'enrollments_per_student': tuple(args.enrollments_per_student),
+        'student_profiles': int(args.students * args.profile_ratio),
+        'teacher_profiles': int(args.teachers * args.profile_ratio),
+    }
+
+    app = create_app()
+    with app.app_context():
+        upgrade()
+        if args.reset:
+            for table in reversed(db.metadata.sorted_tables):
+                db.session.execute(table.delete())
+            db.session.commit()
+        elif db.session.scalar(select(func.count()).select_from(Student)):
+            sys.exit('The database already has students; run with --reset to replace them.')
+        parallel_load = dialect_name() == 'postgresql'
+        db.session.remove()
+        db.engine.dispose()
+
+    start = time.perf_counter()
+    loaded = dict.fromkeys(TABLES, 0)
+    jobs = list(batch_jobs(counts, options))
+
+    def record(table, rows):
+        loaded[table] += rows
+        print(f'\r{sum(loaded.values()):>12,} rows', end='', flush=True)
+
+    if args.workers > 1:
+        with Pool(args.workers, initializer=_init_worker) as pool:
+            # Tables are loaded one after the other so children never arrive before their parents
+            for table in TABLES:
+                table_jobs = [job for job in jobs if job[0] == table]
+                if parallel_load:
+                    for name, rows in pool.imap_unordered(_generate_and_load, table_jobs):
+                        record(name, rows)
+                else:
+                    for name, rows in pool.imap(_generate, table_jobs):
+                        with app.app_context():
+                            record(name, load_batch(name, rows))
+    else:
+        with app.app_context():
+            for job in jobs:
+                record(job[0], load_batch(job[0], generate_batch(*job)))
+
+    with app.app_context():
+        reset_sequences()
+
+    elapsed = time.perf_counter() - start
+    total = sum(loaded.values())
+    print()
+    for table, rows in loaded.items():
+        print(f'{table:<18} {rows:>12,}')
+    print(f'{total:,} rows in {elapsed:.1f} s ({total / elapsed:,.0f} rows/s)')
+
+
+if __name__ == '__main__':
+    main()
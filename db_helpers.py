@@ -0,0 +1,134 @@
+import csv
+import io
+from flask_restful import abort
+from sqlalchemy import Integer, any_, exists, insert, literal, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.util import await_only
+from models import db
+from changes import mark_changed
+
+
+def dialect_name():
+    """
+    Name of the SQL dialect the session is bound to ('postgresql', 'sqlite', ...).
+    """
+    return db.session.get_bind().dialect.name
+
+
+def dialect_insert(model):
+    """
+    Returns the dialect-specific INSERT construct for `model`, which supports ON CONFLICT on
+    PostgreSQL and SQLite. Other backends get the generic INSERT.
+    """
+    name = dialect_name()
+    if name == 'postgresql':
+        return postgresql.insert(model)
+    if name == 'sqlite':
+        return sqlite.insert(model)
+    return insert(model)
+
+
+def abort_on_unique_violation(error, model):
+    """
+    Rolls back after `error`, an IntegrityError raised while writing a `model` row, and answers
+    409 naming the column if it is a unique column of `model` that already has the value. Other
+    integrity errors are re-raised.
+
+    The column is found in the constraint name on PostgreSQL (ix_<table>_<column>) and in the
+    message on SQLite ('UNIQUE constraint failed: <table>.<column>').
+    """
+    db.session.rollback()
+    orig = getattr(error, 'orig', error)
+    constraint = getattr(getattr(orig, 'diag', None), 'constraint_name', None) or ''
+    message = str(orig)
+    table = model.__table__.name
+    for column in model.__table__.columns:
+        if column.unique and (
+            constraint == f'ix_{table}_{column.name}' or f'{table}.{column.name}' in message
+            or f'"ix_{table}_{column.name}"' in message
+        ):
+            abort(409, message=f'{column.name} already exists', field=column.name)
+    raise error
+
+
+def id_in(column, ids):
+    """
+    Filter `column IN ids`. On PostgreSQL it is `column = ANY(:ids)` with the ids bound as one
+    array parameter, so the statement text (and its cached plan) is the same for any number of ids.
+    """
+    if dialect_name() == 'postgresql':
+        return column == any_(literal(list(ids), postgresql.ARRAY(Integer)))
+    return column.in_(ids)
+
+
+def insert_link(model, pk_column, values, parents, conflict_columns):
+    """
+    Inserts an association row (e.g. an Enrollment) in a single statement:
+
+        INSERT INTO <table> (...) SELECT ... WHERE EXISTS(<parent 1>) AND EXISTS(<parent 2>)
+        ON CONFLICT (<conflict_columns>) DO NOTHING RETURNING <pk>
+
+    `values` maps column names to values, `parents` is a list of (pk column, value) pairs that
+    must exist. Returns the new primary key, or None if a parent is missing or the row already
+    exists; callers only pay an extra query to tell those two cases apart on the failure path.
+    """
+    source = select(*[literal(value, model.__table__.c[key].type) for key, value in values.items()]).where(
+        *[exists().where(column == value) for column, value in parents]
+    )
+    stmt = dialect_insert(model).from_select(list(values), source)
+    if hasattr(stmt, 'on_conflict_do_nothing'):
+        stmt = stmt.on_conflict_do_nothing(index_elements=conflict_columns)
+    return db.session.execute(stmt.returning(pk_column)).scalar()
+
+
+def copy_rows(table, columns, rows):
+    """
+    Loads `rows` (tuples ordered like `columns`) into `table` with PostgreSQL COPY FROM STDIN,
+    on the session's current connection and transaction. Only valid on PostgreSQL.
+    Raises sqlalchemy's IntegrityError, as an INSERT would, if a row breaks a constraint.
+    """
+    driver_connection = db.session.connection().connection.driver_connection
+    dialect = db.session.get_bind().dialect
+    if dialect.driver == 'asyncpg':
+        from asyncpg import IntegrityConstraintViolationError as DriverIntegrityError
+    else:
+        DriverIntegrityError = dialect.dbapi.IntegrityError
+    sql = f"COPY {table.name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv, NULL '\\N')"
+    try:
+        if dialect.driver == 'asyncpg':
+            # Async engine (SQLALCHEMY_ASYNC): asyncpg's binary COPY, awaited from the request greenlet
+            await_only(driver_connection.copy_records_to_table(table.name, records=rows, columns=list(columns)))
+        else:
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            for row in rows:
+                writer.writerow(['\\N' if value is None else value for value in row])
+            buffer.seek(0)
+
+            cursor = driver_connection.cursor()
+            try:
+                cursor.copy_expert(sql, buffer)
+            finally:
+                cursor.close()
+    except DriverIntegrityError as error:
+        # The driver's own exception: SQLAlchemy only wraps the statements it executes
+        raise IntegrityError(sql, None, error) from error
+    # COPY bypasses the ORM events, so record the write for the commit hooks ourselves
+    mark_changed(db.session(), table.name)
+
+
+def copy_query_to(stmt, file, header=True):
+    """
+    Writes the result of the SELECT `stmt` to the binary `file` as CSV with PostgreSQL
+    COPY (...) TO STDOUT: the server formats the rows and psycopg2 writes them as they arrive.
+    Only valid on PostgreSQL with psycopg2.
+    """
+    connection = db.session.connection()
+    cursor = connection.connection.driver_connection.cursor()
+    try:
+        compiled = stmt.compile(dialect=connection.dialect)
+        query = cursor.mogrify(str(compiled), compiled.params).decode()
+        cursor.copy_expert(f"COPY ({query}) TO STDOUT WITH (FORMAT csv{', HEADER' if header else ''})", file)
+    finally:
+        cursor.close()
@@ -0,0 +1,367 @@
+"""
+Enrolling students in courses, directly or through a write-behind queue.
+
+With ENROLLMENT_QUEUE = 'memory' or 'sqlite', POST /students/<id>/enroll/<course_id> only
+records a ticket and answers 202 Accepted; a worker in each process drains the tickets in
+batches of up to ENROLLMENT_QUEUE_BATCH_SIZE, with two parent lookups and one
+INSERT ... ON CONFLICT DO NOTHING per batch, and one commit. Clients poll
+GET /enrollments/tickets/<ticket_id> for the outcome. Under a burst of enrollments this
+replaces a transaction per request, all contending on the same course rows, by a few large ones.
+
+Queue backends:
+- 'memory': per process; tickets are lost on restart and can only be polled on the worker
+  process that took them, so only for single-process deployments.
+- 'sqlite': a local SQLite file (ENROLLMENT_QUEUE_PATH) shared by the workers of one host.
+  Tickets survive restarts; a batch whose worker died is claimed again after
+  ENROLLMENT_QUEUE_CLAIM_TIMEOUT seconds.
+
+Tickets are processed at least once. The unique (student_id, course_id) index and
+ON CONFLICT DO NOTHING make reprocessing harmless: no enrollment is lost or duplicated, but a
+ticket processed again after a crash reports "already enrolled".
+"""
+import asyncio
+import itertools
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from flask import current_app
+from sqlalchemy import exists, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.util import greenlet_spawn
+from db_helpers import dialect_insert, id_in, insert_link
+from models import db, Student, Course, Enrollment
+
+logger = logging.getLogger(__name__)
+
+ENROLLED = (201, 'Enrolled successfully')
+ALREADY_ENROLLED = (400, 'Student already enrolled in this course')
+STUDENT_NOT_FOUND = (404, 'Student not found')
+COURSE_NOT_FOUND = (404, 'Course not found')
+
+
+def enroll(student_id, course_id):
+    """
+    Enrolls one student in one course and commits. Returns (status code, message).
+    """
+    enrollment_id = insert_link(
+        Enrollment, Enrollment.enrollment_id,
+        {'student_id': student_id, 'course_id': course_id},
+        parents=[(Student.student_id, student_id), (Course.course_id, course_id)],
+        conflict_columns=['student_id', 'course_id'],
+    )
+    if enrollment_id is None:
+        db.session.rollback()
+        # Nothing was inserted: work out why with one probe query
+        student_exists, course_exists = db.session.execute(select(
+            exists().where(Student.student_id == student_id),
+            exists().where(Course.course_id == course_id),
+        )).one()
+        if not student_exists:
+            return STUDENT_NOT_FOUND
+        if not course_exists:
+            return COURSE_NOT_FOUND
+        return ALREADY_ENROLLED
+
+    db.session.commit()
+    return ENROLLED
+
+
+def enroll_batch(pairs):
+    """
+    Enrolls the (student_id, course_id) `pairs` in one transaction and returns a
+    (status code, message) per pair. A pair repeated in the batch is enrolled once; its
+    repetitions are reported as already enrolled, like sequential requests would be.
+    """
+    students = set(db.session.execute(
+        select(Student.student_id).where(id_in(Student.student_id, {student_id for student_id, _ in pairs}))
+    ).scalars())
+    courses = set(db.session.execute(
+        select(Course.course_id).where(id_in(Course.course_id, {course_id for _, course_id in pairs}))
+    ).scalars())
+
+    valid = [pair for pair in dict.fromkeys(pairs) if pair[0] in students and pair[1] in courses]
+    inserted = set()
+    if valid:
+        stmt = dialect_insert(Enrollment).values([
+            {'student_id': student_id, 'course_id': course_id} for student_id, course_id in valid
+        ])
+        if hasattr(stmt, 'on_conflict_do_nothing'):
+            stmt = stmt.on_conflict_do_nothing(index_elements=['student_id', 'course_id'])
+        inserted = set(db.session.execute(stmt.returning(Enrollment.student_id, Enrollment.course_id)).tuples())
+    db.session.commit()
+
+    results = []
+    for pair in pairs:
+        if pair[0] not in students:
+            results.append(STUDENT_NOT_FOUND)
+        elif pair[1] not in courses:
+            results.append(COURSE_NOT_FOUND)
+        elif pair in inserted:
+            inserted.discard(pair)
+            results.append(ENROLLED)
+        else:
+            results.append(ALREADY_ENROLLED)
+    return results
+
+
+# ---------------------Ticket queues------------------------------------------------------------
+
+class MemoryTicketQueue:
+    """
+    Tickets in a dict, pending ones in a deque. Per process.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.tickets = {}
+        self.pending = deque()
+        self.ids = itertools.count(1)
+
+    def submit(self, student_id, course_id):
+        with self.lock:
+            ticket_id = next(self.ids)
+            self.tickets[ticket_id] = {
+                'ticket_id': ticket_id, 'student_id': student_id, 'course_id': course_id,
+                'status': 'queued', 'code': None, 'message': None, 'created_at': time.time(),
+            }
+            self.pending.append(ticket_id)
+        return ticket_id
+
+    def claim(self, limit):
+        with self.lock:
+            claimed = []
+            while self.pending and len(claimed) < limit:
+                ticket = self.tickets[self.pending.popleft()]
+                ticket['status'] = 'processing'
+                claimed.append((ticket['ticket_id'], ticket['student_id'], ticket['course_id']))
+            return claimed
+
+    def release(self, ticket_ids):
+        with self.lock:
+            for ticket_id in reversed(ticket_ids):
+                self.tickets[ticket_id]['status'] = 'queued'
+                self.pending.appendleft(ticket_id)
+
+    def finish(self, results):
+        with self.lock:
+            for ticket_id, (code, message) in results:
+                self.tickets[ticket_id].update(status='done', code=code, message=message)
+
+    def get(self, ticket_id):
+        with self.lock:
+            ticket = self.tickets.get(ticket_id)
+            return dict(ticket) if ticket is not None else None
+
+    def purge(self, before):
+        with self.lock:
+            for ticket_id in [key for key, ticket in self.tickets.items()
+                              if ticket['status'] == 'done' and ticket['created_at'] < before]:
+                del self.tickets[ticket_id]
+
+
+class SQLiteTicketQueue:
+    """
+    Tickets in a local SQLite file, shared by the processes of one host.
+    """
+    COLUMNS = ('ticket_id', 'student_id', 'course_id', 'status', 'code', 'message', 'created_at')
+
+    def __init__(self, path, claim_timeout=60):
+        self.path = path
+        self.claim_timeout = claim_timeout
+        self.local = threading.local()
+        with self._connection() as connection:
+            connection.executescript("""
+                CREATE TABLE IF NOT EXISTS enrollment_tickets (
+                    ticket_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    student_id INTEGER NOT NULL,
+                    course_id INTEGER NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'queued',
+                    code INTEGER,
+                    message TEXT,
+                    created_at REAL NOT NULL,
+                    claimed_at REAL
+                );
+                CREATE INDEX IF NOT EXISTS ix_enrollment_tickets_status ON enrollment_tickets (status, ticket_id);
+            """)
+
+    def _connection(self):
+        # One connection per thread; WAL lets the workers poll while another one writes
+        connection = getattr(self.local, 'connection', None)
+        if connection is None or getattr(self.local, 'pid', None) != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=10)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self.local.connection, self.local.pid = connection, os.getpid()
+        return connection
+
+    def submit(self, student_id, course_id):
+        with self._connection() as connection:
+            return connection.execute(
+                'INSERT INTO enrollment_tickets (student_id, course_id, created_at) VALUES (?, ?, ?)',
+                (student_id, course_id, time.time()),
+            ).lastrowid
+
+    def claim(self, limit):
+        now = time.time()
+        with self._connection() as connection:
+            rows = connection.execute(
+                """
+                UPDATE enrollment_tickets SET status = 'processing', claimed_at = ?
+                WHERE ticket_id IN (
+                    SELECT ticket_id FROM enrollment_tickets
+                    WHERE status = 'queued' OR (status = 'processing' AND claimed_at < ?)
+                    ORDER BY ticket_id LIMIT ?
+                )
+                RETURNING ticket_id, student_id, course_id
+                """,
+                (now, now - self.claim_timeout, limit),
+            ).fetchall()
+        return sorted(rows)
+
+    def release(self, ticket_ids):
+        with self._connection() as connection:
+            connection.executemany(
+                "UPDATE enrollment_tickets SET status = 'queued', claimed_at = NULL WHERE ticket_id = ?",
+                [(ticket_id,) for ticket_id in ticket_ids],
+            )
+
+    def finish(self, results):
+        with self._connection() as connection:
+            connection.executemany(
+                "UPDATE enrollment_tickets SET status = 'done', code = ?, message = ? WHERE ticket_id = ?",
+                [(code, message, ticket_id) for ticket_id, (code, message) in results],
+            )
+
+    def get(self, ticket_id):
+        row = self._connection().execute(
+            f'SELECT {", ".join(self.COLUMNS)} FROM enrollment_tickets WHERE ticket_id = ?', (ticket_id,)
+        ).fetchone()
+        return dict(zip(self.COLUMNS, row)) if row is not None else None
+
+    def purge(self, before):
+        with self._connection() as connection:
+            connection.execute("DELETE FROM enrollment_tickets WHERE status = 'done' AND created_at < ?", (before,))
+
+
+# ---------------------Worker-------------------------------------------------------------------
+
+class EnrollmentQueue:
+    """
+    A ticket queue and the worker that drains it into the database, started in each process on
+    first use (so it runs in the gunicorn workers, not in the master). Under SQLALCHEMY_ASYNC
+    the worker is a task on the server's event loop instead of a thread.
+    """
+
+    def __init__(self, app, tickets):
+        self.app = app
+        self.tickets = tickets
+        self.batch_size = app.config.get('ENROLLMENT_QUEUE_BATCH_SIZE', 500)
+        self.interval = app.config.get('ENROLLMENT_QUEUE_INTERVAL_MS', 20) / 1000
+        self.ticket_ttl = app.config.get('ENROLLMENT_TICKET_TTL', 3600)
+        self.wake = threading.Event()
+        self.lock = threading.Lock()
+        self.pid = None
+        self.last_purge = time.monotonic()
+
+    def submit(self, student_id, course_id):
+        """
+        Queues an enrollment and returns its ticket id.
+        """
+        ticket_id = self.tickets.submit(student_id, course_id)
+        self._ensure_worker()
+        self.wake.set()
+        return ticket_id
+
+    def get(self, ticket_id):
+        self._ensure_worker()
+        return self.tickets.get(ticket_id)
+
+    def _ensure_worker(self):
+        if self.pid == os.getpid():
+            return
+        with self.lock:
+            if self.pid == os.getpid():
+                return
+            self.pid = os.getpid()
+            if self.app.config.get('SQLALCHEMY_ASYNC'):
+                asyncio.get_running_loop().create_task(self._run_async())
+            else:
+                threading.Thread(target=self._run, name='enrollment-queue', daemon=True).start()
+
+    def _run(self):
+        while True:
+            self.wake.wait(self.interval * 10)
+            # Let a burst of requests gather into one batch
+            time.sleep(self.interval)
+            self.wake.clear()
+            self._drain_in_context()
+
+    async def _run_async(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await greenlet_spawn(self._drain_in_context)
+
+    def _drain_in_context(self):
+        try:
+            with self.app.app_context():
+                self.drain()
+        except Exception:
+            logger.exception('enrollment queue: drain failed')
+
+    def drain(self):
+        """
+        Processes batches until no ticket is waiting. Must run in an app context.
+        """
+        while True:
+            batch = self.tickets.claim(self.batch_size)
+            if not batch:
+                break
+            try:
+                results = self._process(batch)
+            except Exception:
+                db.session.rollback()
+                self.tickets.release([ticket_id for ticket_id, _, _ in batch])
+                raise
+            self.tickets.finish(results)
+
+        if time.monotonic() - self.last_purge > 60:
+            self.last_purge = time.monotonic()
+            self.tickets.purge(time.time() - self.ticket_ttl)
+
+    def _process(self, batch):
+        try:
+            outcomes = enroll_batch([(student_id, course_id) for _, student_id, course_id in batch])
+        except IntegrityError:
+            # A parent was deleted after the lookups: fall back to one transaction per ticket
+            db.session.rollback()
+            outcomes = [enroll(student_id, course_id) for _, student_id, course_id in batch]
+        return [(ticket_id, outcome) for (ticket_id, _, _), outcome in zip(batch, outcomes)]
+
+
+def init_enrollment_queue(app):
+    """
+    Sets up the write-behind enrollment queue of `app` if ENROLLMENT_QUEUE is 'memory' or 'sqlite'.
+    """
+    backend = app.config.get('ENROLLMENT_QUEUE', 'off')
+    if backend == 'memory':
+        tickets = MemoryTicketQueue()
+    elif backend == 'sqlite':
+        tickets = SQLiteTicketQueue(
+            app.config.get('ENROLLMENT_QUEUE_PATH', 'enrollment_queue.sqlite3'),
+            claim_timeout=app.config.get('ENROLLMENT_QUEUE_CLAIM_TIMEOUT', 60),
+        )
+    elif backend == 'off':
+        return
+    else:
+        raise ValueError(f'Unknown ENROLLMENT_QUEUE {backend!r}')
+    app.extensions['enrollment_queue'] = EnrollmentQueue(app, tickets)
+
+
+def enrollment_queue():
+    """
+    The enrollment queue of the current app, or None if enrollments are not queued.
+    """
+    return current_app.extensions.get('enrollment_queue')
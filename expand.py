@@ -0,0 +1,219 @@
+"""
+?expand= on the entity resources: embeds related rows in the response, following the
+relationships and association proxies declared in models.py.
+
+    GET /students?student_id=1&expand=student_profile,courses
+    GET /courses?ids=1,2&expand=teachers.teacher_profile
+
+The expansions form a tree (a path per comma-separated name, dotted for nesting). It is
+planned up front and loaded with one statement per node, whatever the number of rows: all
+parents of a level are matched at once (WHERE parent_id IN (...)), never with lazy loads per row.
+
+Bounds, so no request can blow up:
+- EXPAND_MAX_DEPTH: longest dotted path;
+- EXPAND_MAX_ITEMS: items embedded per parent in a to-many expansion, the first ones by id.
+  A parent with more lists the expansion's name under "truncated";
+- EXPAND_MAX_ROWS: rows one expansion statement may return, otherwise the request is answered 400.
+
+Expanded responses read several tables, so they bypass the response cache and are sent
+without ETag / Last-Modified.
+"""
+import inspect
+from functools import wraps
+from flask import current_app, g, request
+from flask_restful import abort
+from sqlalchemy import func, inspect as inspect_mapper, select
+from sqlalchemy.ext.associationproxy import AssociationProxyExtensionType
+from db_helpers import id_in
+from models import db
+from pagination import wants_ndjson
+from serializers import SERIALIZERS
+
+
+class Edge:
+    """
+    An expandable name of a model: the entity it leads to and the relationships joined to get there.
+    """
+    __slots__ = ('name', 'parent', 'target', 'path', 'many')
+
+    def __init__(self, name, parent, target, path, many):
+        self.name = name
+        self.parent = parent
+        self.target = target
+        self.path = path
+        self.many = many
+
+
+class Expansion:
+    """
+    A node of the expansion plan: the edge followed and the expansions nested under it.
+    """
+    __slots__ = ('edge', 'children')
+
+    def __init__(self, edge):
+        self.edge = edge
+        self.children = {}
+
+
+_edges = {}
+
+
+def edges(model):
+    """
+    The expandable names of `model`: relationships to one row (student_profile) and
+    association proxies to many through a link table (courses).
+    """
+    found = _edges.get(model)
+    if found is not None:
+        return found
+
+    mapper = inspect_mapper(model)
+    found = {}
+    for relationship in mapper.relationships:
+        if not relationship.uselist and relationship.mapper.class_ in SERIALIZERS:
+            found[relationship.key] = Edge(
+                relationship.key, model, relationship.mapper.class_, (relationship.class_attribute,), many=False
+            )
+    for key, descriptor in mapper.all_orm_descriptors.items():
+        if descriptor.extension_type is AssociationProxyExtensionType.ASSOCIATION_PROXY:
+            proxy = getattr(model, key)
+            local, remote = proxy.local_attr, proxy.remote_attr
+            found[key] = Edge(key, model, remote.property.mapper.class_, (local, remote), many=local.property.uselist)
+    _edges[model] = found
+    return found
+
+
+def parse_expand(model):
+    """
+    Reads ?expand= into a plan: {name: Expansion}. None if the request has none.
+    Aborts with 400 on an unknown name or a path deeper than EXPAND_MAX_DEPTH.
+    """
+    raw = request.args.get('expand')
+    if not raw:
+        return None
+
+    max_depth = current_app.config['EXPAND_MAX_DEPTH']
+    plan = {}
+    for path in raw.split(','):
+        names = [name.strip() for name in path.split('.')]
+        if not all(names):
+            continue
+        if len(names) > max_depth:
+            abort(400, message=f'Expansions are at most {max_depth} levels deep: {path.strip()}')
+        level, current = plan, model
+        for name in names:
+            edge = edges(current).get(name)
+            if edge is None:
+                abort(400, message=(
+                    f'Cannot expand {name} on {current.__tablename__}; '
+                    f'expandable: {", ".join(sorted(edges(current))) or "nothing"}'
+                ))
+            level = level.setdefault(name, Expansion(edge)).children
+            current = edge.target
+    return plan or None
+
+
+def _load(edge, parent_ids, max_items, max_rows):
+    """
+    Rows (parent_id, *target columns[, rank]) of `edge` for all `parent_ids`, with one statement.
+    To-many edges are ranked by target id per parent and cut after max_items + 1.
+    """
+    parent_key = getattr(edge.parent, SERIALIZERS[edge.parent].primary_key)
+    serializer = SERIALIZERS[edge.target]
+    target_key = serializer.columns[serializer.primary_key]
+    columns = [serializer.columns[field] for field in serializer.fields]
+    stmt = select(parent_key.label('expand_parent'), *columns).select_from(edge.parent)
+    for attribute in edge.path:
+        stmt = stmt.join(attribute)
+    stmt = stmt.where(id_in(parent_key, parent_ids))
+
+    if edge.many:
+        rank = func.row_number().over(partition_by=parent_key, order_by=target_key).label('expand_rank')
+        ranked = stmt.add_columns(rank).subquery()
+        stmt = (
+            select(ranked)
+            .where(ranked.c.expand_rank <= max_items + 1)
+            .order_by(ranked.c.expand_parent, ranked.c.expand_rank)
+        )
+
+    rows = db.session.execute(stmt.limit(max_rows + 1)).all()
+    if len(rows) > max_rows:
+        abort(400, message=f'Expanding {edge.name} would embed more than {max_rows} rows; ask for fewer items')
+    return rows
+
+
+def expand_items(items, model, plan):
+    """
+    Adds the expansions of `plan` to the serialized `items` of `model`, in place.
+    """
+    config = current_app.config
+    primary_key = SERIALIZERS[model].primary_key
+    by_id = {}
+    for item in items:
+        by_id.setdefault(item[primary_key], []).append(item)
+
+    for name, expansion in plan.items():
+        edge = expansion.edge
+        serialize = SERIALIZERS[edge.target].row_serializer()
+        for item in items:
+            item[name] = [] if edge.many else None
+        if not by_id:
+            continue
+
+        children = []
+        for row in _load(edge, list(by_id), config['EXPAND_MAX_ITEMS'], config['EXPAND_MAX_ROWS']):
+            parents = by_id[row[0]]
+            if edge.many and row[-1] > config['EXPAND_MAX_ITEMS']:
+                for parent in parents:
+                    parent.setdefault('truncated', []).append(name)
+                continue
+            child = serialize(row[1:])
+            children.append(child)
+            for parent in parents:
+                if edge.many:
+                    parent[name].append(child)
+                else:
+                    parent[name] = child
+
+        if expansion.children:
+            expand_items(children, edge.target, expansion.children)
+
+
+def expandable(model):
+    """
+    Decorates the GET of a `model` resource: applies ?expand= to the entities of its response
+    ({"student": {...}}, {"students": [...]}).
+
+    Goes above @cached and @conditional: an expanded request calls the undecorated method.
+    """
+    primary_key = SERIALIZERS[model].primary_key
+
+    def decorator(method):
+        undecorated = inspect.unwrap(method)
+
+        @wraps(method)
+        def wrapper(self, *args, **kwargs):
+            plan = parse_expand(model)
+            if plan is None:
+                return method(self, *args, **kwargs)
+            if wants_ndjson():
+                abort(400, message='?expand= cannot be combined with streaming')
+
+            result = undecorated(self, *args, **kwargs)
+            g.pop('response_stamp', None)
+            body, status = (result[0], result[1]) if isinstance(result, tuple) else (result, 200)
+            if status != 200 or not isinstance(body, dict):
+                return result
+
+            items = []
+            for value in body.values():
+                if isinstance(value, dict) and primary_key in value:
+                    items.append(value)
+                elif isinstance(value, list):
+                    items.extend(item for item in value if isinstance(item, dict) and primary_key in item)
+            expand_items(items, model, plan)
+            return result
+
+        return wrapper
+
+    return decorator
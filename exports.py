@@ -0,0 +1,340 @@
+"""
+Bulk export of the enrollments: one row per enrollment with its student, its course and the
+course's teachers, as CSV, NDJSON or Parquet (Parquet needs pyarrow).
+
+    GET /exports/enrollments?format=csv&course_id=3&since=2026-09-01T00:00:00
+    flask export enrollments --format parquet --output enrollments.parquet
+
+Rows are ordered by enrollment_id and read from a server-side cursor, EXPORT_BATCH_SIZE at a
+time, and each batch is encoded and sent (or written) before the next one is fetched, so
+memory stays flat whatever the size of the export. The CLI writes CSV from PostgreSQL with
+COPY ... TO STDOUT, formatted by the server.
+
+Filters:
+- course_id, teacher_id: the enrollments of one course, or of the courses of one teacher;
+- since: incremental export of the enrollments made after this time or whose student changed
+  after it. Course and teacher changes are left out on purpose: every enrollment bumps the
+  course's change stamp, so they would repeat whole courses. Deleted enrollments are not reported;
+- after: resume an interrupted export after the last enrollment_id received. A resumed CSV
+  export has no header line, so it can be appended to the interrupted file; the CLI does
+  that itself with --resume.
+"""
+import csv
+import io
+import json
+import os
+import sys
+from datetime import datetime, timezone
+import click
+from flask import Response, current_app, request, stream_with_context
+from flask.cli import AppGroup
+from flask_restful import Resource, abort
+from sqlalchemy import String, cast, func, literal, or_, select
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+from db_helpers import copy_query_to, dialect_name
+from models import db, Course, Enrollment, Student, Teacher, TeacherCourse
+from pagination import NDJSON_MIMETYPE
+from representations import json_dumps
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # pragma: no cover - optional format
+    pyarrow = None
+
+TEACHER_SEPARATOR = ';'
+
+# Exported columns and their Parquet types
+FIELDS = [
+    ('enrollment_id', 'int64'),
+    ('enrolled_at', 'timestamp[us]'),
+    ('student_id', 'int64'),
+    ('student_name', 'string'),
+    ('student_email', 'string'),
+    ('reg_no', 'string'),
+    ('course_id', 'int64'),
+    ('course_name', 'string'),
+    ('teacher_ids', 'string'),
+    ('teacher_names', 'string'),
+]
+FIELD_NAMES = [name for name, _ in FIELDS]
+
+
+def _teachers_of_course(column):
+    """
+    The `column` of the course's teachers, joined with TEACHER_SEPARATOR (NULL without teachers).
+    """
+    if dialect_name() == 'postgresql':
+        aggregate = func.string_agg(
+            cast(column, String), aggregate_order_by(literal(TEACHER_SEPARATOR), TeacherCourse.teacher_id)
+        )
+    else:
+        aggregate = func.group_concat(column, TEACHER_SEPARATOR)
+    return (
+        select(aggregate)
+        .select_from(TeacherCourse)
+        .join(Teacher, Teacher.teacher_id == TeacherCourse.teacher_id)
+        .where(TeacherCourse.course_id == Enrollment.course_id)
+        .correlate(Enrollment)
+        .scalar_subquery()
+    )
+
+
+def export_statement(course_id=None, teacher_id=None, since=None, after=None):
+    """
+    SELECT of the exported enrollment rows, in the order of FIELDS, ordered by enrollment_id.
+    """
+    stmt = (
+        select(
+            Enrollment.enrollment_id,
+            Enrollment.enrolled_at,
+            Student.student_id,
+            Student.name.label('student_name'),
+            Student.email.label('student_email'),
+            Student.reg_no,
+            Course.course_id,
+            Course.course_name,
+            _teachers_of_course(Teacher.teacher_id).label('teacher_ids'),
+            _teachers_of_course(Teacher.name).label('teacher_names'),
+        )
+        .select_from(Enrollment)
+        .join(Student, Student.student_id == Enrollment.student_id)
+        .join(Course, Course.course_id == Enrollment.course_id)
+    )
+    if course_id is not None:
+        stmt = stmt.where(Enrollment.course_id == course_id)
+    if teacher_id is not None:
+        stmt = stmt.where(Enrollment.course_id.in_(
+            select(TeacherCourse.course_id).where(TeacherCourse.teacher_id == teacher_id)
+        ))
+    if since is not None:
+        stmt = stmt.where(or_(Enrollment.enrolled_at > since, Student.updated_at > since))
+    if after is not None:
+        stmt = stmt.where(Enrollment.enrollment_id > after)
+    return stmt.order_by(Enrollment.enrollment_id)
+
+
+def parse_since(value):
+    """
+    Reads an ISO 8601 time as the naive UTC timestamp the database stores. Raises ValueError.
+    """
+    since = datetime.fromisoformat(value)
+    if since.tzinfo is not None:
+        since = since.astimezone(timezone.utc).replace(tzinfo=None)
+    return since
+
+
+class CsvEncoder:
+    def __init__(self, header=True):
+        self._buffer = io.StringIO()
+        self._writer = csv.writer(self._buffer, lineterminator='\n')
+        if header:
+            self._writer.writerow(FIELD_NAMES)
+
+    def encode(self, rows):
+        self._writer.writerows(rows)
+        data = self._buffer.getvalue().encode()
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        return data
+
+    def finish(self):
+        return self.encode([])
+
+
+class NdjsonEncoder:
+    def __init__(self, header=True):
+        pass
+
+    def encode(self, rows):
+        lines = []
+        for row in rows:
+            item = dict(zip(FIELD_NAMES, row))
+            if item['enrolled_at'] is not None:
+                item['enrolled_at'] = item['enrolled_at'].isoformat()
+            lines.append(json_dumps(item) + b'\n')
+        return b''.join(lines)
+
+    def finish(self):
+        return b''
+
+
+class _StreamSink:
+    """
+    Write-only file for pyarrow that keeps what was written until it is taken with drain().
+    """
+
+    def __init__(self):
+        self.closed = False
+        self._chunks = []
+        self._position = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+class ParquetEncoder:
+    """
+    One Parquet row group per batch. Parquet is written front to back (the footer comes last),
+    so each row group can be sent as soon as it is encoded.
+    """
+
+    def __init__(self, header=True):
+        self._schema = pyarrow.schema([(name, pyarrow.type_for_alias(type_)) for name, type_ in FIELDS])
+        self._sink = _StreamSink()
+        self._writer = pyarrow.parquet.ParquetWriter(self._sink, self._schema, compression='zstd')
+
+    def encode(self, rows):
+        if rows:
+            columns = list(zip(*rows))
+            self._writer.write_table(pyarrow.Table.from_arrays(
+                [pyarrow.array(column, type=field.type) for column, field in zip(columns, self._schema)],
+                schema=self._schema,
+            ))
+        return self._sink.drain()
+
+    def finish(self):
+        self._writer.close()
+        return self._sink.drain()
+
+
+# format: (mimetype, file extension, encoder)
+FORMATS = {
+    'csv': ('text/csv', 'csv', CsvEncoder),
+    'ndjson': (NDJSON_MIMETYPE, 'ndjson', NdjsonEncoder),
+    'parquet': ('application/vnd.apache.parquet', 'parquet', ParquetEncoder),
+}
+
+
+def encode_export(stmt, encoder):
+    """
+    Yields the encoded export of `stmt`, one chunk per EXPORT_BATCH_SIZE rows.
+    """
+    batch_size = current_app.config.get('EXPORT_BATCH_SIZE', 5000)
+    result = db.session.execute(stmt.execution_options(yield_per=batch_size))
+    yield encoder.encode([])
+    for rows in result.partitions():
+        yield encoder.encode(rows)
+    yield encoder.finish()
+
+
+class EnrollmentExportResource(Resource):
+    def get(self):
+        """
+        Streams the enrollments matching the filters (see the module docstring) as ?format=
+        csv (default), ndjson or parquet.
+        """
+        fmt = request.args.get('format', 'csv')
+        if fmt not in FORMATS:
+            abort(400, message=f'Unknown format {fmt}; use one of {", ".join(FORMATS)}')
+        if fmt == 'parquet' and pyarrow is None:
+            abort(406, message='Parquet exports need pyarrow, which is not installed')
+        try:
+            since = parse_since(request.args['since']) if request.args.get('since') else None
+        except ValueError:
+            abort(400, message='since must be an ISO 8601 time, e.g. 2026-09-01T00:00:00Z')
+
+        after = request.args.get('after', type=int)
+        stmt = export_statement(
+            course_id=request.args.get('course_id', type=int),
+            teacher_id=request.args.get('teacher_id', type=int),
+            since=since,
+            after=after,
+        )
+        mimetype, extension, encoder = FORMATS[fmt]
+        response = Response(stream_with_context(encode_export(stmt, encoder(header=after is None))), mimetype=mimetype)
+        response.headers['Content-Disposition'] = f'attachment; filename=enrollments.{extension}'
+        return response
+
+
+def _resume_point(file):
+    """
+    Returns (size of the complete lines, last complete line) of a CSV or NDJSON file open in binary mode.
+    """
+    size = file.seek(0, os.SEEK_END)
+    block = 4096
+    while True:
+        start = max(0, size - block)
+        file.seek(start)
+        data = file.read(size - start)
+        end = data.rfind(b'\n')
+        if end >= 0:
+            begin = data.rfind(b'\n', 0, end) + 1
+            if begin > 0 or start == 0:
+                return start + end + 1, data[begin:end]
+        elif start == 0:
+            return 0, b''
+        block *= 2
+
+
+def _last_enrollment_id(fmt, line):
+    if not line:
+        return None
+    if fmt == 'ndjson':
+        return json.loads(line)['enrollment_id']
+    first = line.split(b',', 1)[0]
+    return int(first) if first.isdigit() else None
+
+
+export_cli = AppGroup('export', help='Export data in bulk.')
+
+
+@export_cli.command('enrollments')
+@click.option('--format', 'fmt', type=click.Choice(list(FORMATS)), default='csv', show_default=True)
+@click.option('--output', '-o', default='-', help='File to write, - for standard output.')
+@click.option('--course-id', type=int, help='Only the enrollments of this course.')
+@click.option('--teacher-id', type=int, help="Only the enrollments of this teacher's courses.")
+@click.option('--since', help='Only enrollments made, or whose student changed, after this ISO 8601 time.')
+@click.option('--after', type=int, help='Only enrollments after this enrollment_id.')
+@click.option('--resume', is_flag=True, help='Continue an interrupted CSV or NDJSON export in --output.')
+def export_enrollments_command(fmt, output, course_id, teacher_id, since, after, resume):
+    """
+    Writes the enrollments with their student, course and teachers.
+    """
+    if fmt == 'parquet' and pyarrow is None:
+        raise click.UsageError('Parquet exports need pyarrow, which is not installed')
+    try:
+        since = parse_since(since) if since else None
+    except ValueError:
+        raise click.BadParameter('expected an ISO 8601 time', param_hint='--since')
+
+    header = after is None
+    if resume:
+        if fmt == 'parquet' or output == '-':
+            raise click.UsageError('--resume needs a CSV or NDJSON --output file')
+        if os.path.exists(output):
+            with open(output, 'rb+') as file:
+                size, line = _resume_point(file)
+                # Drop the partial line the interruption may have left
+                file.truncate(size)
+            after = _last_enrollment_id(fmt, line) or after
+            header = header and size == 0
+
+    stmt = export_statement(course_id=course_id, teacher_id=teacher_id, since=since, after=after)
+    out = sys.stdout.buffer if output == '-' else open(output, 'ab' if resume else 'wb')
+    try:
+        if fmt == 'csv' and db.session.get_bind().dialect.driver == 'psycopg2':
+            copy_query_to(stmt, out, header=header)
+        else:
+            for chunk in encode_export(stmt, FORMATS[fmt][2](header=header)):
+                out.write(chunk)
+                out.flush()
+    finally:
+        if out is not sys.stdout.buffer:
+            out.close()
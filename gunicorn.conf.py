@@ -0,0 +1,13 @@
+"""
+gunicorn settings: gunicorn -c gunicorn.conf.py 'app:create_app()'
+
+The worker count comes from WEB_CONCURRENCY, the same variable config.pool_options() uses to
+split DB_MAX_CONNECTIONS between the workers' connection pools. create_app() opens no database
+connection, so preload_app can be turned on without workers sharing connections of the master.
+"""
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', 5555)}"
+workers = int(os.getenv('WEB_CONCURRENCY', 2))
+threads = int(os.getenv('GUNICORN_THREADS', 1))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 30))
@@ -0,0 +1,430 @@
+"""
+Bulk CSV imports of new students (optionally with their enrollments) and of enrollments of
+existing students, for the registrar's term files.
+
+    flask import students students.csv [--errors errors.csv] [--workers 4]
+    POST /imports/enrollments   (Content-Type: text/csv)
+
+Columns (header line required, extra columns are refused):
+- students: name, date_of_birth (ISO date), email, reg_no[, course_ids (separated by ";")]
+- enrollments: reg_no, course_id
+
+The file is read as a stream, IMPORT_CHUNK_SIZE records at a time. Each chunk is validated in
+this process against key sets preloaded once per import (existing reg_no and email values,
+course ids), plus the keys already seen in the file, so no row needs a query of its own. Valid
+rows are loaded into the staging tables (import_students, import_enrollments) by
+IMPORT_WORKERS worker processes in parallel, with COPY on PostgreSQL; SQLite serializes
+writers, so there they are loaded inline, in the merge transaction. Finally one transaction
+merges the staged rows into students and enrollments with INSERT ... SELECT and clears the
+staging rows: the import lands entirely or not at all.
+
+The report lists every invalid row with its line and errors (up to IMPORT_MAX_ERRORS in the
+HTTP response) and the time spent in each stage.
+"""
+import csv
+import io
+import logging
+import multiprocessing
+import sys
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+import click
+from flask import current_app, request
+from flask.cli import AppGroup
+from flask_restful import Resource, abort
+from sqlalchemy import create_engine, delete, insert, make_url, select
+from sqlalchemy.exc import IntegrityError
+from bulk import validate
+from db_helpers import dialect_insert
+from models import db, Course, Enrollment, ImportEnrollment, ImportStudent, Student
+from search import invalidate_search_index
+
+logger = logging.getLogger(__name__)
+
+COURSE_SEPARATOR = ';'
+
+
+class ImportRejected(Exception):
+    """
+    The file cannot be imported at all (bad header, or the merge conflicted with a concurrent write).
+    """
+
+
+class StudentImport:
+    """
+    New students, each optionally enrolled in courses (course_ids).
+    """
+    fields = {
+        'name': (str, True),
+        'date_of_birth': (date, True),
+        'email': (str, True),
+        'reg_no': (str, True),
+    }
+    optional_columns = ('course_ids',)
+
+    def preload(self):
+        self.reg_nos = set(db.session.execute(select(Student.reg_no)).scalars())
+        self.emails = set(db.session.execute(select(Student.email)).scalars())
+        self.courses = set(db.session.execute(select(Course.course_id)).scalars())
+
+    def validate(self, import_id, line, record):
+        """
+        Returns ({staging table: [row]}, errors) for one record.
+        """
+        clean, errors = validate(_values(record, self.fields), self.fields)
+        course_ids = []
+        for value in filter(None, (part.strip() for part in (record.get('course_ids') or '').split(COURSE_SEPARATOR))):
+            if not value.isdigit():
+                errors.append(f'course_ids: {value!r} is not a course id')
+            elif int(value) not in self.courses:
+                errors.append(f'Course {value} not found')
+            elif int(value) not in course_ids:
+                course_ids.append(int(value))
+        for column, taken in (('reg_no', self.reg_nos), ('email', self.emails)):
+            value = clean.get(column)
+            if value is None:
+                continue
+            if value in taken:
+                errors.append(f'{column} {value!r} already exists or is duplicated in this file')
+        if errors:
+            return {}, errors
+
+        # Later rows with the same keys are duplicates of this one
+        self.reg_nos.add(clean['reg_no'])
+        self.emails.add(clean['email'])
+        return {
+            'import_students': [dict(clean, import_id=import_id, line=line)],
+            'import_enrollments': [
+                {'import_id': import_id, 'line': line, 'course_id': course_id, 'reg_no': clean['reg_no']}
+                for course_id in course_ids
+            ],
+        }, []
+
+    def merge(self, import_id, report):
+        staged = select(
+            ImportStudent.name, ImportStudent.date_of_birth, ImportStudent.email, ImportStudent.reg_no
+        ).where(ImportStudent.import_id == import_id).order_by(ImportStudent.line)
+        result = db.session.execute(insert(Student).from_select(['name', 'date_of_birth', 'email', 'reg_no'], staged))
+        report['loaded']['students'] = result.rowcount
+        report['loaded']['enrollments'] = _merge_enrollments(import_id)
+
+
+class EnrollmentImport:
+    """
+    Enrollments of existing students, identified by reg_no.
+    """
+    fields = {'reg_no': (str, True), 'course_id': (int, True)}
+    optional_columns = ()
+
+    def preload(self):
+        self.reg_nos = set(db.session.execute(select(Student.reg_no)).scalars())
+        self.courses = set(db.session.execute(select(Course.course_id)).scalars())
+        self.pairs = set()
+
+    def validate(self, import_id, line, record):
+        clean, errors = validate(_values(record, self.fields), self.fields)
+        if 'reg_no' in clean and clean['reg_no'] not in self.reg_nos:
+            errors.append('Student not found')
+        if 'course_id' in clean and clean['course_id'] not in self.courses:
+            errors.append('Course not found')
+        pair = (clean.get('reg_no'), clean.get('course_id'))
+        if not errors and pair in self.pairs:
+            errors.append('Duplicated in this file')
+        if errors:
+            return {}, errors
+        self.pairs.add(pair)
+        return {'import_enrollments': [dict(clean, import_id=import_id, line=line)]}, []
+
+    def merge(self, import_id, report):
+        # Already enrolled pairs are reported per line, the others inserted
+        enrolled = db.session.execute(
+            select(ImportEnrollment.line)
+            .join(Student, Student.reg_no == ImportEnrollment.reg_no)
+            .join(Enrollment, (Enrollment.student_id == Student.student_id)
+                  & (Enrollment.course_id == ImportEnrollment.course_id))
+            .where(ImportEnrollment.import_id == import_id)
+            .order_by(ImportEnrollment.line)
+        ).scalars().all()
+        for line in enrolled:
+            _add_error(report, line, ['Student already enrolled in this course'])
+        report['loaded']['enrollments'] = _merge_enrollments(import_id)
+
+
+IMPORTS = {'students': StudentImport, 'enrollments': EnrollmentImport}
+
+
+def _values(record, fields):
+    # Empty cells are missing values
+    values = {}
+    for key in fields:
+        value = (record.get(key) or '').strip()
+        if value:
+            values[key] = value
+    return values
+
+
+def _merge_enrollments(import_id):
+    staged = (
+        select(Student.student_id, ImportEnrollment.course_id)
+        .join(Student, Student.reg_no == ImportEnrollment.reg_no)
+        .where(ImportEnrollment.import_id == import_id)
+        .order_by(ImportEnrollment.line, ImportEnrollment.course_id)
+    )
+    stmt = dialect_insert(Enrollment).from_select(['student_id', 'course_id'], staged)
+    if hasattr(stmt, 'on_conflict_do_nothing'):
+        stmt = stmt.on_conflict_do_nothing(index_elements=['student_id', 'course_id'])
+    return db.session.execute(stmt).rowcount
+
+
+def _add_error(report, line, errors):
+    report['failed'] += 1
+    report['errors'].append({'line': line, 'errors': errors})
+
+
+_engines = {}
+
+
+def stage_rows(url, table, rows):
+    """
+    Loads `rows` (dicts) into the staging `table` on its own connection and commits. Runs in the
+    import worker processes, which do not have the app: they keep one engine per database URL.
+    """
+    engine = _engines.get(url)
+    if engine is None:
+        engine = _engines[url] = create_engine(url, pool_size=1)
+    with engine.begin() as connection:
+        return load_rows(connection, table, rows)
+
+
+def load_rows(connection, table, rows):
+    """
+    Writes `rows` (dicts) into the staging `table` on `connection`, with COPY on PostgreSQL.
+    """
+    model_table = db.metadata.tables[table]
+    columns = [column.name for column in model_table.columns]
+    if connection.dialect.name == 'postgresql':
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows([[row[column] for column in columns] for row in rows])
+        buffer.seek(0)
+        cursor = connection.connection.driver_connection.cursor()
+        try:
+            cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+        finally:
+            cursor.close()
+    else:
+        connection.execute(model_table.insert(), rows)
+    return len(rows)
+
+
+def _sync_url():
+    url = db.engine.url
+    if url.get_dialect().is_async:
+        url = url.set(drivername=url.get_backend_name())
+    return url.render_as_string(hide_password=False)
+
+
+def run_import(kind, stream, workers=None):
+    """
+    Imports the CSV text `stream` as `kind` ('students' or 'enrollments') and returns the report.
+    Raises ImportRejected if the header is wrong or the merge fails.
+    """
+    config = current_app.config
+    chunk_size = config.get('IMPORT_CHUNK_SIZE', 5000)
+    workers = config.get('IMPORT_WORKERS', 4) if workers is None else workers
+    if db.engine.dialect.name == 'sqlite' or make_url(_sync_url()).database in (None, '', ':memory:'):
+        workers = 0
+
+    importer = IMPORTS[kind]()
+    reader = csv.DictReader(stream)
+    columns = set(reader.fieldnames or ())
+    missing = set(importer.fields) - columns
+    unknown = columns - set(importer.fields) - set(importer.optional_columns)
+    if missing or unknown:
+        raise ImportRejected(
+            f'Expected the columns {", ".join([*importer.fields, *importer.optional_columns])}; '
+            + (f'missing: {", ".join(sorted(missing))}' if missing else f'unknown: {", ".join(sorted(unknown))}')
+        )
+
+    import_id = uuid.uuid4().hex
+    report = {
+        'import_id': import_id, 'kind': kind, 'rows': 0, 'failed': 0, 'loaded': {}, 'errors': [],
+        'stats': {'workers': workers},
+    }
+    started = time.perf_counter()
+    importer.preload()
+    db.session.commit()
+    preloaded = time.perf_counter()
+
+    url = _sync_url()
+    validate_seconds = 0.0
+    pending = []
+    pool = (
+        ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn')) if workers else None
+    )
+    try:
+        chunk = {}
+        for record in reader:
+            report['rows'] += 1
+            began = time.perf_counter()
+            if None in record:
+                staged, errors = {}, [f'{len(record[None])} value(s) more than the header has']
+            else:
+                staged, errors = importer.validate(import_id, reader.line_num, record)
+            validate_seconds += time.perf_counter() - began
+            if errors:
+                _add_error(report, reader.line_num, errors)
+            for table, rows in staged.items():
+                chunk.setdefault(table, []).extend(rows)
+            if report['rows'] % chunk_size == 0:
+                pending.extend(_stage(pool, url, chunk))
+                chunk = {}
+                # Bound the chunks held in memory while the workers catch up
+                while len(pending) > 2 * max(workers, 1):
+                    pending.pop(0).result()
+        pending.extend(_stage(pool, url, chunk))
+        for future in pending:
+            future.result()
+        staged_at = time.perf_counter()
+
+        importer.merge(import_id, report)
+        _clear_staging(import_id)
+        db.session.commit()
+    except BaseException as error:
+        # Nothing was merged: drop what the workers staged. A failing cleanup must not hide `error`
+        db.session.rollback()
+        try:
+            _clear_staging(import_id)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            logger.exception('import %s: clearing the staging rows failed', import_id)
+        if isinstance(error, IntegrityError):
+            raise ImportRejected(f'A concurrent write conflicts with this import, nothing was loaded: {error.orig}')
+        raise
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+    if kind == 'students':
+        invalidate_search_index('students')
+    report['errors'].sort(key=lambda error: error['line'])
+    finished = time.perf_counter()
+    report['stats'].update({
+        'preload_seconds': round(preloaded - started, 3),
+        'validate_seconds': round(validate_seconds, 3),
+        'stage_seconds': round(staged_at - preloaded, 3),
+        'merge_seconds': round(finished - staged_at, 3),
+        'total_seconds': round(finished - started, 3),
+        'rows_per_second': round(report['rows'] / (finished - started)) if finished > started else None,
+    })
+    return report
+
+
+class _Done:
+    """
+    Result of a chunk staged inline, with the interface of a Future.
+    """
+
+    def __init__(self, value):
+        self.value = value
+
+    def result(self):
+        return self.value
+
+
+def _stage(pool, url, chunk):
+    futures = []
+    for table, rows in chunk.items():
+        if not rows:
+            continue
+        if pool is None:
+            # Inline, in the import's transaction: an in-memory database exists on this connection only
+            futures.append(_Done(load_rows(db.session.connection(), table, rows)))
+        else:
+            futures.append(pool.submit(stage_rows, url, table, rows))
+    return futures
+
+
+def _clear_staging(import_id):
+    db.session.execute(delete(ImportStudent).where(ImportStudent.import_id == import_id))
+    db.session.execute(delete(ImportEnrollment).where(ImportEnrollment.import_id == import_id))
+
+
+class ImportResource(Resource):
+    def post(self, kind):
+        """
+        Imports the CSV request body as `kind` and answers the report: 201 if every row was
+        loaded, 207 if some were refused (listed under "errors").
+        """
+        if kind not in IMPORTS:
+            abort(404, message=f'Unknown import {kind}; use one of {", ".join(IMPORTS)}')
+        stream = io.TextIOWrapper(request.stream, encoding=request.mimetype_params.get('charset', 'utf-8'), newline='')
+        try:
+            report = run_import(kind, stream)
+        except ImportRejected as error:
+            abort(400, message=str(error))
+        except UnicodeDecodeError:
+            abort(400, message='The file is not valid UTF-8')
+
+        max_errors = current_app.config.get('IMPORT_MAX_ERRORS', 1000)
+        report['errors_truncated'] = len(report['errors']) > max_errors
+        report['errors'] = report['errors'][:max_errors]
+        return report, (201 if not report['failed'] else 207)
+
+
+import_cli = AppGroup('import', help='Import CSV files in bulk.')
+
+
+@import_cli.command('students')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False, allow_dash=True))
+@click.option('--errors', 'errors_path', type=click.Path(dir_okay=False), help='Write the refused rows to this CSV file.')
+@click.option('--workers', type=int, help='Staging worker processes (default IMPORT_WORKERS).')
+def import_students_command(path, errors_path, workers):
+    """
+    Creates the students of a CSV file, and their enrollments if it has a course_ids column.
+    """
+    _import_command('students', path, errors_path, workers)
+
+
+@import_cli.command('enrollments')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False, allow_dash=True))
+@click.option('--errors', 'errors_path', type=click.Path(dir_okay=False), help='Write the refused rows to this CSV file.')
+@click.option('--workers', type=int, help='Staging worker processes (default IMPORT_WORKERS).')
+def import_enrollments_command(path, errors_path, workers):
+    """
+    Enrolls existing students (by reg_no) in the courses of a CSV file.
+    """
+    _import_command('enrollments', path, errors_path, workers)
+
+
+def _import_command(kind, path, errors_path, workers):
+    stream = sys.stdin if path == '-' else open(path, encoding='utf-8', newline='')
+    try:
+        report = run_import(kind, stream, workers=workers)
+    except ImportRejected as error:
+        raise click.ClickException(str(error))
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+    if errors_path:
+        with open(errors_path, 'w', encoding='utf-8', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(['line', 'errors'])
+            writer.writerows([error['line'], '; '.join(error['errors'])] for error in report['errors'])
+    else:
+        for error in report['errors'][:20]:
+            click.echo(f"line {error['line']}: {'; '.join(error['errors'])}", err=True)
+
+    loaded = ', '.join(f'{count} {table}' for table, count in report['loaded'].items())
+    stats = report['stats']
+    click.echo(
+        f"{report['rows']} rows: loaded {loaded}; {report['failed']} refused. "
+        f"{stats['total_seconds']}s ({stats['rows_per_second']} rows/s; preload {stats['preload_seconds']}s, "
+        f"validate {stats['validate_seconds']}s, stage {stats['stage_seconds']}s with {stats['workers']} "
+        f"worker(s), merge {stats['merge_seconds']}s)"
+    )
+    if report['failed']:
+        raise SystemExit(1)
@@ -0,0 +1,474 @@
+"""
+Instrumentation: SQL statement budgets, connection pool metrics and per-request profiling
+(latency, SQL statement counts and timings, slow-query log), exported at /metrics in the
+Prometheus text format. Metrics live in the memory of each worker process.
+"""
+import logging
+import random
+import threading
+import time
+from flask import Response, current_app, g, has_request_context, request
+from flask_restful import Resource
+from sqlalchemy import event
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+
+class count_statements:
+    """
+    Context manager that records every SQL statement sent to `engine` while it is active.
+
+        with count_statements(db.engine) as counter:
+            client.get('/students/1/std_courses')
+        assert counter.count <= 1, counter.statements
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.statements = []
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    def __enter__(self):
+        event.listen(self.engine, 'before_cursor_execute', self._record)
+        return self
+
+    def __exit__(self, *exc_info):
+        event.remove(self.engine, 'before_cursor_execute', self._record)
+        return False
+
+
+class StatementBudgetExceeded(AssertionError):
+    """
+    Raised by assert_statement_budget when a request runs more statements than allowed.
+    """
+
+
+def assert_statement_budget(client, engine, method, url, budget, **kwargs):
+    """
+    Sends one request through the Flask test `client` and fails if it ran more than `budget`
+    SQL statements. Returns the response so callers can also check its status.
+    """
+    with count_statements(engine) as counter:
+        response = client.open(url, method=method, **kwargs)
+    if counter.count > budget:
+        raise StatementBudgetExceeded(
+            f'{method} {url} ran {counter.count} statements (budget {budget}):\n  '
+            + '\n  '.join(counter.statements)
+        )
+    return response
+
+
+class Histogram:
+    """
+    Thread-safe cumulative histogram with fixed upper bounds (in seconds), Prometheus style.
+    """
+    DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        with self.lock:
+            self.count += 1
+            self.sum += value
+            self.max = max(self.max, value)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self.counts[i] += 1
+                    break
+            else:
+                self.counts[-1] += 1
+
+    def snapshot(self):
+        """
+        Returns count, sum, max and the cumulative count of observations <= each bucket bound.
+        """
+        with self.lock:
+            cumulative, total = {}, 0
+            for bound, count in zip(self.buckets, self.counts):
+                total += count
+                cumulative[str(bound)] = total
+            cumulative['+Inf'] = self.count
+            return {'count': self.count, 'sum': self.sum, 'max': self.max, 'buckets': cumulative}
+
+
+class TimedQueuePool(QueuePool):
+    """
+    QueuePool that records how long each checkout waited for a connection.
+    Set as `poolclass` in SQLALCHEMY_ENGINE_OPTIONS (see config.pool_options()).
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkout_wait = Histogram()
+
+    def recreate(self):
+        pool = super().recreate()
+        # Keep the wait history when the engine replaces the pool after a failover
+        pool.checkout_wait = self.checkout_wait
+        return pool
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            self.checkout_wait.observe(time.perf_counter() - start)
+
+
+class TimedAsyncQueuePool(TimedQueuePool, AsyncAdaptedQueuePool):
+    """
+    TimedQueuePool for asyncio engines (SQLALCHEMY_ASYNC); models.py swaps it in automatically.
+    """
+
+
+class PoolMetrics:
+    """
+    Counts connection pool events for one engine: new connections, closes and invalidations
+    (churn), checkouts and checkins. Sizes and saturation are read from the pool on demand.
+    """
+    EVENTS = ('connect', 'close', 'invalidate', 'soft_invalidate', 'checkout', 'checkin')
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.counters = dict.fromkeys(self.EVENTS, 0)
+        self.lock = threading.Lock()
+        for name in self.EVENTS:
+            event.listen(engine, name, self._counter(name))
+
+    def _counter(self, name):
+        def increment(*args):
+            with self.lock:
+                self.counters[name] += 1
+        return increment
+
+    def snapshot(self):
+        pool = self.engine.pool
+        with self.lock:
+            data = {'pool_class': type(pool).__name__, 'events': dict(self.counters)}
+
+        if isinstance(pool, QueuePool):
+            capacity = pool.size() + pool._max_overflow
+            data.update({
+                'size': pool.size(),
+                'max_overflow': pool._max_overflow,
+                'checked_out': pool.checkedout(),
+                'checked_in': pool.checkedin(),
+                'overflow': pool.overflow(),
+                # Share of all allowed connections that are in use right now
+                'saturation': pool.checkedout() / capacity if capacity > 0 else None,
+            })
+        wait = getattr(pool, 'checkout_wait', None)
+        if wait is not None:
+            data['checkout_wait_seconds'] = wait.snapshot()
+        return data
+
+
+def init_pool_metrics(app, db):
+    """
+    Starts counting pool events for the app's engine; read them with get_pool_metrics().
+    """
+    with app.app_context():
+        app.extensions['pool_metrics'] = PoolMetrics(db.engine)
+
+
+def get_pool_metrics():
+    return current_app.extensions['pool_metrics'].snapshot()
+
+
+class PoolMetricsResource(Resource):
+    def get(self):
+        """
+        Returns the connection pool metrics of this worker process, and the state of its read
+        replicas if it has any.
+        """
+        metrics = get_pool_metrics()
+        replicas = current_app.extensions.get('replicas')
+        if replicas is not None:
+            metrics['replicas'] = replicas.status()
+        return metrics
+
+
+# ---------------------Per-request profiling---------------------------------------------------
+
+slow_query_logger = logging.getLogger('instrumentation.slow_queries')
+
+STATEMENT_COUNT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100)
+
+
+class LabeledHistograms:
+    """
+    One Histogram per combination of label values, created on first use.
+    """
+
+    def __init__(self, label_names, buckets=Histogram.DEFAULT_BUCKETS):
+        self.label_names = label_names
+        self.buckets = buckets
+        self.histograms = {}
+        self.lock = threading.Lock()
+
+    def labels(self, *values):
+        histogram = self.histograms.get(values)
+        if histogram is None:
+            with self.lock:
+                histogram = self.histograms.setdefault(values, Histogram(self.buckets))
+        return histogram
+
+    def items(self):
+        with self.lock:
+            return list(self.histograms.items())
+
+
+class LabeledCounter:
+    """
+    One integer counter per combination of label values.
+    """
+
+    def __init__(self, label_names):
+        self.label_names = label_names
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, *values):
+        with self.lock:
+            self.values[values] = self.values.get(values, 0) + 1
+
+    def items(self):
+        with self.lock:
+            return list(self.values.items())
+
+
+class RequestProfile:
+    """
+    What one request did, kept in flask.g while it runs.
+    """
+    __slots__ = ('request', 'start', 'sampled', 'statements', 'sql_seconds', 'status')
+
+    def __init__(self, sampled):
+        self.request = request._get_current_object()
+        self.start = time.perf_counter()
+        self.sampled = sampled
+        self.statements = 0
+        self.sql_seconds = 0.0
+        self.status = None
+
+
+class RequestMetrics:
+    """
+    Records the latency and status of every request, per endpoint. On a sampled share of the
+    requests (`sample_rate`) it also times every SQL statement: statement counts and SQL time per
+    request, and a log entry for each statement slower than `slow_query_seconds` (with its
+    EXPLAIN plan on PostgreSQL when `explain_slow_queries` is set).
+    """
+
+    def __init__(self, engine, sample_rate=1.0, slow_query_seconds=0.25, explain_slow_queries=False):
+        self.sample_rate = sample_rate
+        self.slow_query_seconds = slow_query_seconds
+        self.explain_slow_queries = explain_slow_queries and engine.dialect.name == 'postgresql'
+        self.latency = LabeledHistograms(('endpoint', 'method'))
+        self.requests = LabeledCounter(('endpoint', 'method', 'status'))
+        self.statements = LabeledHistograms(('endpoint', 'method'), STATEMENT_COUNT_BUCKETS)
+        self.statement_duration = LabeledHistograms(('endpoint',))
+        self.slow_queries = LabeledCounter(('endpoint',))
+        event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+
+    # Flask hooks
+
+    def start_request(self):
+        g.request_profile = RequestProfile(sampled=random.random() < self.sample_rate)
+
+    def finish_response(self, response):
+        profile = g.get('request_profile')
+        if profile is not None:
+            profile.status = response.status_code
+            if profile.sampled:
+                total_ms = (time.perf_counter() - profile.start) * 1000
+                response.headers['Server-Timing'] = (
+                    f'db;dur={profile.sql_seconds * 1000:.1f};desc="{profile.statements} statements", '
+                    f'total;dur={total_ms:.1f}'
+                )
+        return response
+
+    def finish_request(self, exc):
+        # Runs once the response is fully sent, so streamed responses are measured to the end
+        profile = g.get('request_profile')
+        # Sub-requests of /batch (batch.py) share g with the request that carries them
+        if profile is None or profile.request is not request._get_current_object():
+            return
+        del g.request_profile
+        endpoint = request.endpoint or 'unmatched'
+        status = profile.status or 500
+        self.latency.labels(endpoint, request.method).observe(time.perf_counter() - profile.start)
+        self.requests.inc(endpoint, request.method, str(status))
+        if profile.sampled:
+            self.statements.labels(endpoint, request.method).observe(profile.statements)
+
+    # SQLAlchemy engine hooks
+
+    @staticmethod
+    def _sampled_profile():
+        if not has_request_context():
+            return None
+        profile = g.get('request_profile')
+        return profile if profile is not None and profile.sampled else None
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if self._sampled_profile() is not None:
+            context._profile_start = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        start = getattr(context, '_profile_start', None)
+        if start is None:
+            return
+        elapsed = time.perf_counter() - start
+        profile = self._sampled_profile()
+        profile.statements += 1
+        profile.sql_seconds += elapsed
+        endpoint = request.endpoint or 'unmatched'
+        self.statement_duration.labels(endpoint).observe(elapsed)
+        if elapsed >= self.slow_query_seconds:
+            self.slow_queries.inc(endpoint)
+            self._log_slow_query(cursor, statement, parameters, executemany, elapsed, endpoint)
+
+    def _log_slow_query(self, cursor, statement, parameters, executemany, elapsed, endpoint):
+        plan = None
+        if self.explain_slow_queries and not executemany and statement.lstrip()[:6].upper() in ('SELECT', 'WITH'):
+            try:
+                # A plain DBAPI cursor on the same connection: fires no events, sees the same transaction
+                explain_cursor = cursor.connection.cursor()
+                explain_cursor.execute('EXPLAIN ' + statement, parameters)
+                plan = '\n'.join(row[0] for row in explain_cursor.fetchall())
+                explain_cursor.close()
+            except Exception as error:
+                plan = f'EXPLAIN failed: {error}'
+        slow_query_logger.warning(
+            'slow query (%.1f ms) in %s %s %s: %s%s',
+            elapsed * 1000, request.method, request.path, endpoint, statement,
+            f'\n{plan}' if plan else '',
+        )
+
+
+def init_request_metrics(app, db):
+    """
+    Installs the request profiling hooks on `app` unless METRICS_ENABLED is false. Configured with
+    METRICS_SAMPLE_RATE, SLOW_QUERY_MS and SLOW_QUERY_EXPLAIN.
+    """
+    if not app.config.get('METRICS_ENABLED', True):
+        return
+    with app.app_context():
+        metrics = RequestMetrics(
+            db.engine,
+            sample_rate=app.config.get('METRICS_SAMPLE_RATE', 1.0),
+            slow_query_seconds=app.config.get('SLOW_QUERY_MS', 250) / 1000,
+            explain_slow_queries=app.config.get('SLOW_QUERY_EXPLAIN', False),
+        )
+    app.extensions['request_metrics'] = metrics
+    app.before_request(metrics.start_request)
+    app.after_request(metrics.finish_response)
+    app.teardown_request(metrics.finish_request)
+
+
+# ---------------------Prometheus export-------------------------------------------------------
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, **extra):
+    pairs = list(zip(names, values)) + list(extra.items())
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _histogram_lines(name, help_text, label_names, items):
+    lines = [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+    for values, histogram in items:
+        snapshot = histogram.snapshot()
+        for bound, count in snapshot['buckets'].items():
+            lines.append(f'{name}_bucket{_labels(label_names, values, le=bound)} {count}')
+        lines.append(f'{name}_sum{_labels(label_names, values)} {snapshot["sum"]}')
+        lines.append(f'{name}_count{_labels(label_names, values)} {snapshot["count"]}')
+    return lines
+
+
+def _counter_lines(name, help_text, label_names, items):
+    lines = [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+    lines.extend(f'{name}{_labels(label_names, values)} {value}' for values, value in items)
+    return lines
+
+
+def _gauge_lines(name, help_text, value):
+    return [f'# HELP {name} {help_text}', f'# TYPE {name} gauge', f'{name} {value}']
+
+
+def render_prometheus():
+    """
+    Returns the metrics of the current app (this worker process) in the Prometheus text format.
+    """
+    lines = []
+    metrics = current_app.extensions.get('request_metrics')
+    if metrics is not None:
+        lines += _histogram_lines(
+            'http_request_duration_seconds', 'Request latency by endpoint.',
+            metrics.latency.label_names, metrics.latency.items())
+        lines += _counter_lines(
+            'http_requests_total', 'Requests by endpoint and status.',
+            metrics.requests.label_names, metrics.requests.items())
+        lines += _histogram_lines(
+            'db_statements_per_request', 'SQL statements run by each sampled request.',
+            metrics.statements.label_names, metrics.statements.items())
+        lines += _histogram_lines(
+            'db_statement_duration_seconds', 'Duration of each SQL statement of sampled requests.',
+            metrics.statement_duration.label_names, metrics.statement_duration.items())
+        lines += _counter_lines(
+            'db_slow_queries_total', 'Statements slower than SLOW_QUERY_MS in sampled requests.',
+            metrics.slow_queries.label_names, metrics.slow_queries.items())
+
+    limiter = current_app.extensions.get('rate_limiter')
+    if limiter is not None:
+        lines += _counter_lines(
+            'http_requests_shed_total', 'Requests refused by the rate limit (429) or admission control (503).',
+            limiter.shed.label_names, limiter.shed.items())
+        if limiter.admission is not None:
+            lines += _gauge_lines(
+                'admission_in_flight_cost', 'Token cost of the requests this worker is running.',
+                limiter.admission.in_flight)
+            lines += _gauge_lines(
+                'admission_capacity', 'Token cost this worker admits at once (ADMISSION_MAX_COST).',
+                limiter.admission.capacity)
+
+    pool_metrics = current_app.extensions.get('pool_metrics')
+    if pool_metrics is not None:
+        pool = pool_metrics.snapshot()
+        lines += _counter_lines(
+            'db_pool_events_total', 'Connection pool events (connect, close, invalidate, checkout, checkin).',
+            ('event',), [((name,), count) for name, count in pool['events'].items()])
+        for key in ('size', 'checked_out', 'overflow', 'saturation'):
+            if pool.get(key) is not None:
+                lines += _gauge_lines(f'db_pool_{key}', f'Connection pool {key.replace("_", " ")}.', pool[key])
+        checkout_wait = getattr(pool_metrics.engine.pool, 'checkout_wait', None)
+        if checkout_wait is not None:
+            lines += _histogram_lines(
+                'db_pool_checkout_wait_seconds', 'Time spent waiting for a pooled connection.',
+                (), [((), checkout_wait)])
+    return '\n'.join(lines) + '\n'
+
+
+class MetricsResource(Resource):
+    def get(self):
+        """
+        Returns the request, SQL and pool metrics of this worker in the Prometheus text format.
+        """
+        return Response(render_prometheus(), mimetype='text/plain; version=0.0.4')
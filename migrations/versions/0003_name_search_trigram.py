@@ -0,0 +1,41 @@
+"""name search trigram indexes
+
+Revision ID: 0003_name_search_trigram
+Revises: 0002_lookup_indexes
+Create Date: 2026-10-18 07:40:12.114208
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003_name_search_trigram'
+down_revision = '0002_lookup_indexes'
+branch_labels = None
+depends_on = None
+
+# (index name, table, column) of the GIN trigram indexes that serve name searches
+TRIGRAM_INDEXES = [
+    ('ix_students_name_trgm', 'students', 'name'),
+    ('ix_teachers_name_trgm', 'teachers', 'name'),
+    ('ix_courses_course_name_trgm', 'courses', 'course_name'),
+]
+
+
+def upgrade():
+    # pg_trgm only exists on PostgreSQL; SQLite uses the in-process n-gram index in search.py
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for name, table, column in TRIGRAM_INDEXES:
+        op.create_index(name, table, [column], postgresql_using='gin', postgresql_ops={column: 'gin_trgm_ops'})
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    for name, table, _ in TRIGRAM_INDEXES:
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,128 @@
+"""enrollment counters
+
+Revision ID: 0004_enrollment_counters
+Revises: 0003_name_search_trigram
+Create Date: 2026-10-18 07:41:50.133864
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004_enrollment_counters'
+down_revision = '0003_name_search_trigram'
+branch_labels = None
+depends_on = None
+
+# Snapshot of models.ENROLLMENT_COUNTER_DDL when this revision was written
+COUNTER_TRIGGERS = {
+    'postgresql': [
+        """
+        CREATE OR REPLACE FUNCTION enrollments_maintain_counts() RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                UPDATE courses SET student_count = courses.student_count + delta.n
+                FROM (SELECT course_id, count(*) AS n FROM new_rows GROUP BY course_id) AS delta
+                WHERE courses.course_id = delta.course_id;
+                UPDATE students SET course_count = students.course_count + delta.n
+                FROM (SELECT student_id, count(*) AS n FROM new_rows GROUP BY student_id) AS delta
+                WHERE students.student_id = delta.student_id;
+            END IF;
+            IF TG_OP IN ('DELETE', 'UPDATE') THEN
+                UPDATE courses SET student_count = courses.student_count - delta.n
+                FROM (SELECT course_id, count(*) AS n FROM old_rows GROUP BY course_id) AS delta
+                WHERE courses.course_id = delta.course_id;
+                UPDATE students SET course_count = students.course_count - delta.n
+                FROM (SELECT student_id, count(*) AS n FROM old_rows GROUP BY student_id) AS delta
+                WHERE students.student_id = delta.student_id;
+            END IF;
+            RETURN NULL;
+        END $$
+        """,
+        """
+        CREATE TRIGGER trg_enrollments_counts_insert AFTER INSERT ON enrollments
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION enrollments_maintain_counts()
+        """,
+        """
+        CREATE TRIGGER trg_enrollments_counts_update AFTER UPDATE ON enrollments
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION enrollments_maintain_counts()
+        """,
+        """
+        CREATE TRIGGER trg_enrollments_counts_delete AFTER DELETE ON enrollments
+        REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION enrollments_maintain_counts()
+        """,
+    ],
+    'sqlite': [
+        """
+        CREATE TRIGGER trg_enrollments_counts_insert AFTER INSERT ON enrollments
+        BEGIN
+            UPDATE courses SET student_count = student_count + 1 WHERE course_id = NEW.course_id;
+            UPDATE students SET course_count = course_count + 1 WHERE student_id = NEW.student_id;
+        END
+        """,
+        """
+        CREATE TRIGGER trg_enrollments_counts_update AFTER UPDATE OF student_id, course_id ON enrollments
+        BEGIN
+            UPDATE courses SET student_count = student_count - 1 WHERE course_id = OLD.course_id;
+            UPDATE students SET course_count = course_count - 1 WHERE student_id = OLD.student_id;
+            UPDATE courses SET student_count = student_count + 1 WHERE course_id = NEW.course_id;
+            UPDATE students SET course_count = course_count + 1 WHERE student_id = NEW.student_id;
+        END
+        """,
+        """
+        CREATE TRIGGER trg_enrollments_counts_delete AFTER DELETE ON enrollments
+        BEGIN
+            UPDATE courses SET student_count = student_count - 1 WHERE course_id = OLD.course_id;
+            UPDATE students SET course_count = course_count - 1 WHERE student_id = OLD.student_id;
+        END
+        """,
+    ],
+}
+TRIGGER_NAMES = ['trg_enrollments_counts_insert', 'trg_enrollments_counts_update', 'trg_enrollments_counts_delete']
+
+
+def upgrade():
+    # ### commands auto generated by Alembic - please adjust! ###
+    with op.batch_alter_table('courses', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('capacity', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('student_count', sa.Integer(), server_default='0', nullable=False))
+
+    with op.batch_alter_table('students', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('course_count', sa.Integer(), server_default='0', nullable=False))
+
+    # ### end Alembic commands ###
+
+    # Backfill the counters from the existing enrollments, then keep them in step with triggers
+    op.execute(
+        'UPDATE courses SET student_count = '
+        '(SELECT count(*) FROM enrollments WHERE enrollments.course_id = courses.course_id)'
+    )
+    op.execute(
+        'UPDATE students SET course_count = '
+        '(SELECT count(*) FROM enrollments WHERE enrollments.student_id = students.student_id)'
+    )
+    for statement in COUNTER_TRIGGERS.get(op.get_bind().dialect.name, []):
+        op.execute(statement)
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect in COUNTER_TRIGGERS:
+        for name in TRIGGER_NAMES:
+            op.execute(f'DROP TRIGGER IF EXISTS {name}' + (' ON enrollments' if dialect == 'postgresql' else ''))
+    if dialect == 'postgresql':
+        op.execute('DROP FUNCTION IF EXISTS enrollments_maintain_counts()')
+
+    # ### commands auto generated by Alembic - please adjust! ###
+    with op.batch_alter_table('students', schema=None) as batch_op:
+        batch_op.drop_column('course_count')
+
+    with op.batch_alter_table('courses', schema=None) as batch_op:
+        batch_op.drop_column('student_count')
+        batch_op.drop_column('capacity')
+
+    # ### end Alembic commands ###
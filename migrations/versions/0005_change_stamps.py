@@ -0,0 +1,275 @@
+"""change stamps
+
+Revision ID: 0005_change_stamps
+Revises: 0004_enrollment_counters
+Create Date: 2026-10-18 07:50:24.292230
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005_change_stamps'
+down_revision = '0004_enrollment_counters'
+branch_labels = None
+depends_on = None
+
+STAMPED_TABLES = ['courses', 'student_profiles', 'students', 'teacher_profiles', 'teachers']
+
+# Server default of updated_at (models.utcnow)
+UTCNOW = {'postgresql': "(now() AT TIME ZONE 'utc')", 'sqlite': '(CURRENT_TIMESTAMP)'}
+
+# Snapshot of models.ENROLLMENT_COUNTER_DDL when this revision was written: the counter
+# triggers now also bump the change stamps of the students and courses they update
+COUNTER_TRIGGERS = {
+    'postgresql': [
+        """
+        CREATE OR REPLACE FUNCTION enrollments_maintain_counts() RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                UPDATE courses SET student_count = courses.student_count + delta.n,
+                    version = courses.version + 1, updated_at = now() AT TIME ZONE 'utc'
+                FROM (SELECT course_id, count(*) AS n FROM new_rows GROUP BY course_id) AS delta
+                WHERE courses.course_id = delta.course_id;
+                UPDATE students SET course_count = students.course_count + delta.n,
+                    version = students.version + 1, updated_at = now() AT TIME ZONE 'utc'
+                FROM (SELECT student_id, count(*) AS n FROM new_rows GROUP BY student_id) AS delta
+                WHERE students.student_id = delta.student_id;
+            END IF;
+            IF TG_OP IN ('DELETE', 'UPDATE') THEN
+                UPDATE courses SET student_count = courses.student_count - delta.n,
+                    version = courses.version + 1, updated_at = now() AT TIME ZONE 'utc'
+                FROM (SELECT course_id, count(*) AS n FROM old_rows GROUP BY course_id) AS delta
+                WHERE courses.course_id = delta.course_id;
+                UPDATE students SET course_count = students.course_count - delta.n,
+                    version = students.version + 1, updated_at = now() AT TIME ZONE 'utc'
+                FROM (SELECT student_id, count(*) AS n FROM old_rows GROUP BY student_id) AS delta
+                WHERE students.student_id = delta.student_id;
+            END IF;
+            RETURN NULL;
+        END $$
+        """,
+        """
+        CREATE TRIGGER trg_enrollments_counts_insert AFTER INSERT ON enrollments
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION enrollments_maintain_counts()
+        """,
+        """
+        CREATE TRIGGER trg_enrollments_counts_update AFTER UPDATE ON enrollments
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION enrollments_maintain_counts()
+        """,
+        """
+        CREATE TRIGGER trg_enrollments_counts_delete AFTER DELETE ON enrollments
+        REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION enrollments_maintain_counts()
+        """,
+    ],
+    'sqlite': [
+        """
+        CREATE TRIGGER trg_enrollments_counts_insert AFTER INSERT ON enrollments
+        BEGIN
+            UPDATE courses SET student_count = student_count + 1, version = version + 1,
+                updated_at = CURRENT_TIMESTAMP WHERE course_id = NEW.course_id;
+            UPDATE students SET course_count = course_count + 1, version = version + 1,
+                updated_at = CURRENT_TIMESTAMP WHERE student_id = NEW.student_id;
+        END
+        """,
+        """
+        CREATE TRIGGER trg_enrollments_counts_update AFTER UPDATE OF student_id, course_id ON enrollments
+        BEGIN
+            UPDATE courses SET student_count = student_count - 1, version = version + 1,
+                updated_at = CURRENT_TIMESTAMP WHERE course_id = OLD.course_id;
+            UPDATE students SET course_count = course_count - 1, version = version + 1,
+                updated_at = CURRENT_TIMESTAMP WHERE student_id = OLD.student_id;
+            UPDATE courses SET student_count = student_count + 1, version = version + 1,
+                updated_at = CURRENT_TIMESTAMP WHERE course_id = NEW.course_id;
+            UPDATE students SET course_count = course_count + 1, version = version + 1,
+                updated_at = CURRENT_TIMESTAMP WHERE student_id = NEW.student_id;
+        END
+        """,
+        """
+        CREATE TRIGGER trg_enrollments_counts_delete AFTER DELETE ON enrollments
+        BEGIN
+            UPDATE courses SET student_count = student_count - 1, version = version + 1,
+                updated_at = CURRENT_TIMESTAMP WHERE course_id = OLD.course_id;
+            UPDATE students SET course_count = course_count - 1, version = version + 1,
+                updated_at = CURRENT_TIMESTAMP WHERE student_id = OLD.student_id;
+        END
+        """,
+    ],
+}
+# Snapshot of models.TEACHER_COURSE_STAMP_DDL when this revision was written
+TEACHER_COURSE_TRIGGERS = {
+    'postgresql': [
+        """
+        CREATE OR REPLACE FUNCTION teacher_courses_touch_teachers() RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                UPDATE teachers SET version = teachers.version + 1, updated_at = now() AT TIME ZONE 'utc'
+                WHERE teachers.teacher_id IN (SELECT teacher_id FROM new_rows);
+            END IF;
+            IF TG_OP IN ('DELETE', 'UPDATE') THEN
+                UPDATE teachers SET version = teachers.version + 1, updated_at = now() AT TIME ZONE 'utc'
+                WHERE teachers.teacher_id IN (SELECT teacher_id FROM old_rows);
+            END IF;
+            RETURN NULL;
+        END $$
+        """,
+        """
+        CREATE TRIGGER trg_teacher_courses_touch_insert AFTER INSERT ON teacher_courses
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION teacher_courses_touch_teachers()
+        """,
+        """
+        CREATE TRIGGER trg_teacher_courses_touch_update AFTER UPDATE ON teacher_courses
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION teacher_courses_touch_teachers()
+        """,
+        """
+        CREATE TRIGGER trg_teacher_courses_touch_delete AFTER DELETE ON teacher_courses
+        REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION teacher_courses_touch_teachers()
+        """,
+    ],
+    'sqlite': [
+        """
+        CREATE TRIGGER trg_teacher_courses_touch_insert AFTER INSERT ON teacher_courses
+        BEGIN
+            UPDATE teachers SET version = version + 1, updated_at = CURRENT_TIMESTAMP
+            WHERE teacher_id = NEW.teacher_id;
+        END
+        """,
+        """
+        CREATE TRIGGER trg_teacher_courses_touch_update AFTER UPDATE OF teacher_id, course_id ON teacher_courses
+        BEGIN
+            UPDATE teachers SET version = version + 1, updated_at = CURRENT_TIMESTAMP
+            WHERE teacher_id IN (OLD.teacher_id, NEW.teacher_id);
+        END
+        """,
+        """
+        CREATE TRIGGER trg_teacher_courses_touch_delete AFTER DELETE ON teacher_courses
+        BEGIN
+            UPDATE teachers SET version = version + 1, updated_at = CURRENT_TIMESTAMP
+            WHERE teacher_id = OLD.teacher_id;
+        END
+        """,
+    ],
+}
+# The counter triggers of 0004_enrollment_counters, restored by downgrade()
+PREVIOUS_COUNTER_TRIGGERS = {
+    'postgresql': [
+        """
+        CREATE OR REPLACE FUNCTION enrollments_maintain_counts() RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                UPDATE courses SET student_count = courses.student_count + delta.n
+                FROM (SELECT course_id, count(*) AS n FROM new_rows GROUP BY course_id) AS delta
+                WHERE courses.course_id = delta.course_id;
+                UPDATE students SET course_count = students.course_count + delta.n
+                FROM (SELECT student_id, count(*) AS n FROM new_rows GROUP BY student_id) AS delta
+                WHERE students.student_id = delta.student_id;
+            END IF;
+            IF TG_OP IN ('DELETE', 'UPDATE') THEN
+                UPDATE courses SET student_count = courses.student_count - delta.n
+                FROM (SELECT course_id, count(*) AS n FROM old_rows GROUP BY course_id) AS delta
+                WHERE courses.course_id = delta.course_id;
+                UPDATE students SET course_count = students.course_count - delta.n
+                FROM (SELECT student_id, count(*) AS n FROM old_rows GROUP BY student_id) AS delta
+                WHERE students.student_id = delta.student_id;
+            END IF;
+            RETURN NULL;
+        END $$
+        """,
+        """
+        CREATE TRIGGER trg_enrollments_counts_insert AFTER INSERT ON enrollments
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION enrollments_maintain_counts()
+        """,
+        """
+        CREATE TRIGGER trg_enrollments_counts_update AFTER UPDATE ON enrollments
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION enrollments_maintain_counts()
+        """,
+        """
+        CREATE TRIGGER trg_enrollments_counts_delete AFTER DELETE ON enrollments
+        REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION enrollments_maintain_counts()
+        """,
+    ],
+    'sqlite': [
+        """
+        CREATE TRIGGER trg_enrollments_counts_insert AFTER INSERT ON enrollments
+        BEGIN
+            UPDATE courses SET student_count = student_count + 1 WHERE course_id = NEW.course_id;
+            UPDATE students SET course_count = course_count + 1 WHERE student_id = NEW.student_id;
+        END
+        """,
+        """
+        CREATE TRIGGER trg_enrollments_counts_update AFTER UPDATE OF student_id, course_id ON enrollments
+        BEGIN
+            UPDATE courses SET student_count = student_count - 1 WHERE course_id = OLD.course_id;
+            UPDATE students SET course_count = course_count - 1 WHERE student_id = OLD.student_id;
+            UPDATE courses SET student_count = student_count + 1 WHERE course_id = NEW.course_id;
+            UPDATE students SET course_count = course_count + 1 WHERE student_id = NEW.student_id;
+        END
+        """,
+        """
+        CREATE TRIGGER trg_enrollments_counts_delete AFTER DELETE ON enrollments
+        BEGIN
+            UPDATE courses SET student_count = student_count - 1 WHERE course_id = OLD.course_id;
+            UPDATE students SET course_count = course_count - 1 WHERE student_id = OLD.student_id;
+        END
+        """,
+    ],
+}
+TRIGGERS = {
+    'enrollments': ['trg_enrollments_counts_insert', 'trg_enrollments_counts_update', 'trg_enrollments_counts_delete'],
+    'teacher_courses': [
+        'trg_teacher_courses_touch_insert', 'trg_teacher_courses_touch_update', 'trg_teacher_courses_touch_delete',
+    ],
+}
+
+
+def _drop_triggers(dialect, table):
+    for name in TRIGGERS[table]:
+        op.execute(f'DROP TRIGGER IF EXISTS {name}' + (f' ON {table}' if dialect == 'postgresql' else ''))
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    # SQLite cannot add a column with a non-constant default, so the tables are copied instead. The
+    # counter triggers reference them and would break the rename, so they are dropped first and
+    # recreated below with their new definition.
+    if dialect in COUNTER_TRIGGERS:
+        _drop_triggers(dialect, 'enrollments')
+
+    utcnow = sa.text(UTCNOW.get(dialect, 'CURRENT_TIMESTAMP'))
+    recreate = 'always' if dialect == 'sqlite' else 'auto'
+    for table in STAMPED_TABLES:
+        with op.batch_alter_table(table, schema=None, recreate=recreate) as batch_op:
+            batch_op.add_column(sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+            batch_op.add_column(sa.Column('updated_at', sa.DateTime(), server_default=utcnow, nullable=False))
+
+    for statement in COUNTER_TRIGGERS.get(dialect, []):
+        op.execute(statement)
+    for statement in TEACHER_COURSE_TRIGGERS.get(dialect, []):
+        op.execute(statement)
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect in COUNTER_TRIGGERS:
+        _drop_triggers(dialect, 'teacher_courses')
+        _drop_triggers(dialect, 'enrollments')
+    if dialect == 'postgresql':
+        op.execute('DROP FUNCTION IF EXISTS teacher_courses_touch_teachers()')
+
+    for table in reversed(STAMPED_TABLES):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_column('updated_at')
+            batch_op.drop_column('version')
+
+    for statement in PREVIOUS_COUNTER_TRIGGERS.get(dialect, []):
+        op.execute(statement)
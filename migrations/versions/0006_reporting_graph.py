@@ -0,0 +1,342 @@
+"""reporting graph
+
+Revision ID: 0006_reporting_graph
+Revises: 0005_change_stamps
+Create Date: 2026-10-18 08:16:08.376906
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0006_reporting_graph'
+down_revision = '0005_change_stamps'
+branch_labels = None
+depends_on = None
+
+
+# Snapshot of models.ENROLLMENT_GRAPH_DDL when this revision was written
+ENROLLMENT_TRIGGERS = {
+    'postgresql': [
+        """
+        CREATE OR REPLACE FUNCTION enrollments_maintain_graph() RETURNS trigger LANGUAGE plpgsql AS $$
+        DECLARE
+            removed_students integer[];
+            removed_courses integer[];
+            added_students integer[];
+            added_courses integer[];
+        BEGIN
+            IF TG_OP IN ('DELETE', 'UPDATE') THEN
+                SELECT array_agg(student_id), array_agg(course_id) INTO removed_students, removed_courses
+                FROM old_rows;
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                SELECT array_agg(student_id), array_agg(course_id) INTO added_students, added_courses
+                FROM new_rows;
+            END IF;
+
+            WITH changes AS (
+                SELECT student_id, course_id, -1 AS sign
+                FROM unnest(removed_students, removed_courses) AS removed(student_id, course_id)
+                UNION ALL
+                SELECT student_id, course_id, 1
+                FROM unnest(added_students, added_courses) AS added(student_id, course_id)
+            )
+            INSERT INTO report_teacher_students AS r (teacher_id, student_id, shared_courses)
+            SELECT tc.teacher_id, c.student_id, sum(c.sign)
+            FROM changes AS c JOIN teacher_courses AS tc ON tc.course_id = c.course_id
+            WHERE tc.teacher_id IS NOT NULL AND c.student_id IS NOT NULL
+            GROUP BY tc.teacher_id, c.student_id HAVING sum(c.sign) <> 0
+            ON CONFLICT (teacher_id, student_id)
+            DO UPDATE SET shared_courses = r.shared_courses + EXCLUDED.shared_courses;
+
+            -- Each changed enrollment pairs with the student's untouched courses (kept) and with the
+            -- other enrollments of the student changed the same way
+            WITH changes AS (
+                SELECT student_id, course_id, -1 AS sign
+                FROM unnest(removed_students, removed_courses) AS removed(student_id, course_id)
+                UNION ALL
+                SELECT student_id, course_id, 1
+                FROM unnest(added_students, added_courses) AS added(student_id, course_id)
+            ), kept AS (
+                SELECT student_id, course_id FROM enrollments
+                WHERE student_id IN (SELECT student_id FROM changes)
+                EXCEPT ALL
+                SELECT student_id, course_id FROM changes WHERE sign = 1
+            ), delta AS (
+                SELECT c.course_id, k.course_id AS other_course_id, c.sign
+                FROM changes AS c JOIN kept AS k ON k.student_id = c.student_id AND k.course_id <> c.course_id
+                UNION ALL
+                SELECT k.course_id, c.course_id, c.sign
+                FROM changes AS c JOIN kept AS k ON k.student_id = c.student_id AND k.course_id <> c.course_id
+                UNION ALL
+                SELECT c.course_id, d.course_id, c.sign
+                FROM changes AS c JOIN changes AS d
+                    ON d.student_id = c.student_id AND d.sign = c.sign AND d.course_id <> c.course_id
+            )
+            INSERT INTO report_course_pairs AS p (course_id, other_course_id, shared_students)
+            SELECT course_id, other_course_id, sum(sign) FROM delta
+            GROUP BY course_id, other_course_id HAVING sum(sign) <> 0
+            ON CONFLICT (course_id, other_course_id)
+            DO UPDATE SET shared_students = p.shared_students + EXCLUDED.shared_students;
+
+            IF TG_OP IN ('DELETE', 'UPDATE') THEN
+                DELETE FROM report_teacher_students
+                WHERE shared_courses <= 0 AND student_id = ANY(removed_students);
+                DELETE FROM report_course_pairs
+                WHERE shared_students <= 0
+                    AND (course_id = ANY(removed_courses) OR other_course_id = ANY(removed_courses));
+            END IF;
+            RETURN NULL;
+        END $$
+        """,
+        """
+        CREATE TRIGGER trg_enrollments_graph_insert AFTER INSERT ON enrollments
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION enrollments_maintain_graph()
+        """,
+        """
+        CREATE TRIGGER trg_enrollments_graph_update AFTER UPDATE ON enrollments
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION enrollments_maintain_graph()
+        """,
+        """
+        CREATE TRIGGER trg_enrollments_graph_delete AFTER DELETE ON enrollments
+        REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION enrollments_maintain_graph()
+        """,
+    ],
+    'sqlite': [
+        """
+        CREATE TRIGGER trg_enrollments_graph_insert AFTER INSERT ON enrollments
+        BEGIN
+            INSERT INTO report_teacher_students (teacher_id, student_id, shared_courses)
+            SELECT teacher_id, NEW.student_id, 1 FROM teacher_courses
+            WHERE course_id = NEW.course_id AND teacher_id IS NOT NULL AND NEW.student_id IS NOT NULL
+            ON CONFLICT (teacher_id, student_id) DO UPDATE SET shared_courses = shared_courses + 1;
+            INSERT INTO report_course_pairs (course_id, other_course_id, shared_students)
+            SELECT NEW.course_id, course_id, 1 FROM enrollments
+            WHERE student_id = NEW.student_id AND course_id <> NEW.course_id
+            ON CONFLICT (course_id, other_course_id) DO UPDATE SET shared_students = shared_students + 1;
+            INSERT INTO report_course_pairs (course_id, other_course_id, shared_students)
+            SELECT course_id, NEW.course_id, 1 FROM enrollments
+            WHERE student_id = NEW.student_id AND course_id <> NEW.course_id
+            ON CONFLICT (course_id, other_course_id) DO UPDATE SET shared_students = shared_students + 1;
+        END
+        """,
+        """
+        CREATE TRIGGER trg_enrollments_graph_update AFTER UPDATE OF student_id, course_id ON enrollments
+        BEGIN
+            UPDATE report_teacher_students SET shared_courses = shared_courses - 1
+            WHERE student_id = OLD.student_id
+                AND teacher_id IN (SELECT teacher_id FROM teacher_courses WHERE course_id = OLD.course_id);
+            UPDATE report_course_pairs SET shared_students = shared_students - 1
+            WHERE (course_id = OLD.course_id AND other_course_id IN (
+                    SELECT course_id FROM enrollments
+                    WHERE student_id = OLD.student_id AND enrollment_id <> NEW.enrollment_id))
+                OR (other_course_id = OLD.course_id AND course_id IN (
+                    SELECT course_id FROM enrollments
+                    WHERE student_id = OLD.student_id AND enrollment_id <> NEW.enrollment_id));
+            DELETE FROM report_teacher_students WHERE shared_courses <= 0 AND student_id = OLD.student_id;
+            DELETE FROM report_course_pairs
+            WHERE shared_students <= 0 AND (course_id = OLD.course_id OR other_course_id = OLD.course_id);
+
+            INSERT INTO report_teacher_students (teacher_id, student_id, shared_courses)
+            SELECT teacher_id, NEW.student_id, 1 FROM teacher_courses
+            WHERE course_id = NEW.course_id AND teacher_id IS NOT NULL AND NEW.student_id IS NOT NULL
+            ON CONFLICT (teacher_id, student_id) DO UPDATE SET shared_courses = shared_courses + 1;
+            INSERT INTO report_course_pairs (course_id, other_course_id, shared_students)
+            SELECT NEW.course_id, course_id, 1 FROM enrollments
+            WHERE student_id = NEW.student_id AND course_id <> NEW.course_id
+            ON CONFLICT (course_id, other_course_id) DO UPDATE SET shared_students = shared_students + 1;
+            INSERT INTO report_course_pairs (course_id, other_course_id, shared_students)
+            SELECT course_id, NEW.course_id, 1 FROM enrollments
+            WHERE student_id = NEW.student_id AND course_id <> NEW.course_id
+            ON CONFLICT (course_id, other_course_id) DO UPDATE SET shared_students = shared_students + 1;
+        END
+        """,
+        """
+        CREATE TRIGGER trg_enrollments_graph_delete AFTER DELETE ON enrollments
+        BEGIN
+            UPDATE report_teacher_students SET shared_courses = shared_courses - 1
+            WHERE student_id = OLD.student_id
+                AND teacher_id IN (SELECT teacher_id FROM teacher_courses WHERE course_id = OLD.course_id);
+            UPDATE report_course_pairs SET shared_students = shared_students - 1
+            WHERE (course_id = OLD.course_id AND other_course_id IN (
+                    SELECT course_id FROM enrollments WHERE student_id = OLD.student_id))
+                OR (other_course_id = OLD.course_id AND course_id IN (
+                    SELECT course_id FROM enrollments WHERE student_id = OLD.student_id));
+            DELETE FROM report_teacher_students WHERE shared_courses <= 0 AND student_id = OLD.student_id;
+            DELETE FROM report_course_pairs
+            WHERE shared_students <= 0 AND (course_id = OLD.course_id OR other_course_id = OLD.course_id);
+        END
+        """,
+    ],
+}
+
+# Snapshot of models.TEACHER_COURSE_GRAPH_DDL when this revision was written
+TEACHER_COURSE_TRIGGERS = {
+    'postgresql': [
+        """
+        CREATE OR REPLACE FUNCTION teacher_courses_maintain_graph() RETURNS trigger LANGUAGE plpgsql AS $$
+        DECLARE
+            removed_teachers integer[];
+            removed_courses integer[];
+            added_teachers integer[];
+            added_courses integer[];
+        BEGIN
+            IF TG_OP IN ('DELETE', 'UPDATE') THEN
+                SELECT array_agg(teacher_id), array_agg(course_id) INTO removed_teachers, removed_courses
+                FROM old_rows;
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                SELECT array_agg(teacher_id), array_agg(course_id) INTO added_teachers, added_courses
+                FROM new_rows;
+            END IF;
+
+            WITH changes AS (
+                SELECT teacher_id, course_id, -1 AS sign
+                FROM unnest(removed_teachers, removed_courses) AS removed(teacher_id, course_id)
+                UNION ALL
+                SELECT teacher_id, course_id, 1
+                FROM unnest(added_teachers, added_courses) AS added(teacher_id, course_id)
+            )
+            INSERT INTO report_teacher_students AS r (teacher_id, student_id, shared_courses)
+            SELECT c.teacher_id, e.student_id, sum(c.sign)
+            FROM changes AS c JOIN enrollments AS e ON e.course_id = c.course_id
+            WHERE c.teacher_id IS NOT NULL AND e.student_id IS NOT NULL
+            GROUP BY c.teacher_id, e.student_id HAVING sum(c.sign) <> 0
+            ON CONFLICT (teacher_id, student_id)
+            DO UPDATE SET shared_courses = r.shared_courses + EXCLUDED.shared_courses;
+
+            IF TG_OP IN ('DELETE', 'UPDATE') THEN
+                DELETE FROM report_teacher_students
+                WHERE shared_courses <= 0 AND teacher_id = ANY(removed_teachers);
+            END IF;
+            RETURN NULL;
+        END $$
+        """,
+        """
+        CREATE TRIGGER trg_teacher_courses_graph_insert AFTER INSERT ON teacher_courses
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION teacher_courses_maintain_graph()
+        """,
+        """
+        CREATE TRIGGER trg_teacher_courses_graph_update AFTER UPDATE ON teacher_courses
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION teacher_courses_maintain_graph()
+        """,
+        """
+        CREATE TRIGGER trg_teacher_courses_graph_delete AFTER DELETE ON teacher_courses
+        REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION teacher_courses_maintain_graph()
+        """,
+    ],
+    'sqlite': [
+        """
+        CREATE TRIGGER trg_teacher_courses_graph_insert AFTER INSERT ON teacher_courses
+        BEGIN
+            INSERT INTO report_teacher_students (teacher_id, student_id, shared_courses)
+            SELECT NEW.teacher_id, student_id, 1 FROM enrollments
+            WHERE course_id = NEW.course_id AND student_id IS NOT NULL AND NEW.teacher_id IS NOT NULL
+            ON CONFLICT (teacher_id, student_id) DO UPDATE SET shared_courses = shared_courses + 1;
+        END
+        """,
+        """
+        CREATE TRIGGER trg_teacher_courses_graph_update AFTER UPDATE OF teacher_id, course_id ON teacher_courses
+        BEGIN
+            UPDATE report_teacher_students SET shared_courses = shared_courses - 1
+            WHERE teacher_id = OLD.teacher_id
+                AND student_id IN (SELECT student_id FROM enrollments WHERE course_id = OLD.course_id);
+            DELETE FROM report_teacher_students WHERE shared_courses <= 0 AND teacher_id = OLD.teacher_id;
+            INSERT INTO report_teacher_students (teacher_id, student_id, shared_courses)
+            SELECT NEW.teacher_id, student_id, 1 FROM enrollments
+            WHERE course_id = NEW.course_id AND student_id IS NOT NULL AND NEW.teacher_id IS NOT NULL
+            ON CONFLICT (teacher_id, student_id) DO UPDATE SET shared_courses = shared_courses + 1;
+        END
+        """,
+        """
+        CREATE TRIGGER trg_teacher_courses_graph_delete AFTER DELETE ON teacher_courses
+        BEGIN
+            UPDATE report_teacher_students SET shared_courses = shared_courses - 1
+            WHERE teacher_id = OLD.teacher_id
+                AND student_id IN (SELECT student_id FROM enrollments WHERE course_id = OLD.course_id);
+            DELETE FROM report_teacher_students WHERE shared_courses <= 0 AND teacher_id = OLD.teacher_id;
+        END
+        """,
+    ],
+}
+TRIGGERS = {
+    'enrollments': ['trg_enrollments_graph_insert', 'trg_enrollments_graph_update', 'trg_enrollments_graph_delete'],
+    'teacher_courses': [
+        'trg_teacher_courses_graph_insert', 'trg_teacher_courses_graph_update', 'trg_teacher_courses_graph_delete',
+    ],
+}
+
+# The report rows of the data already there, as reports.rebuild_graph() computes them
+BACKFILL = [
+    """
+    INSERT INTO report_teacher_students (teacher_id, student_id, shared_courses)
+    SELECT tc.teacher_id, e.student_id, count(*)
+    FROM teacher_courses AS tc JOIN enrollments AS e ON e.course_id = tc.course_id
+    WHERE tc.teacher_id IS NOT NULL AND e.student_id IS NOT NULL
+    GROUP BY tc.teacher_id, e.student_id
+    """,
+    """
+    INSERT INTO report_course_pairs (course_id, other_course_id, shared_students)
+    SELECT e.course_id, other.course_id, count(*)
+    FROM enrollments AS e JOIN enrollments AS other
+        ON other.student_id = e.student_id AND other.course_id <> e.course_id
+    GROUP BY e.course_id, other.course_id
+    """,
+]
+
+
+def _drop_triggers(dialect, table):
+    for name in TRIGGERS[table]:
+        op.execute(f'DROP TRIGGER IF EXISTS {name}' + (f' ON {table}' if dialect == 'postgresql' else ''))
+
+
+def upgrade():
+    # ### commands auto generated by Alembic - please adjust! ###
+    op.create_table('report_course_pairs',
+    sa.Column('course_id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('other_course_id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('shared_students', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('course_id', 'other_course_id')
+    )
+    op.create_table('report_teacher_students',
+    sa.Column('teacher_id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('student_id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('shared_courses', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('teacher_id', 'student_id')
+    )
+    with op.batch_alter_table('report_teacher_students', schema=None) as batch_op:
+        batch_op.create_index('ix_report_teacher_students_student_id', ['student_id'], unique=False)
+
+    # ### end Alembic commands ###
+
+    dialect = op.get_bind().dialect.name
+    for statement in BACKFILL:
+        op.execute(statement)
+    for statement in ENROLLMENT_TRIGGERS.get(dialect, []) + TEACHER_COURSE_TRIGGERS.get(dialect, []):
+        op.execute(statement)
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect in ENROLLMENT_TRIGGERS:
+        _drop_triggers(dialect, 'teacher_courses')
+        _drop_triggers(dialect, 'enrollments')
+    if dialect == 'postgresql':
+        op.execute('DROP FUNCTION IF EXISTS teacher_courses_maintain_graph()')
+        op.execute('DROP FUNCTION IF EXISTS enrollments_maintain_graph()')
+
+    # ### commands auto generated by Alembic - please adjust! ###
+    with op.batch_alter_table('report_teacher_students', schema=None) as batch_op:
+        batch_op.drop_index('ix_report_teacher_students_student_id')
+
+    op.drop_table('report_teacher_students')
+    op.drop_table('report_course_pairs')
+    # ### end Alembic commands ###
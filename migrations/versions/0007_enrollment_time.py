@@ -0,0 +1,186 @@
+"""enrollment time
+
+Revision ID: 0007_enrollment_time
+Revises: 0006_reporting_graph
+Create Date: 2026-10-18 08:19:55.171326
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0007_enrollment_time'
+down_revision = '0006_reporting_graph'
+branch_labels = None
+depends_on = None
+
+
+# Server default of enrolled_at (models.utcnow)
+UTCNOW = {'postgresql': "(now() AT TIME ZONE 'utc')", 'sqlite': '(CURRENT_TIMESTAMP)'}
+
+# Snapshot of the SQLite triggers of models.ENROLLMENT_COUNTER_DDL, models.ENROLLMENT_GRAPH_DDL and
+# models.TEACHER_COURSE_GRAPH_DDL when this revision was written. They reference enrollments, so they
+# are dropped while SQLite copies the table and created again afterwards.
+SQLITE_TRIGGERS = [
+    """
+    CREATE TRIGGER trg_enrollments_counts_insert AFTER INSERT ON enrollments
+    BEGIN
+        UPDATE courses SET student_count = student_count + 1, version = version + 1,
+            updated_at = CURRENT_TIMESTAMP WHERE course_id = NEW.course_id;
+        UPDATE students SET course_count = course_count + 1, version = version + 1,
+            updated_at = CURRENT_TIMESTAMP WHERE student_id = NEW.student_id;
+    END
+    """,
+    """
+    CREATE TRIGGER trg_enrollments_counts_update AFTER UPDATE OF student_id, course_id ON enrollments
+    BEGIN
+        UPDATE courses SET student_count = student_count - 1, version = version + 1,
+            updated_at = CURRENT_TIMESTAMP WHERE course_id = OLD.course_id;
+        UPDATE students SET course_count = course_count - 1, version = version + 1,
+            updated_at = CURRENT_TIMESTAMP WHERE student_id = OLD.student_id;
+        UPDATE courses SET student_count = student_count + 1, version = version + 1,
+            updated_at = CURRENT_TIMESTAMP WHERE course_id = NEW.course_id;
+        UPDATE students SET course_count = course_count + 1, version = version + 1,
+            updated_at = CURRENT_TIMESTAMP WHERE student_id = NEW.student_id;
+    END
+    """,
+    """
+    CREATE TRIGGER trg_enrollments_counts_delete AFTER DELETE ON enrollments
+    BEGIN
+        UPDATE courses SET student_count = student_count - 1, version = version + 1,
+            updated_at = CURRENT_TIMESTAMP WHERE course_id = OLD.course_id;
+        UPDATE students SET course_count = course_count - 1, version = version + 1,
+            updated_at = CURRENT_TIMESTAMP WHERE student_id = OLD.student_id;
+    END
+    """,
+    """
+    CREATE TRIGGER trg_enrollments_graph_insert AFTER INSERT ON enrollments
+    BEGIN
+        INSERT INTO report_teacher_students (teacher_id, student_id, shared_courses)
+        SELECT teacher_id, NEW.student_id, 1 FROM teacher_courses
+        WHERE course_id = NEW.course_id AND teacher_id IS NOT NULL AND NEW.student_id IS NOT NULL
+        ON CONFLICT (teacher_id, student_id) DO UPDATE SET shared_courses = shared_courses + 1;
+        INSERT INTO report_course_pairs (course_id, other_course_id, shared_students)
+        SELECT NEW.course_id, course_id, 1 FROM enrollments
+        WHERE student_id = NEW.student_id AND course_id <> NEW.course_id
+        ON CONFLICT (course_id, other_course_id) DO UPDATE SET shared_students = shared_students + 1;
+        INSERT INTO report_course_pairs (course_id, other_course_id, shared_students)
+        SELECT course_id, NEW.course_id, 1 FROM enrollments
+        WHERE student_id = NEW.student_id AND course_id <> NEW.course_id
+        ON CONFLICT (course_id, other_course_id) DO UPDATE SET shared_students = shared_students + 1;
+    END
+    """,
+    """
+    CREATE TRIGGER trg_enrollments_graph_update AFTER UPDATE OF student_id, course_id ON enrollments
+    BEGIN
+        UPDATE report_teacher_students SET shared_courses = shared_courses - 1
+        WHERE student_id = OLD.student_id
+            AND teacher_id IN (SELECT teacher_id FROM teacher_courses WHERE course_id = OLD.course_id);
+        UPDATE report_course_pairs SET shared_students = shared_students - 1
+        WHERE (course_id = OLD.course_id AND other_course_id IN (
+                SELECT course_id FROM enrollments
+                WHERE student_id = OLD.student_id AND enrollment_id <> NEW.enrollment_id))
+            OR (other_course_id = OLD.course_id AND course_id IN (
+                SELECT course_id FROM enrollments
+                WHERE student_id = OLD.student_id AND enrollment_id <> NEW.enrollment_id));
+        DELETE FROM report_teacher_students WHERE shared_courses <= 0 AND student_id = OLD.student_id;
+        DELETE FROM report_course_pairs
+        WHERE shared_students <= 0 AND (course_id = OLD.course_id OR other_course_id = OLD.course_id);
+
+        INSERT INTO report_teacher_students (teacher_id, student_id, shared_courses)
+        SELECT teacher_id, NEW.student_id, 1 FROM teacher_courses
+        WHERE course_id = NEW.course_id AND teacher_id IS NOT NULL AND NEW.student_id IS NOT NULL
+        ON CONFLICT (teacher_id, student_id) DO UPDATE SET shared_courses = shared_courses + 1;
+        INSERT INTO report_course_pairs (course_id, other_course_id, shared_students)
+        SELECT NEW.course_id, course_id, 1 FROM enrollments
+        WHERE student_id = NEW.student_id AND course_id <> NEW.course_id
+        ON CONFLICT (course_id, other_course_id) DO UPDATE SET shared_students = shared_students + 1;
+        INSERT INTO report_course_pairs (course_id, other_course_id, shared_students)
+        SELECT course_id, NEW.course_id, 1 FROM enrollments
+        WHERE student_id = NEW.student_id AND course_id <> NEW.course_id
+        ON CONFLICT (course_id, other_course_id) DO UPDATE SET shared_students = shared_students + 1;
+    END
+    """,
+    """
+    CREATE TRIGGER trg_enrollments_graph_delete AFTER DELETE ON enrollments
+    BEGIN
+        UPDATE report_teacher_students SET shared_courses = shared_courses - 1
+        WHERE student_id = OLD.student_id
+            AND teacher_id IN (SELECT teacher_id FROM teacher_courses WHERE course_id = OLD.course_id);
+        UPDATE report_course_pairs SET shared_students = shared_students - 1
+        WHERE (course_id = OLD.course_id AND other_course_id IN (
+                SELECT course_id FROM enrollments WHERE student_id = OLD.student_id))
+            OR (other_course_id = OLD.course_id AND course_id IN (
+                SELECT course_id FROM enrollments WHERE student_id = OLD.student_id));
+        DELETE FROM report_teacher_students WHERE shared_courses <= 0 AND student_id = OLD.student_id;
+        DELETE FROM report_course_pairs
+        WHERE shared_students <= 0 AND (course_id = OLD.course_id OR other_course_id = OLD.course_id);
+    END
+    """,
+    """
+    CREATE TRIGGER trg_teacher_courses_graph_insert AFTER INSERT ON teacher_courses
+    BEGIN
+        INSERT INTO report_teacher_students (teacher_id, student_id, shared_courses)
+        SELECT NEW.teacher_id, student_id, 1 FROM enrollments
+        WHERE course_id = NEW.course_id AND student_id IS NOT NULL AND NEW.teacher_id IS NOT NULL
+        ON CONFLICT (teacher_id, student_id) DO UPDATE SET shared_courses = shared_courses + 1;
+    END
+    """,
+    """
+    CREATE TRIGGER trg_teacher_courses_graph_update AFTER UPDATE OF teacher_id, course_id ON teacher_courses
+    BEGIN
+        UPDATE report_teacher_students SET shared_courses = shared_courses - 1
+        WHERE teacher_id = OLD.teacher_id
+            AND student_id IN (SELECT student_id FROM enrollments WHERE course_id = OLD.course_id);
+        DELETE FROM report_teacher_students WHERE shared_courses <= 0 AND teacher_id = OLD.teacher_id;
+        INSERT INTO report_teacher_students (teacher_id, student_id, shared_courses)
+        SELECT NEW.teacher_id, student_id, 1 FROM enrollments
+        WHERE course_id = NEW.course_id AND student_id IS NOT NULL AND NEW.teacher_id IS NOT NULL
+        ON CONFLICT (teacher_id, student_id) DO UPDATE SET shared_courses = shared_courses + 1;
+    END
+    """,
+    """
+    CREATE TRIGGER trg_teacher_courses_graph_delete AFTER DELETE ON teacher_courses
+    BEGIN
+        UPDATE report_teacher_students SET shared_courses = shared_courses - 1
+        WHERE teacher_id = OLD.teacher_id
+            AND student_id IN (SELECT student_id FROM enrollments WHERE course_id = OLD.course_id);
+        DELETE FROM report_teacher_students WHERE shared_courses <= 0 AND teacher_id = OLD.teacher_id;
+    END
+    """,
+]
+SQLITE_TRIGGER_NAMES = [
+    'trg_enrollments_counts_insert', 'trg_enrollments_counts_update', 'trg_enrollments_counts_delete',
+    'trg_enrollments_graph_insert', 'trg_enrollments_graph_update', 'trg_enrollments_graph_delete',
+    'trg_teacher_courses_graph_insert', 'trg_teacher_courses_graph_update', 'trg_teacher_courses_graph_delete',
+]
+
+
+def _recreate_enrollments(alter):
+    """
+    Runs `alter(batch_op)` on enrollments. SQLite cannot add a column with a non-constant default,
+    so there the table is copied, around the triggers that reference it.
+    """
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        for name in SQLITE_TRIGGER_NAMES:
+            op.execute(f'DROP TRIGGER IF EXISTS {name}')
+    recreate = 'always' if dialect == 'sqlite' else 'auto'
+    with op.batch_alter_table('enrollments', schema=None, recreate=recreate) as batch_op:
+        alter(batch_op)
+    if dialect == 'sqlite':
+        for statement in SQLITE_TRIGGERS:
+            op.execute(statement)
+
+
+def upgrade():
+    # Existing enrollments get the time of the upgrade
+    utcnow = sa.text(UTCNOW.get(op.get_bind().dialect.name, 'CURRENT_TIMESTAMP'))
+    _recreate_enrollments(lambda batch_op: batch_op.add_column(
+        sa.Column('enrolled_at', sa.DateTime(), server_default=utcnow, nullable=False)
+    ))
+
+
+def downgrade():
+    _recreate_enrollments(lambda batch_op: batch_op.drop_column('enrolled_at'))
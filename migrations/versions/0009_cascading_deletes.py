@@ -0,0 +1,93 @@
+"""cascading deletes
+
+Revision ID: 0009_cascading_deletes
+Revises: 0008_csv_imports
+Create Date: 2026-10-18 08:35:03.476076
+
+"""
+from contextlib import contextmanager
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0009_cascading_deletes'
+down_revision = '0008_csv_imports'
+branch_labels = None
+depends_on = None
+
+
+# Tables whose foreign keys change. SQLite copies them to alter a constraint, and drops their
+# triggers with the old copy (and the triggers of the others reference it), so they are read
+# before and created again afterwards.
+TABLES = ('enrollments', 'students', 'teacher_courses', 'teachers')
+
+
+def _sqlite_triggers():
+    if op.get_bind().dialect.name != 'sqlite':
+        return []
+    names = ', '.join(f"'{table}'" for table in TABLES)
+    return op.get_bind().execute(sa.text(
+        f"SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND tbl_name IN ({names})"
+    )).all()
+
+
+@contextmanager
+def _batch_alter_table(table):
+    """
+    op.batch_alter_table() around which the SQLite triggers of TABLES are dropped and created again.
+    """
+    triggers = _sqlite_triggers()
+    for name, _ in triggers:
+        op.execute(f'DROP TRIGGER IF EXISTS {name}')
+    with op.batch_alter_table(table, schema=None) as batch_op:
+        yield batch_op
+    for _, sql in triggers:
+        op.execute(sql)
+
+
+def upgrade():
+    # Deleting a student, teacher or course deletes its enrollments and course assignments in the
+    # database, and the links to a profile are checked at commit, so the resources delete without
+    # loading anything first (models.py)
+    with _batch_alter_table('enrollments') as batch_op:
+        batch_op.drop_constraint('fk_enrollments_student_id_students', type_='foreignkey')
+        batch_op.drop_constraint('fk_enrollments_course_id_courses', type_='foreignkey')
+        batch_op.create_foreign_key(batch_op.f('fk_enrollments_student_id_students'), 'students', ['student_id'], ['student_id'], ondelete='CASCADE')
+        batch_op.create_foreign_key(batch_op.f('fk_enrollments_course_id_courses'), 'courses', ['course_id'], ['course_id'], ondelete='CASCADE')
+
+    with _batch_alter_table('students') as batch_op:
+        batch_op.drop_constraint('fk_students_student_profile_id_student_profiles', type_='foreignkey')
+        batch_op.create_foreign_key(batch_op.f('fk_students_student_profile_id_student_profiles'), 'student_profiles', ['student_profile_id'], ['student_profile_id'], deferrable=True, initially='DEFERRED')
+
+    with _batch_alter_table('teacher_courses') as batch_op:
+        batch_op.drop_constraint('fk_teacher_courses_course_id_courses', type_='foreignkey')
+        batch_op.drop_constraint('fk_teacher_courses_teacher_id_teachers', type_='foreignkey')
+        batch_op.create_foreign_key(batch_op.f('fk_teacher_courses_course_id_courses'), 'courses', ['course_id'], ['course_id'], ondelete='CASCADE')
+        batch_op.create_foreign_key(batch_op.f('fk_teacher_courses_teacher_id_teachers'), 'teachers', ['teacher_id'], ['teacher_id'], ondelete='CASCADE')
+
+    with _batch_alter_table('teachers') as batch_op:
+        batch_op.drop_constraint('fk_teachers_teacher_profile_id_teacher_profiles', type_='foreignkey')
+        batch_op.create_foreign_key(batch_op.f('fk_teachers_teacher_profile_id_teacher_profiles'), 'teacher_profiles', ['teacher_profile_id'], ['teacher_profile_id'], deferrable=True, initially='DEFERRED')
+
+
+def downgrade():
+    with _batch_alter_table('teachers') as batch_op:
+        batch_op.drop_constraint(batch_op.f('fk_teachers_teacher_profile_id_teacher_profiles'), type_='foreignkey')
+        batch_op.create_foreign_key('fk_teachers_teacher_profile_id_teacher_profiles', 'teacher_profiles', ['teacher_profile_id'], ['teacher_profile_id'])
+
+    with _batch_alter_table('teacher_courses') as batch_op:
+        batch_op.drop_constraint(batch_op.f('fk_teacher_courses_teacher_id_teachers'), type_='foreignkey')
+        batch_op.drop_constraint(batch_op.f('fk_teacher_courses_course_id_courses'), type_='foreignkey')
+        batch_op.create_foreign_key('fk_teacher_courses_teacher_id_teachers', 'teachers', ['teacher_id'], ['teacher_id'])
+        batch_op.create_foreign_key('fk_teacher_courses_course_id_courses', 'courses', ['course_id'], ['course_id'])
+
+    with _batch_alter_table('students') as batch_op:
+        batch_op.drop_constraint(batch_op.f('fk_students_student_profile_id_student_profiles'), type_='foreignkey')
+        batch_op.create_foreign_key('fk_students_student_profile_id_student_profiles', 'student_profiles', ['student_profile_id'], ['student_profile_id'])
+
+    with _batch_alter_table('enrollments') as batch_op:
+        batch_op.drop_constraint(batch_op.f('fk_enrollments_course_id_courses'), type_='foreignkey')
+        batch_op.drop_constraint(batch_op.f('fk_enrollments_student_id_students'), type_='foreignkey')
+        batch_op.create_foreign_key('fk_enrollments_course_id_courses', 'courses', ['course_id'], ['course_id'])
+        batch_op.create_foreign_key('fk_enrollments_student_id_students', 'students', ['student_id'], ['student_id'])
@@ -1,21 +1,146 @@
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import MetaData
+from sqlalchemy import DDL, DateTime, MetaData, event, literal_column, make_url
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import declared_attr
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from sqlalchemy.sql.functions import FunctionElement
 from sqlalchemy.ext.associationproxy import association_proxy
 from sqlalchemy_serializer import SerializerMixin
 from datetime import date, timedelta
 from random import randint, choice
 from faker import Faker
+from instrumentation import TimedAsyncQueuePool, TimedQueuePool
+from replicas import RoutingSession
 
 metadata = MetaData(
     naming_convention={
         "fk": "fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s",
+        "ix": "ix_%(column_0_label)s",
     }
 )
 
-db = SQLAlchemy(metadata=metadata)
+# asyncio drivers used when SQLALCHEMY_ASYNC is set, and the pool classes that work with them
+ASYNC_DRIVERS = {'postgresql': 'postgresql+asyncpg', 'sqlite': 'sqlite+aiosqlite'}
+ASYNC_POOLS = {QueuePool: AsyncAdaptedQueuePool, TimedQueuePool: TimedAsyncQueuePool}
+
+
+def async_url(url):
+    """
+    The same database URL with the asyncio driver of its backend, e.g. postgresql:// -> postgresql+asyncpg://.
+    """
+    url = make_url(url)
+    if url.get_dialect().is_async:
+        return url
+    return url.set(drivername=ASYNC_DRIVERS[url.get_backend_name()])
+
+
+class AppSQLAlchemy(SQLAlchemy):
+    """
+    Flask-SQLAlchemy with an optional asyncio engine. With SQLALCHEMY_ASYNC = True the app's engine
+    is the sync facade (AsyncEngine.sync_engine) of an engine on asyncpg / aiosqlite: the same
+    Session and Core code runs unchanged, and when it is called inside a greenlet started by the
+    ASGI server (asgi.py) every database round trip yields to the event loop instead of blocking.
+
+    SQLite connections are opened with foreign keys enforced, so the ON DELETE rules of the models
+    apply there as they do on PostgreSQL.
+    """
+
+    def _make_engine(self, bind_key, options, app):
+        if app.config.get('SQLALCHEMY_ASYNC'):
+            engine = self._make_async_engine(options)
+        else:
+            engine = super()._make_engine(bind_key, options, app)
+        if engine.dialect.name == 'sqlite':
+            event.listen(engine, 'connect', _enforce_foreign_keys)
+        return engine
+
+    def _make_async_engine(self, options):
+        options = dict(options)
+        url = async_url(options.pop('url'))
+        if options.get('poolclass') in ASYNC_POOLS:
+            options['poolclass'] = ASYNC_POOLS[options['poolclass']]
+        elif url.get_backend_name() == 'sqlite' and url.database not in (None, '', ':memory:'):
+            # aiosqlite runs a thread per connection; pool them instead of the default NullPool
+            options.setdefault('poolclass', AsyncAdaptedQueuePool)
+        connect_args = dict(options.get('connect_args', {}))
+        if url.get_backend_name() == 'postgresql' and 'options' in connect_args:
+            # psycopg2 takes server settings as '-c name=value' options, asyncpg as a dict
+            settings = connect_args.pop('options').replace('-c', ' ').split()
+            connect_args['server_settings'] = dict(setting.split('=', 1) for setting in settings)
+            options['connect_args'] = connect_args
+        return create_async_engine(url, **options).sync_engine
+
+
+def _enforce_foreign_keys(dbapi_connection, connection_record):
+    # SQLite checks foreign keys, and applies their ON DELETE rules, only on connections that ask for it
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA foreign_keys=ON')
+    cursor.close()
+
+
+# Reads of GET requests may run on a read replica (replicas.py)
+db = AppSQLAlchemy(metadata=metadata, session_options={'class_': RoutingSession})
+
+# The trigram indexes used for name search need the pg_trgm extension on PostgreSQL
+event.listen(metadata, 'before_create', DDL('CREATE EXTENSION IF NOT EXISTS pg_trgm').execute_if(dialect='postgresql'))
+
+
+def trigram_index(name, column):
+    """
+    GIN trigram index that serves ilike('%...%') searches on PostgreSQL; not created on other databases.
+    """
+    return db.Index(
+        name, column, postgresql_using='gin', postgresql_ops={column: 'gin_trgm_ops'}
+    ).ddl_if(dialect='postgresql')
+
+
+class utcnow(FunctionElement):
+    """
+    Current UTC time as a naive timestamp, evaluated by the database (also usable as a server default).
+    """
+    type = DateTime()
+    inherit_cache = True
+
+
+@compiles(utcnow)
+def _utcnow(element, compiler, **kw):
+    # SQLite's CURRENT_TIMESTAMP is UTC already
+    return 'CURRENT_TIMESTAMP'
+
+
+@compiles(utcnow, 'postgresql')
+def _utcnow_postgresql(element, compiler, **kw):
+    return "(now() AT TIME ZONE 'utc')"
+
+
+class ChangeStampMixin:
+    """
+    Change stamp of an entity row: `version` is incremented and `updated_at` set by every UPDATE
+    of the row, whether it comes from the ORM or a Core update() statement. Changes to a row's
+    enrollments or course assignments bump it too (see the triggers below), so the stamp of a
+    student or teacher also covers its course lists. The resources use it for conditional GETs
+    (conditional.py).
+
+    `version` is also the mapper's version_id_col, counted by the database: every UPDATE and
+    DELETE the ORM flushes for a loaded row carries `AND version = <version it was loaded with>`,
+    and raises StaleDataError if the row changed since. PUT and DELETE check it against the
+    client's If-Match as well (conditional.update_row(), conditional.delete_row()).
+    """
+    version = db.Column(
+        db.Integer, nullable=False, default=1, server_default='1', onupdate=literal_column('version') + 1
+    )
+    updated_at = db.Column(
+        db.DateTime, nullable=False, default=utcnow(), server_default=utcnow(), onupdate=utcnow()
+    )
+
+    @declared_attr.directive
+    def __mapper_args__(cls):
+        # version_id_generator=False: the new version is the onupdate expression, fetched back
+        return {'version_id_col': cls.__table__.c.version, 'version_id_generator': False}
 
 #--------------------------------------------
-class StudentProfile(db.Model, SerializerMixin):
+class StudentProfile(db.Model, SerializerMixin, ChangeStampMixin):
     __tablename__ = 'student_profiles'
     student_profile_id = db.Column(db.Integer, primary_key=True)
     bio = db.Column(db.Text, nullable=True)
@@ -28,17 +153,28 @@ class StudentProfile(db.Model, SerializerMixin):
         return f'<StudentProfile {self.student_profile_id}>'
 
 
-class Student(db.Model, SerializerMixin):
+class Student(db.Model, SerializerMixin, ChangeStampMixin):
     __tablename__ = 'students'
+    __table_args__ = (
+        trigram_index('ix_students_name_trgm', 'name'),
+    )
     student_id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     date_of_birth = db.Column(db.Date, nullable=False)
-    email = db.Column(db.String(100), nullable=False)
-    reg_no = db.Column(db.String(100), nullable=False)
-    student_profile_id = db.Column(db.Integer, db.ForeignKey('student_profiles.student_profile_id'))
+    email = db.Column(db.String(100), nullable=False, unique=True, index=True)
+    reg_no = db.Column(db.String(100), nullable=False, unique=True, index=True)
+    # Checked at commit, so a profile can be deleted before its students are unlinked (and their stamp bumped)
+    student_profile_id = db.Column(
+        db.Integer,
+        db.ForeignKey('student_profiles.student_profile_id', deferrable=True, initially='DEFERRED'),
+        index=True,
+    )
+    # Number of enrollments, maintained by the enrollment triggers below
+    course_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
 
     student_profile = db.relationship('StudentProfile', back_populates='student')
-    enrollments = db.relationship('Enrollment', back_populates='student')
+    # The database deletes a student's enrollments with it (ON DELETE CASCADE): the ORM need not load them
+    enrollments = db.relationship('Enrollment', back_populates='student', passive_deletes=True)
     courses = association_proxy('enrollments', 'course')
 
     serialize_rules = ('-enrollments', '-courses')  # Exclude enrollments and courses relationships during serialization
@@ -49,7 +185,7 @@ class Student(db.Model, SerializerMixin):
                 f'reg_no={self.reg_no}, student_profile_id={self.student_profile_id})>')
 
 
-class TeacherProfile(db.Model, SerializerMixin):
+class TeacherProfile(db.Model, SerializerMixin, ChangeStampMixin):
     __tablename__ = 'teacher_profiles'
     teacher_profile_id = db.Column(db.Integer, primary_key=True)
     bio = db.Column(db.Text)
@@ -64,15 +200,23 @@ class TeacherProfile(db.Model, SerializerMixin):
         return f'<TeacherProfile {self.teacher_profile_id}>'
 
 
-class Teacher(db.Model, SerializerMixin):
+class Teacher(db.Model, SerializerMixin, ChangeStampMixin):
     __tablename__ = 'teachers'
+    __table_args__ = (
+        trigram_index('ix_teachers_name_trgm', 'name'),
+    )
     teacher_id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100))
-    email = db.Column(db.String(100))
-    teacher_profile_id = db.Column(db.Integer, db.ForeignKey('teacher_profiles.teacher_profile_id'))
+    email = db.Column(db.String(100), unique=True, index=True)
+    # Checked at commit, so a profile can be deleted before its teachers are unlinked (and their stamp bumped)
+    teacher_profile_id = db.Column(
+        db.Integer,
+        db.ForeignKey('teacher_profiles.teacher_profile_id', deferrable=True, initially='DEFERRED'),
+        index=True,
+    )
 
     teacher_profile = db.relationship('TeacherProfile', back_populates='teacher')
-    teacher_courses = db.relationship('TeacherCourse', back_populates='teacher')
+    teacher_courses = db.relationship('TeacherCourse', back_populates='teacher', passive_deletes=True)
     courses = association_proxy('teacher_courses', 'course')
 
     serialize_rules = ('-teacher_courses', '-courses')  # Exclude teacher_courses and courses relationships during serialization
@@ -81,16 +225,25 @@ class Teacher(db.Model, SerializerMixin):
         return f'<Teacher {self.name}>'
 
 
-class Course(db.Model, SerializerMixin):
+class Course(db.Model, SerializerMixin, ChangeStampMixin):
     __tablename__ = 'courses'
+    __table_args__ = (
+        trigram_index('ix_courses_course_name_trgm', 'course_name'),
+    )
     course_id = db.Column(db.Integer, primary_key=True)
     course_name = db.Column(db.String(100), nullable=False)
     description = db.Column(db.Text, nullable=True)
+    # Maximum number of students, if limited
+    capacity = db.Column(db.Integer, nullable=True)
+    # Number of enrollments, maintained by the enrollment triggers below
+    student_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
 
-    enrollments = db.relationship('Enrollment', back_populates='course')
-    teacher_courses = db.relationship('TeacherCourse', back_populates='course')
+    enrollments = db.relationship('Enrollment', back_populates='course', passive_deletes=True)
+    teacher_courses = db.relationship('TeacherCourse', back_populates='course', passive_deletes=True)
+    students = association_proxy('enrollments', 'student')
+    teachers = association_proxy('teacher_courses', 'teacher')
 
-    serialize_rules = ('-enrollments', '-teacher_courses')  # Exclude enrollments and teacher_courses relationships during serialization
+    serialize_rules = ('-enrollments', '-teacher_courses', '-students', '-teachers')  # Exclude the relationships during serialization
 
     def __repr__(self):
         return f'<Course {self.course_name}>'
@@ -98,9 +251,15 @@ class Course(db.Model, SerializerMixin):
 
 class Enrollment(db.Model, SerializerMixin):
     __tablename__ = 'enrollments'
+    # A student can only be enrolled once per course; the unique index also serves student_id lookups
+    __table_args__ = (
+        db.Index('uq_enrollments_student_id_course_id', 'student_id', 'course_id', unique=True),
+    )
     enrollment_id = db.Column(db.Integer, primary_key=True)
-    student_id = db.Column(db.Integer, db.ForeignKey('students.student_id'))
-    course_id = db.Column(db.Integer, db.ForeignKey('courses.course_id'))
+    student_id = db.Column(db.Integer, db.ForeignKey('students.student_id', ondelete='CASCADE'))
+    course_id = db.Column(db.Integer, db.ForeignKey('courses.course_id', ondelete='CASCADE'), index=True)
+    # When the enrollment was made; incremental exports (exports.py) select on it
+    enrolled_at = db.Column(db.DateTime, nullable=False, default=utcnow(), server_default=utcnow())
 
     student = db.relationship('Student', back_populates='enrollments')
     course = db.relationship('Course', back_populates='enrollments')
@@ -111,11 +270,105 @@ class Enrollment(db.Model, SerializerMixin):
         return f'<Enrollment Student {self.student_id} Course {self.course_id}>'
 
 
+# Enrollment counters: students.course_count and courses.student_count are kept in step with the
+# enrollments table by triggers, so every write path (ORM, bulk statements, COPY) updates them in
+# the same transaction. PostgreSQL uses statement-level triggers with transition tables, so a bulk
+# statement issues one grouped UPDATE per table instead of one per row; SQLite has row triggers only.
+# The same UPDATEs bump the change stamp (version, updated_at) of the student and course rows.
+# `flask counters check` / `flask counters rebuild` (counters.py) verify and repair them.
+ENROLLMENT_COUNTER_DDL = {
+    'postgresql': [
+        """
+        CREATE OR REPLACE FUNCTION enrollments_maintain_counts() RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                UPDATE courses SET student_count = courses.student_count + delta.n,
+                    version = courses.version + 1, updated_at = now() AT TIME ZONE 'utc'
+                FROM (SELECT course_id, count(*) AS n FROM new_rows GROUP BY course_id) AS delta
+                WHERE courses.course_id = delta.course_id;
+                UPDATE students SET course_count = students.course_count + delta.n,
+                    version = students.version + 1, updated_at = now() AT TIME ZONE 'utc'
+                FROM (SELECT student_id, count(*) AS n FROM new_rows GROUP BY student_id) AS delta
+                WHERE students.student_id = delta.student_id;
+            END IF;
+            IF TG_OP IN ('DELETE', 'UPDATE') THEN
+                UPDATE courses SET student_count = courses.student_count - delta.n,
+                    version = courses.version + 1, updated_at = now() AT TIME ZONE 'utc'
+                FROM (SELECT course_id, count(*) AS n FROM old_rows GROUP BY course_id) AS delta
+                WHERE courses.course_id = delta.course_id;
+                UPDATE students SET course_count = students.course_count - delta.n,
+                    version = students.version + 1, updated_at = now() AT TIME ZONE 'utc'
+                FROM (SELECT student_id, count(*) AS n FROM old_rows GROUP BY student_id) AS delta
+                WHERE students.student_id = delta.student_id;
+            END IF;
+            RETURN NULL;
+        END $$
+        """,
+        """
+        CREATE TRIGGER trg_enrollments_counts_insert AFTER INSERT ON enrollments
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION enrollments_maintain_counts()
+        """,
+        """
+        CREATE TRIGGER trg_enrollments_counts_update AFTER UPDATE ON enrollments
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION enrollments_maintain_counts()
+        """,
+        """
+        CREATE TRIGGER trg_enrollments_counts_delete AFTER DELETE ON enrollments
+        REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION enrollments_maintain_counts()
+        """,
+    ],
+    'sqlite': [
+        """
+        CREATE TRIGGER trg_enrollments_counts_insert AFTER INSERT ON enrollments
+        BEGIN
+            UPDATE courses SET student_count = student_count + 1, version = version + 1,
+                updated_at = CURRENT_TIMESTAMP WHERE course_id = NEW.course_id;
+            UPDATE students SET course_count = course_count + 1, version = version + 1,
+                updated_at = CURRENT_TIMESTAMP WHERE student_id = NEW.student_id;
+        END
+        """,
+        """
+        CREATE TRIGGER trg_enrollments_counts_update AFTER UPDATE OF student_id, course_id ON enrollments
+        BEGIN
+            UPDATE courses SET student_count = student_count - 1, version = version + 1,
+                updated_at = CURRENT_TIMESTAMP WHERE course_id = OLD.course_id;
+            UPDATE students SET course_count = course_count - 1, version = version + 1,
+                updated_at = CURRENT_TIMESTAMP WHERE student_id = OLD.student_id;
+            UPDATE courses SET student_count = student_count + 1, version = version + 1,
+                updated_at = CURRENT_TIMESTAMP WHERE course_id = NEW.course_id;
+            UPDATE students SET course_count = course_count + 1, version = version + 1,
+                updated_at = CURRENT_TIMESTAMP WHERE student_id = NEW.student_id;
+        END
+        """,
+        """
+        CREATE TRIGGER trg_enrollments_counts_delete AFTER DELETE ON enrollments
+        BEGIN
+            UPDATE courses SET student_count = student_count - 1, version = version + 1,
+                updated_at = CURRENT_TIMESTAMP WHERE course_id = OLD.course_id;
+            UPDATE students SET course_count = course_count - 1, version = version + 1,
+                updated_at = CURRENT_TIMESTAMP WHERE student_id = OLD.student_id;
+        END
+        """,
+    ],
+}
+
+for _dialect, _statements in ENROLLMENT_COUNTER_DDL.items():
+    for _statement in _statements:
+        event.listen(Enrollment.__table__, 'after_create', DDL(_statement).execute_if(dialect=_dialect))
+
+
 class TeacherCourse(db.Model, SerializerMixin):
     __tablename__ = 'teacher_courses'
+    # A course can only be assigned once per teacher; the unique index also serves teacher_id lookups
+    __table_args__ = (
+        db.Index('uq_teacher_courses_teacher_id_course_id', 'teacher_id', 'course_id', unique=True),
+    )
     teacher_course_id = db.Column(db.Integer, primary_key=True)
-    teacher_id = db.Column(db.Integer, db.ForeignKey('teachers.teacher_id'))
-    course_id = db.Column(db.Integer, db.ForeignKey('courses.course_id'))
+    teacher_id = db.Column(db.Integer, db.ForeignKey('teachers.teacher_id', ondelete='CASCADE'))
+    course_id = db.Column(db.Integer, db.ForeignKey('courses.course_id', ondelete='CASCADE'), index=True)
 
     teacher = db.relationship('Teacher', back_populates='teacher_courses')
     course = db.relationship('Course', back_populates='teacher_courses')
@@ -124,3 +377,393 @@ class TeacherCourse(db.Model, SerializerMixin):
 
     def __repr__(self):
         return f'<TeacherCourse Teacher {self.teacher_id} Course {self.course_id}>'
+
+
+# Course assignments bump the change stamp of the teacher, which covers /teachers/<id>/courses
+TEACHER_COURSE_STAMP_DDL = {
+    'postgresql': [
+        """
+        CREATE OR REPLACE FUNCTION teacher_courses_touch_teachers() RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                UPDATE teachers SET version = teachers.version + 1, updated_at = now() AT TIME ZONE 'utc'
+                WHERE teachers.teacher_id IN (SELECT teacher_id FROM new_rows);
+            END IF;
+            IF TG_OP IN ('DELETE', 'UPDATE') THEN
+                UPDATE teachers SET version = teachers.version + 1, updated_at = now() AT TIME ZONE 'utc'
+                WHERE teachers.teacher_id IN (SELECT teacher_id FROM old_rows);
+            END IF;
+            RETURN NULL;
+        END $$
+        """,
+        """
+        CREATE TRIGGER trg_teacher_courses_touch_insert AFTER INSERT ON teacher_courses
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION teacher_courses_touch_teachers()
+        """,
+        """
+        CREATE TRIGGER trg_teacher_courses_touch_update AFTER UPDATE ON teacher_courses
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION teacher_courses_touch_teachers()
+        """,
+        """
+        CREATE TRIGGER trg_teacher_courses_touch_delete AFTER DELETE ON teacher_courses
+        REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION teacher_courses_touch_teachers()
+        """,
+    ],
+    'sqlite': [
+        """
+        CREATE TRIGGER trg_teacher_courses_touch_insert AFTER INSERT ON teacher_courses
+        BEGIN
+            UPDATE teachers SET version = version + 1, updated_at = CURRENT_TIMESTAMP
+            WHERE teacher_id = NEW.teacher_id;
+        END
+        """,
+        """
+        CREATE TRIGGER trg_teacher_courses_touch_update AFTER UPDATE OF teacher_id, course_id ON teacher_courses
+        BEGIN
+            UPDATE teachers SET version = version + 1, updated_at = CURRENT_TIMESTAMP
+            WHERE teacher_id IN (OLD.teacher_id, NEW.teacher_id);
+        END
+        """,
+        """
+        CREATE TRIGGER trg_teacher_courses_touch_delete AFTER DELETE ON teacher_courses
+        BEGIN
+            UPDATE teachers SET version = version + 1, updated_at = CURRENT_TIMESTAMP
+            WHERE teacher_id = OLD.teacher_id;
+        END
+        """,
+    ],
+}
+
+for _dialect, _statements in TEACHER_COURSE_STAMP_DDL.items():
+    for _statement in _statements:
+        event.listen(TeacherCourse.__table__, 'after_create', DDL(_statement).execute_if(dialect=_dialect))
+
+
+# Reporting graph: the teacher -> course -> student paths and the course co-enrollments, kept
+# precomputed so the reports (reports.py) read a few index entries instead of joining
+# teacher_courses and enrollments on every request. Derived data only: no foreign keys, and
+# `flask reports rebuild` recomputes both tables from scratch.
+class ReportTeacherStudent(db.Model):
+    __tablename__ = 'report_teacher_students'
+    __table_args__ = (
+        db.Index('ix_report_teacher_students_student_id', 'student_id'),
+    )
+    teacher_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    student_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    # Number of the teacher's courses the student is enrolled in
+    shared_courses = db.Column(db.Integer, nullable=False)
+
+    def __repr__(self):
+        return f'<ReportTeacherStudent Teacher {self.teacher_id} Student {self.student_id}>'
+
+
+class ReportCoursePair(db.Model):
+    __tablename__ = 'report_course_pairs'
+    # Stored in both directions, so the co-enrollments of a course are one primary key range
+    course_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    other_course_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    # Number of students enrolled in both courses
+    shared_students = db.Column(db.Integer, nullable=False)
+
+    def __repr__(self):
+        return f'<ReportCoursePair Course {self.course_id} Course {self.other_course_id}>'
+
+
+# The reporting graph is maintained incrementally by triggers on enrollments and teacher_courses,
+# in the transaction of the write. PostgreSQL uses statement-level triggers: the changed rows of
+# the statement (old ones counted -1, new ones +1) are turned into one grouped upsert per report
+# table, then the rows that dropped to zero are deleted. SQLite applies each row change in turn.
+# Under READ COMMITTED, enrolling into a course while another transaction assigns it to a teacher
+# can miss that path: `flask reports check` / `flask reports rebuild` (reports.py) find and repair it.
+ENROLLMENT_GRAPH_DDL = {
+    'postgresql': [
+        """
+        CREATE OR REPLACE FUNCTION enrollments_maintain_graph() RETURNS trigger LANGUAGE plpgsql AS $$
+        DECLARE
+            removed_students integer[];
+            removed_courses integer[];
+            added_students integer[];
+            added_courses integer[];
+        BEGIN
+            IF TG_OP IN ('DELETE', 'UPDATE') THEN
+                SELECT array_agg(student_id), array_agg(course_id) INTO removed_students, removed_courses
+                FROM old_rows;
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                SELECT array_agg(student_id), array_agg(course_id) INTO added_students, added_courses
+                FROM new_rows;
+            END IF;
+
+            WITH changes AS (
+                SELECT student_id, course_id, -1 AS sign
+                FROM unnest(removed_students, removed_courses) AS removed(student_id, course_id)
+                UNION ALL
+                SELECT student_id, course_id, 1
+                FROM unnest(added_students, added_courses) AS added(student_id, course_id)
+            )
+            INSERT INTO report_teacher_students AS r (teacher_id, student_id, shared_courses)
+            SELECT tc.teacher_id, c.student_id, sum(c.sign)
+            FROM changes AS c JOIN teacher_courses AS tc ON tc.course_id = c.course_id
+            WHERE tc.teacher_id IS NOT NULL AND c.student_id IS NOT NULL
+            GROUP BY tc.teacher_id, c.student_id HAVING sum(c.sign) <> 0
+            ON CONFLICT (teacher_id, student_id)
+            DO UPDATE SET shared_courses = r.shared_courses + EXCLUDED.shared_courses;
+
+            -- Each changed enrollment pairs with the student's untouched courses (kept) and with the
+            -- other enrollments of the student changed the same way
+            WITH changes AS (
+                SELECT student_id, course_id, -1 AS sign
+                FROM unnest(removed_students, removed_courses) AS removed(student_id, course_id)
+                UNION ALL
+                SELECT student_id, course_id, 1
+                FROM unnest(added_students, added_courses) AS added(student_id, course_id)
+            ), kept AS (
+                SELECT student_id, course_id FROM enrollments
+                WHERE student_id IN (SELECT student_id FROM changes)
+                EXCEPT ALL
+                SELECT student_id, course_id FROM changes WHERE sign = 1
+            ), delta AS (
+                SELECT c.course_id, k.course_id AS other_course_id, c.sign
+                FROM changes AS c JOIN kept AS k ON k.student_id = c.student_id AND k.course_id <> c.course_id
+                UNION ALL
+                SELECT k.course_id, c.course_id, c.sign
+                FROM changes AS c JOIN kept AS k ON k.student_id = c.student_id AND k.course_id <> c.course_id
+                UNION ALL
+                SELECT c.course_id, d.course_id, c.sign
+                FROM changes AS c JOIN changes AS d
+                    ON d.student_id = c.student_id AND d.sign = c.sign AND d.course_id <> c.course_id
+            )
+            INSERT INTO report_course_pairs AS p (course_id, other_course_id, shared_students)
+            SELECT course_id, other_course_id, sum(sign) FROM delta
+            GROUP BY course_id, other_course_id HAVING sum(sign) <> 0
+            ON CONFLICT (course_id, other_course_id)
+            DO UPDATE SET shared_students = p.shared_students + EXCLUDED.shared_students;
+
+            IF TG_OP IN ('DELETE', 'UPDATE') THEN
+                DELETE FROM report_teacher_students
+                WHERE shared_courses <= 0 AND student_id = ANY(removed_students);
+                DELETE FROM report_course_pairs
+                WHERE shared_students <= 0
+                    AND (course_id = ANY(removed_courses) OR other_course_id = ANY(removed_courses));
+            END IF;
+            RETURN NULL;
+        END $$
+        """,
+        """
+        CREATE TRIGGER trg_enrollments_graph_insert AFTER INSERT ON enrollments
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION enrollments_maintain_graph()
+        """,
+        """
+        CREATE TRIGGER trg_enrollments_graph_update AFTER UPDATE ON enrollments
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION enrollments_maintain_graph()
+        """,
+        """
+        CREATE TRIGGER trg_enrollments_graph_delete AFTER DELETE ON enrollments
+        REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION enrollments_maintain_graph()
+        """,
+    ],
+    'sqlite': [
+        """
+        CREATE TRIGGER trg_enrollments_graph_insert AFTER INSERT ON enrollments
+        BEGIN
+            INSERT INTO report_teacher_students (teacher_id, student_id, shared_courses)
+            SELECT teacher_id, NEW.student_id, 1 FROM teacher_courses
+            WHERE course_id = NEW.course_id AND teacher_id IS NOT NULL AND NEW.student_id IS NOT NULL
+            ON CONFLICT (teacher_id, student_id) DO UPDATE SET shared_courses = shared_courses + 1;
+            INSERT INTO report_course_pairs (course_id, other_course_id, shared_students)
+            SELECT NEW.course_id, course_id, 1 FROM enrollments
+            WHERE student_id = NEW.student_id AND course_id <> NEW.course_id
+            ON CONFLICT (course_id, other_course_id) DO UPDATE SET shared_students = shared_students + 1;
+            INSERT INTO report_course_pairs (course_id, other_course_id, shared_students)
+            SELECT course_id, NEW.course_id, 1 FROM enrollments
+            WHERE student_id = NEW.student_id AND course_id <> NEW.course_id
+            ON CONFLICT (course_id, other_course_id) DO UPDATE SET shared_students = shared_students + 1;
+        END
+        """,
+        """
+        CREATE TRIGGER trg_enrollments_graph_update AFTER UPDATE OF student_id, course_id ON enrollments
+        BEGIN
+            UPDATE report_teacher_students SET shared_courses = shared_courses - 1
+            WHERE student_id = OLD.student_id
+                AND teacher_id IN (SELECT teacher_id FROM teacher_courses WHERE course_id = OLD.course_id);
+            UPDATE report_course_pairs SET shared_students = shared_students - 1
+            WHERE (course_id = OLD.course_id AND other_course_id IN (
+                    SELECT course_id FROM enrollments
+                    WHERE student_id = OLD.student_id AND enrollment_id <> NEW.enrollment_id))
+                OR (other_course_id = OLD.course_id AND course_id IN (
+                    SELECT course_id FROM enrollments
+                    WHERE student_id = OLD.student_id AND enrollment_id <> NEW.enrollment_id));
+            DELETE FROM report_teacher_students WHERE shared_courses <= 0 AND student_id = OLD.student_id;
+            DELETE FROM report_course_pairs
+            WHERE shared_students <= 0 AND (course_id = OLD.course_id OR other_course_id = OLD.course_id);
+
+            INSERT INTO report_teacher_students (teacher_id, student_id, shared_courses)
+            SELECT teacher_id, NEW.student_id, 1 FROM teacher_courses
+            WHERE course_id = NEW.course_id AND teacher_id IS NOT NULL AND NEW.student_id IS NOT NULL
+            ON CONFLICT (teacher_id, student_id) DO UPDATE SET shared_courses = shared_courses + 1;
+            INSERT INTO report_course_pairs (course_id, other_course_id, shared_students)
+            SELECT NEW.course_id, course_id, 1 FROM enrollments
+            WHERE student_id = NEW.student_id AND course_id <> NEW.course_id
+            ON CONFLICT (course_id, other_course_id) DO UPDATE SET shared_students = shared_students + 1;
+            INSERT INTO report_course_pairs (course_id, other_course_id, shared_students)
+            SELECT course_id, NEW.course_id, 1 FROM enrollments
+            WHERE student_id = NEW.student_id AND course_id <> NEW.course_id
+            ON CONFLICT (course_id, other_course_id) DO UPDATE SET shared_students = shared_students + 1;
+        END
+        """,
+        """
+        CREATE TRIGGER trg_enrollments_graph_delete AFTER DELETE ON enrollments
+        BEGIN
+            UPDATE report_teacher_students SET shared_courses = shared_courses - 1
+            WHERE student_id = OLD.student_id
+                AND teacher_id IN (SELECT teacher_id FROM teacher_courses WHERE course_id = OLD.course_id);
+            UPDATE report_course_pairs SET shared_students = shared_students - 1
+            WHERE (course_id = OLD.course_id AND other_course_id IN (
+                    SELECT course_id FROM enrollments WHERE student_id = OLD.student_id))
+                OR (other_course_id = OLD.course_id AND course_id IN (
+                    SELECT course_id FROM enrollments WHERE student_id = OLD.student_id));
+            DELETE FROM report_teacher_students WHERE shared_courses <= 0 AND student_id = OLD.student_id;
+            DELETE FROM report_course_pairs
+            WHERE shared_students <= 0 AND (course_id = OLD.course_id OR other_course_id = OLD.course_id);
+        END
+        """,
+    ],
+}
+
+# Assigning a course to a teacher (or withdrawing it) adds (removes) a path to each of its students
+TEACHER_COURSE_GRAPH_DDL = {
+    'postgresql': [
+        """
+        CREATE OR REPLACE FUNCTION teacher_courses_maintain_graph() RETURNS trigger LANGUAGE plpgsql AS $$
+        DECLARE
+            removed_teachers integer[];
+            removed_courses integer[];
+            added_teachers integer[];
+            added_courses integer[];
+        BEGIN
+            IF TG_OP IN ('DELETE', 'UPDATE') THEN
+                SELECT array_agg(teacher_id), array_agg(course_id) INTO removed_teachers, removed_courses
+                FROM old_rows;
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                SELECT array_agg(teacher_id), array_agg(course_id) INTO added_teachers, added_courses
+                FROM new_rows;
+            END IF;
+
+            WITH changes AS (
+                SELECT teacher_id, course_id, -1 AS sign
+                FROM unnest(removed_teachers, removed_courses) AS removed(teacher_id, course_id)
+                UNION ALL
+                SELECT teacher_id, course_id, 1
+                FROM unnest(added_teachers, added_courses) AS added(teacher_id, course_id)
+            )
+            INSERT INTO report_teacher_students AS r (teacher_id, student_id, shared_courses)
+            SELECT c.teacher_id, e.student_id, sum(c.sign)
+            FROM changes AS c JOIN enrollments AS e ON e.course_id = c.course_id
+            WHERE c.teacher_id IS NOT NULL AND e.student_id IS NOT NULL
+            GROUP BY c.teacher_id, e.student_id HAVING sum(c.sign) <> 0
+            ON CONFLICT (teacher_id, student_id)
+            DO UPDATE SET shared_courses = r.shared_courses + EXCLUDED.shared_courses;
+
+            IF TG_OP IN ('DELETE', 'UPDATE') THEN
+                DELETE FROM report_teacher_students
+                WHERE shared_courses <= 0 AND teacher_id = ANY(removed_teachers);
+            END IF;
+            RETURN NULL;
+        END $$
+        """,
+        """
+        CREATE TRIGGER trg_teacher_courses_graph_insert AFTER INSERT ON teacher_courses
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION teacher_courses_maintain_graph()
+        """,
+        """
+        CREATE TRIGGER trg_teacher_courses_graph_update AFTER UPDATE ON teacher_courses
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION teacher_courses_maintain_graph()
+        """,
+        """
+        CREATE TRIGGER trg_teacher_courses_graph_delete AFTER DELETE ON teacher_courses
+        REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION teacher_courses_maintain_graph()
+        """,
+    ],
+    'sqlite': [
+        """
+        CREATE TRIGGER trg_teacher_courses_graph_insert AFTER INSERT ON teacher_courses
+        BEGIN
+            INSERT INTO report_teacher_students (teacher_id, student_id, shared_courses)
+            SELECT NEW.teacher_id, student_id, 1 FROM enrollments
+            WHERE course_id = NEW.course_id AND student_id IS NOT NULL AND NEW.teacher_id IS NOT NULL
+            ON CONFLICT (teacher_id, student_id) DO UPDATE SET shared_courses = shared_courses + 1;
+        END
+        """,
+        """
+        CREATE TRIGGER trg_teacher_courses_graph_update AFTER UPDATE OF teacher_id, course_id ON teacher_courses
+        BEGIN
+            UPDATE report_teacher_students SET shared_courses = shared_courses - 1
+            WHERE teacher_id = OLD.teacher_id
+                AND student_id IN (SELECT student_id FROM enrollments WHERE course_id = OLD.course_id);
+            DELETE FROM report_teacher_students WHERE shared_courses <= 0 AND teacher_id = OLD.teacher_id;
+            INSERT INTO report_teacher_students (teacher_id, student_id, shared_courses)
+            SELECT NEW.teacher_id, student_id, 1 FROM enrollments
+            WHERE course_id = NEW.course_id AND student_id IS NOT NULL AND NEW.teacher_id IS NOT NULL
+            ON CONFLICT (teacher_id, student_id) DO UPDATE SET shared_courses = shared_courses + 1;
+        END
+        """,
+        """
+        CREATE TRIGGER trg_teacher_courses_graph_delete AFTER DELETE ON teacher_courses
+        BEGIN
+            UPDATE report_teacher_students SET shared_courses = shared_courses - 1
+            WHERE teacher_id = OLD.teacher_id
+                AND student_id IN (SELECT student_id FROM enrollments WHERE course_id = OLD.course_id);
+            DELETE FROM report_teacher_students WHERE shared_courses <= 0 AND teacher_id = OLD.teacher_id;
+        END
+        """,
+    ],
+}
+
+# Table by table, like the counters: PostgreSQL and SQLite resolve the trigger bodies when they run
+for _table, _ddl in (('enrollments', ENROLLMENT_GRAPH_DDL), ('teacher_courses', TEACHER_COURSE_GRAPH_DDL)):
+    for _dialect, _statements in _ddl.items():
+        for _statement in _statements:
+            event.listen(metadata.tables[_table], 'after_create', DDL(_statement).execute_if(dialect=_dialect))
+
+
+# Staging tables of the CSV imports (imports.py): validated rows are loaded here in parallel by
+# the import workers, then merged into students and enrollments in one transaction and deleted.
+# Unlogged on PostgreSQL: they only ever hold rows in transit, so they skip the WAL.
+class ImportStudent(db.Model):
+    __tablename__ = 'import_students'
+    import_id = db.Column(db.String(32), primary_key=True)
+    # Line of the row in the imported file
+    line = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    name = db.Column(db.String(100), nullable=False)
+    date_of_birth = db.Column(db.Date, nullable=False)
+    email = db.Column(db.String(100), nullable=False)
+    reg_no = db.Column(db.String(100), nullable=False)
+
+    def __repr__(self):
+        return f'<ImportStudent {self.import_id} line {self.line}>'
+
+
+class ImportEnrollment(db.Model):
+    __tablename__ = 'import_enrollments'
+    import_id = db.Column(db.String(32), primary_key=True)
+    line = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    course_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    # The student is referenced by reg_no, so the students of the same import can be enrolled
+    reg_no = db.Column(db.String(100), nullable=False)
+
+    def __repr__(self):
+        return f'<ImportEnrollment {self.import_id} line {self.line}>'
+
+
+for _table in (ImportStudent.__table__, ImportEnrollment.__table__):
+    event.listen(_table, 'after_create', DDL('ALTER TABLE %(table)s SET UNLOGGED').execute_if(dialect='postgresql'))
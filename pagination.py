@@ -0,0 +1,125 @@
+from urllib.parse import urlencode
+from flask import Response, request, stream_with_context
+from flask_restful import abort
+from db_helpers import id_in
+from models import db
+from representations import json_dumps
+
+# Page size used when the client does not send ?limit=
+DEFAULT_LIMIT = 100
+# Upper bound on ?limit= so a single page can never pull a whole table
+MAX_LIMIT = 1000
+# Rows fetched per round trip from the server-side cursor when streaming
+STREAM_BATCH_SIZE = 1000
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+
+def get_limit():
+    """
+    Reads ?limit= from the request, falling back to DEFAULT_LIMIT and capping at MAX_LIMIT.
+    """
+    limit = request.args.get('limit', DEFAULT_LIMIT, type=int)
+    if limit < 1:
+        return DEFAULT_LIMIT
+    return min(limit, MAX_LIMIT)
+
+
+def wants_ndjson():
+    """
+    True when the client opted into streaming, either with ?format=ndjson or an NDJSON Accept header.
+    """
+    if request.args.get('format') == 'ndjson':
+        return True
+    best = request.accept_mimetypes.best_match([NDJSON_MIMETYPE, 'application/json'])
+    return best == NDJSON_MIMETYPE and request.accept_mimetypes[NDJSON_MIMETYPE] > 0
+
+
+def parse_ids():
+    """
+    Reads the ?ids=1,2,3 multi-get list, without duplicates and in the requested order, or None
+    if it is absent. Aborts with 400 on a non-integer id or more than MAX_LIMIT ids.
+    """
+    raw = request.args.get('ids')
+    if raw is None:
+        return None
+    try:
+        ids = [int(value) for value in raw.split(',') if value.strip()]
+    except ValueError:
+        abort(400, message='ids must be a comma-separated list of integers')
+    ids = list(dict.fromkeys(ids))
+    if len(ids) > MAX_LIMIT:
+        abort(400, message=f'At most {MAX_LIMIT} ids per request')
+    return ids
+
+
+def multi_get(stmt, pk_column, ids, collection, serialize):
+    """
+    Fetches the rows of the SELECT `stmt` whose `pk_column` is in `ids` with one statement.
+    Returns them in the order of `ids`, with the ids that matched no row under 'missing'.
+    """
+    rows = db.session.execute(stmt.where(id_in(pk_column, ids))).all() if ids else []
+    by_id = {getattr(row, pk_column.key): row for row in rows}
+    return {
+        collection: [serialize(by_id[pk]) for pk in ids if pk in by_id],
+        'missing': [pk for pk in ids if pk not in by_id],
+    }
+
+
+def next_link(**params):
+    """
+    Builds the URL of the next page from `params` (e.g. after=, offset=), keeping every other
+    query argument of the current request.
+    """
+    args = request.args.to_dict()
+    args.update(params)
+    args['limit'] = get_limit()
+    return f'{request.path}?{urlencode(args)}'
+
+
+def keyset_page(stmt, pk_column, collection, serialize):
+    """
+    Returns one page of the SELECT `stmt` ordered by `pk_column`, starting after the ?after= cursor.
+
+    The page is fetched with `WHERE pk > :after ORDER BY pk LIMIT :limit + 1`, so the cost of
+    a page does not grow with its position in the table. The extra row only tells us whether
+    a next page exists.
+    """
+    limit = get_limit()
+    after = request.args.get('after', type=int)
+    if after is not None:
+        stmt = stmt.where(pk_column > after)
+
+    rows = db.session.execute(stmt.order_by(pk_column).limit(limit + 1)).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    body = {collection: [serialize(row) for row in rows]}
+    if has_more:
+        cursor = getattr(rows[-1], pk_column.key)
+        body['next_cursor'] = cursor
+        body['next'] = next_link(after=cursor)
+    else:
+        body['next_cursor'] = None
+        body['next'] = None
+    return body
+
+
+def stream_ndjson(stmt, pk_column, serialize):
+    """
+    Streams every row of the SELECT `stmt` as newline-delimited JSON.
+
+    Rows are pulled from a server-side cursor in batches of STREAM_BATCH_SIZE (`yield_per`),
+    so memory stays flat whatever the size of the table. ?after= is honoured so an
+    interrupted download can resume from the last id it received.
+    """
+    after = request.args.get('after', type=int)
+    if after is not None:
+        stmt = stmt.where(pk_column > after)
+    stmt = stmt.order_by(pk_column).execution_options(yield_per=STREAM_BATCH_SIZE)
+
+    def generate():
+        for row in db.session.execute(stmt):
+            yield json_dumps(serialize(row)) + b'\n'
+
+    return Response(stream_with_context(generate()), mimetype=NDJSON_MIMETYPE)
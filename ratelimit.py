@@ -0,0 +1,306 @@
+"""
+Rate limiting and admission control, checked before any resource runs.
+
+Every request costs tokens according to what it makes the database do: 1 for a lookup by id,
+RATE_LIMIT_SCAN_COST for a page of a list or a name search, RATE_LIMIT_STREAM_COST for a whole
+list streamed as NDJSON, and the ENDPOINT_COSTS below (or RATE_LIMIT_COSTS) for the bulk,
+export, import and aggregate endpoints. POST /batch costs the sum of its sub-requests, which
+are dispatched without going through the hooks below.
+
+- Rate limit: each client (by remote address) has a token bucket refilled at RATE_LIMIT_RATE
+  tokens per second up to RATE_LIMIT_BURST; the endpoints in RATE_LIMIT_ENDPOINTS also have one
+  bucket shared by all clients. A request that finds too few tokens in any of its buckets is
+  refused with 429 and a Retry-After of the seconds until it would fit, and takes nothing.
+- Admission control: a worker runs requests worth at most ADMISSION_MAX_COST tokens at once, and
+  requests costing more than 1 only use ADMISSION_HEAVY_SHARE of that, so scans and exports
+  cannot take the capacity lookups and enrollments need. A request that does not fit is refused
+  at once with 503 and a Retry-After of ADMISSION_RETRY_AFTER seconds: waiting for a slot would
+  hold a thread (or, under asgi.py, block the event loop).
+
+Bucket backends (RATE_LIMIT_BACKEND):
+- 'off': no rate limit, the default.
+- 'memory': buckets in each worker process, so a client gets the rate once per worker.
+- 'redis': buckets shared by every worker through Redis (RATE_LIMIT_REDIS_URL), updated in a
+  WATCH / MULTI transaction. A blocking client: see the note in asgi.py.
+- 'fakeredis': the redis backend on an in-process fakeredis server, for tests.
+
+Refused requests are counted per endpoint and reason at /metrics.
+"""
+import math
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app, g, jsonify, request
+from werkzeug.exceptions import HTTPException
+from werkzeug.middleware.proxy_fix import ProxyFix
+from instrumentation import LabeledCounter
+from batch import read_batch
+from pagination import wants_ndjson
+
+# Token cost of a request by Flask-RESTful endpoint, when it is not 1 (RATE_LIMIT_COSTS overrides)
+ENDPOINT_COSTS = {
+    'bulkstudentsresource': 20,
+    'bulkcoursesresource': 20,
+    'bulkenrollmentsresource': 20,
+    'coursestatsresource': 5,
+    'teacherloadreportresource': 5,
+    'enrollmentexportresource': 100,
+    'importresource': 100,
+}
+# Endpoints whose GET without a lookup argument reads a page of a table, or all of it as NDJSON
+SCAN_ENDPOINTS = {'studentresource', 'teacherresource', 'courseresource', 'courselistresource'}
+LOOKUP_ARGS = ('ids', 'student_id', 'teacher_id', 'course_id', 'reg_no', 'email')
+# Never limited: monitoring must keep working when the API sheds load
+EXEMPT_ENDPOINTS = {'static', 'metricsresource', 'poolmetricsresource'}
+
+
+def refill(tokens, updated, now, rate, burst):
+    """
+    Tokens in a bucket last left with `tokens` at time `updated` (None: a new, full bucket).
+    """
+    if tokens is None:
+        return burst
+    return min(burst, tokens + max(0.0, now - updated) * rate)
+
+
+def wait_for(tokens, cost, rate, burst):
+    """
+    Seconds until a bucket holding `tokens` can pay `cost` (0 if it can now). A cost above the
+    burst is charged as the whole burst, so every request can eventually run.
+    """
+    cost = min(cost, burst)
+    if tokens >= cost:
+        return 0.0
+    return (cost - tokens) / rate if rate > 0 else math.inf
+
+
+class MemoryBuckets:
+    """
+    Token buckets in this process, the least recently used dropped beyond `max_buckets` (a dropped
+    bucket comes back full).
+    """
+
+    def __init__(self, max_buckets=10000):
+        self.max_buckets = max_buckets
+        self.buckets = OrderedDict()
+        self.lock = threading.Lock()
+
+    def take(self, buckets, cost):
+        """
+        Takes `cost` tokens from every bucket of `buckets` ([(key, rate, burst)]) if all of them
+        have enough. Returns 0, or the seconds to wait before trying again.
+        """
+        now = time.monotonic()
+        with self.lock:
+            levels = []
+            for key, rate, burst in buckets:
+                tokens, updated = self.buckets.get(key, (None, None))
+                levels.append(refill(tokens, updated, now, rate, burst))
+            wait = max(wait_for(tokens, cost, rate, burst) for tokens, (_, rate, burst) in zip(levels, buckets))
+            if wait == 0:
+                for tokens, (key, rate, burst) in zip(levels, buckets):
+                    self.buckets[key] = (tokens - min(cost, burst), now)
+                    self.buckets.move_to_end(key)
+                while len(self.buckets) > self.max_buckets:
+                    self.buckets.popitem(last=False)
+            return wait
+
+
+class RedisBuckets:
+    """
+    Token buckets shared through Redis: one hash (tokens, updated) per bucket, expiring once it
+    would be full again. Read and written in a WATCH / MULTI transaction, retried on conflict.
+    """
+
+    def __init__(self, client, prefix='global-learn:ratelimit:'):
+        self.client = client
+        self.prefix = prefix
+
+    def take(self, buckets, cost):
+        keys = [self.prefix + key for key, _, _ in buckets]
+
+        def attempt(pipe):
+            # Wall clock: the buckets are shared by processes on several hosts
+            now = time.time()
+            levels = []
+            for key, (_, rate, burst) in zip(keys, buckets):
+                tokens, updated = pipe.hmget(key, 'tokens', 'updated')
+                levels.append(refill(
+                    float(tokens) if tokens is not None else None,
+                    float(updated) if updated is not None else None,
+                    now, rate, burst,
+                ))
+            wait = max(wait_for(tokens, cost, rate, burst) for tokens, (_, rate, burst) in zip(levels, buckets))
+            pipe.multi()
+            if wait == 0:
+                for key, tokens, (_, rate, burst) in zip(keys, levels, buckets):
+                    pipe.hset(key, mapping={'tokens': tokens - min(cost, burst), 'updated': now})
+                    pipe.expire(key, max(1, math.ceil(burst / rate)) if rate > 0 else 3600)
+            return wait
+
+        return self.client.transaction(attempt, *keys, value_from_callable=True)
+
+
+def create_buckets(config):
+    kind = config.get('RATE_LIMIT_BACKEND', 'off')
+    if kind == 'off':
+        return None
+    if kind == 'memory':
+        return MemoryBuckets(config.get('RATE_LIMIT_MAX_CLIENTS', 10000))
+    if kind == 'redis':
+        import redis
+        return RedisBuckets(redis.Redis.from_url(config['RATE_LIMIT_REDIS_URL']))
+    if kind == 'fakeredis':
+        import fakeredis
+        return RedisBuckets(fakeredis.FakeRedis())
+    raise ValueError(f'Unknown RATE_LIMIT_BACKEND {kind!r}')
+
+
+class AdmissionController:
+    """
+    Bounds the token cost of the requests a worker runs at once. Requests costing more than 1
+    share `heavy_share` of the capacity; a request costing more than its share is charged the
+    whole share, so it runs alone.
+    """
+
+    def __init__(self, capacity, heavy_share=0.5):
+        self.capacity = capacity
+        self.heavy_capacity = max(1, int(capacity * heavy_share))
+        self.in_flight = 0
+        self.heavy_in_flight = 0
+        self.lock = threading.Lock()
+
+    def charge(self, cost):
+        return min(cost, self.heavy_capacity if cost > 1 else self.capacity)
+
+    def acquire(self, cost):
+        """
+        Admits a request of `cost` if it fits now. Returns the charge to release(), or None.
+        """
+        cost = self.charge(cost)
+        with self.lock:
+            if self.in_flight + cost > self.capacity:
+                return None
+            if cost > 1 and self.heavy_in_flight + cost > self.heavy_capacity:
+                return None
+            self.in_flight += cost
+            if cost > 1:
+                self.heavy_in_flight += cost
+            return cost
+
+    def release(self, cost):
+        with self.lock:
+            self.in_flight -= cost
+            if cost > 1:
+                self.heavy_in_flight -= cost
+
+
+class RateLimiter:
+    """
+    The rate limit and admission control of one app, installed by init_rate_limits().
+    """
+
+    def __init__(self, config):
+        self.buckets = create_buckets(config)
+        self.rate = config.get('RATE_LIMIT_RATE', 20)
+        self.burst = config.get('RATE_LIMIT_BURST', 100)
+        # {endpoint: (rate, burst)} of the buckets shared by every client
+        self.endpoint_limits = config.get('RATE_LIMIT_ENDPOINTS') or {}
+        self.costs = {**ENDPOINT_COSTS, **(config.get('RATE_LIMIT_COSTS') or {})}
+        self.scan_cost = config.get('RATE_LIMIT_SCAN_COST', 10)
+        self.stream_cost = config.get('RATE_LIMIT_STREAM_COST', 100)
+        capacity = config.get('ADMISSION_MAX_COST', 0)
+        self.admission = AdmissionController(capacity, config.get('ADMISSION_HEAVY_SHARE', 0.5)) if capacity else None
+        self.retry_after = config.get('ADMISSION_RETRY_AFTER', 1)
+        self.shed = LabeledCounter(('endpoint', 'reason'))
+
+    def cost(self):
+        """
+        Token cost of the current request.
+        """
+        endpoint = request.endpoint
+        if endpoint == 'batchresource' and request.method == 'POST':
+            return self.batch_cost()
+        if endpoint in self.costs:
+            return self.costs[endpoint]
+        if (
+            endpoint in SCAN_ENDPOINTS and request.method in ('GET', 'HEAD') and not request.view_args
+            and not any(request.args.get(name) for name in LOOKUP_ARGS)
+        ):
+            return self.stream_cost if wants_ndjson() else self.scan_cost
+        return 1
+
+    def batch_cost(self):
+        """
+        Token cost of a POST /batch: the sum of what its sub-requests would cost on their own
+        (1 for a body BatchResource will refuse with 400).
+        """
+        try:
+            subrequests = read_batch()
+        except HTTPException:
+            return 1
+        app = current_app._get_current_object()
+        total = 0
+        for path, headers in subrequests:
+            with app.test_request_context(path, method='GET', headers=headers):
+                total += self.cost()
+        return max(1, total)
+
+    def refuse(self, status, reason, retry_after, message):
+        self.shed.inc(request.endpoint, reason)
+        response = jsonify(message=message)
+        response.status_code = status
+        response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+        return response
+
+    # Flask hooks
+
+    def before_request(self):
+        endpoint = request.endpoint
+        if endpoint is None or endpoint in EXEMPT_ENDPOINTS:
+            return None
+        cost = self.cost()
+
+        if self.buckets is not None:
+            buckets = [(f'client:{request.remote_addr}', self.rate, self.burst)]
+            if endpoint in self.endpoint_limits:
+                rate, burst = self.endpoint_limits[endpoint]
+                buckets.append((f'endpoint:{endpoint}', rate, burst))
+            wait = self.buckets.take(buckets, cost)
+            if wait:
+                return self.refuse(429, 'rate_limit', wait, 'Too many requests, retry later')
+
+        if self.admission is not None:
+            charge = self.admission.acquire(cost)
+            if charge is None:
+                return self.refuse(503, 'admission', self.retry_after, 'Server busy, retry later')
+            g.admission = (request._get_current_object(), charge)
+        return None
+
+    def teardown_request(self, exc):
+        # Sub-requests of /batch (batch.py) share g with the request that carries them
+        admitted = g.pop('admission', None)
+        if admitted is None:
+            return
+        admitted_request, charge = admitted
+        if admitted_request is not request._get_current_object():
+            g.admission = admitted
+            return
+        self.admission.release(charge)
+
+
+def init_rate_limits(app):
+    """
+    Installs the rate limit (RATE_LIMIT_BACKEND) and admission control (ADMISSION_MAX_COST) of
+    `app`, if either is enabled. With RATE_LIMIT_TRUSTED_PROXIES set, clients are identified by
+    the X-Forwarded-For address that many proxies away.
+    """
+    limiter = RateLimiter(app.config)
+    if limiter.buckets is None and limiter.admission is None:
+        return
+    proxies = app.config.get('RATE_LIMIT_TRUSTED_PROXIES', 0)
+    if proxies:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=proxies)
+    app.extensions['rate_limiter'] = limiter
+    app.before_request(limiter.before_request)
+    app.teardown_request(limiter.teardown_request)
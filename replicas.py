@@ -0,0 +1,221 @@
+"""
+Read-replica routing. With REPLICA_URLS configured, the statements of GET and HEAD requests run
+on a read replica, picked round-robin per request among the healthy replicas whose replication
+lag is below REPLICA_MAX_LAG_SECONDS; without one, on the primary. Everything else stays on
+the primary:
+
+- other methods, DML statements and flushes, and reads after a write in the same session;
+- requests of a client whose request committed a write in the last READ_YOUR_WRITES_SECONDS (a
+  cookie set with that response) or that send `X-Read-Primary: true`;
+- cached endpoints whose tables this process committed to in the last REPLICA_MAX_LAG_SECONDS,
+  so a lagging replica never refills the response cache with the state before the write;
+- work outside requests (CLI commands, the enrollment queue).
+
+The replicas are extra Flask-SQLAlchemy binds ('replica_0', ...), so they get the same engine
+options, pool and async driver as the primary. Each one is checked at most every
+REPLICA_CHECK_INTERVAL seconds by the request that finds its check due: a trivial SELECT, or its lag
+(pg_last_xact_replay_timestamp() on PostgreSQL, REPLICA_LAG_QUERY if set). A replica whose
+connection fails is taken out until its next successful check.
+"""
+import itertools
+import logging
+import threading
+import time
+from flask import current_app, g, has_app_context, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, text
+from changes import on_commit
+
+logger = logging.getLogger(__name__)
+
+BIND_PREFIX = 'replica_'
+READ_METHODS = ('GET', 'HEAD')
+PRIMARY_COOKIE = 'read_primary_until'
+PRIMARY_HEADER = 'X-Read-Primary'
+
+# Seconds since the last replayed transaction, 0 when the replica has replayed all it received
+POSTGRESQL_LAG_QUERY = """
+    SELECT CASE
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+"""
+
+
+class Replica:
+    __slots__ = ('key', 'healthy', 'lag', 'checked_at', 'error')
+
+    def __init__(self, key):
+        self.key = key
+        self.healthy = False
+        self.lag = None
+        self.checked_at = None
+        self.error = None
+
+
+class ReplicaSet:
+    """
+    The replicas of one app and their last known health and lag.
+    """
+
+    def __init__(self, keys, max_lag, check_interval, lag_query=None):
+        self.replicas = {key: Replica(key) for key in keys}
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.lag_query = lag_query
+        self.lock = threading.Lock()
+        self.turn = itertools.count()
+        # Monotonic time of this process's last commit to each table
+        self.last_writes = {}
+
+    def pick(self, engines):
+        """
+        Returns the engine of the next usable replica, or None if there is none.
+        """
+        self._refresh(engines)
+        usable = [
+            replica for replica in self.replicas.values()
+            if replica.healthy and replica.lag is not None and replica.lag <= self.max_lag
+        ]
+        if not usable:
+            return None
+        return engines[usable[next(self.turn) % len(usable)].key]
+
+    def _refresh(self, engines):
+        now = time.monotonic()
+        due = []
+        # Claim the due checks under the lock, run them outside it: never hold a lock across a query
+        with self.lock:
+            for replica in self.replicas.values():
+                if replica.checked_at is None or now - replica.checked_at >= self.check_interval:
+                    replica.checked_at = now
+                    due.append(replica)
+        for replica in due:
+            self.check(replica, engines[replica.key])
+
+    def check(self, replica, engine):
+        lag_query = self.lag_query or (POSTGRESQL_LAG_QUERY if engine.dialect.name == 'postgresql' else None)
+        try:
+            with engine.connect() as connection:
+                lag = connection.execute(text(lag_query or 'SELECT 0')).scalar()
+        except Exception as error:
+            self.mark_failed(replica.key, error)
+            return
+        replica.healthy, replica.lag, replica.error = True, float(lag or 0), None
+
+    def mark_failed(self, key, error):
+        replica = self.replicas[key]
+        if replica.healthy or replica.error is None:
+            logger.warning('read replica %s is unavailable: %s', key, error)
+        replica.healthy, replica.error = False, str(error)
+
+    def status(self):
+        return [
+            {'bind': replica.key, 'healthy': replica.healthy, 'lag_seconds': replica.lag, 'error': replica.error}
+            for replica in self.replicas.values()
+        ]
+
+
+@on_commit
+def _record_writes(session, tables):
+    replicas = current_app.extensions.get('replicas') if has_app_context() else None
+    if replicas is not None:
+        now = time.monotonic()
+        for table in tables:
+            replicas.last_writes[table] = now
+        if has_request_context():
+            g.committed_writes = True
+
+
+def wants_primary():
+    """
+    True if the current request must read from the primary.
+    """
+    if request.headers.get(PRIMARY_HEADER, '').lower() in ('1', 'true'):
+        return True
+    until = request.cookies.get(PRIMARY_COOKIE, type=float)
+    return until is not None and until > time.time()
+
+
+def read_primary_after_write(tables):
+    """
+    Sends the rest of the request's reads to the primary if this process committed to any of
+    `tables` within the replicas' lag threshold. Called by @cached before it fills an entry.
+    """
+    replicas = current_app.extensions.get('replicas')
+    if replicas is None:
+        return
+    horizon = time.monotonic() - replicas.max_lag
+    if any(replicas.last_writes.get(table, 0) > horizon for table in tables):
+        g.read_engine = None
+
+
+def _read_engine(session):
+    if not has_request_context() or request.method not in READ_METHODS:
+        return None
+    replicas = current_app.extensions.get('replicas')
+    if replicas is None:
+        return None
+    if 'read_engine' not in g:
+        g.read_engine = None if wants_primary() else replicas.pick(session._db.engines)
+    return g.read_engine
+
+
+class RoutingSession(Session):
+    """
+    Flask-SQLAlchemy session that runs the reads of GET requests on a replica.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (
+            bind is None and not self._flushing and not getattr(clause, 'is_dml', False)
+            and not self.info.get('changed_tables')
+        ):
+            engine = _read_engine(self)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def _stick_to_primary(response):
+    # A client that just wrote reads its own writes from the primary for a while
+    if g.get('committed_writes'):
+        seconds = current_app.config.get('READ_YOUR_WRITES_SECONDS', 5)
+        response.set_cookie(
+            PRIMARY_COOKIE, f'{time.time() + seconds:.3f}', max_age=seconds, httponly=True, samesite='Lax'
+        )
+    return response
+
+
+def configure_replica_binds(app):
+    """
+    Adds a bind per REPLICA_URLS entry to SQLALCHEMY_BINDS. Called before db.init_app().
+    """
+    urls = app.config.get('REPLICA_URLS') or []
+    if urls:
+        binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+        binds.update({f'{BIND_PREFIX}{index}': url for index, url in enumerate(urls)})
+        app.config['SQLALCHEMY_BINDS'] = binds
+
+
+def init_replicas(app, db):
+    """
+    Starts routing the reads of `app` to its replica binds, if any.
+    """
+    urls = app.config.get('REPLICA_URLS') or []
+    if not urls:
+        return
+    replicas = ReplicaSet(
+        [f'{BIND_PREFIX}{index}' for index in range(len(urls))],
+        max_lag=app.config.get('REPLICA_MAX_LAG_SECONDS', 5),
+        check_interval=app.config.get('REPLICA_CHECK_INTERVAL', 5),
+        lag_query=app.config.get('REPLICA_LAG_QUERY'),
+    )
+    with app.app_context():
+        for key in replicas.replicas:
+            def failed(context, key=key):
+                if context.is_disconnect or context.connection is None:
+                    replicas.mark_failed(key, context.original_exception)
+            event.listen(db.engines[key], 'handle_error', failed)
+    app.extensions['replicas'] = replicas
+    app.after_request(_stick_to_primary)
@@ -0,0 +1,180 @@
+"""
+Reports over the teacher -> course -> student graph, read from the report tables that the
+triggers in models.py keep up to date (report_teacher_students, report_course_pairs).
+
+    GET /reports/teachers/<teacher_id>/students     students a teacher teaches, keyset paginated
+    GET /reports/courses/<course_id>/co-enrollment  courses sharing the most students with a course
+    GET /reports/teacher-load                       courses, students and enrollments per teacher
+
+Each report is a primary key or index range of one report table, so its cost depends on the
+size of the answer, not on the number of enrollments.
+
+    flask reports check     # exit status 1 if the report tables differ from the source tables
+    flask reports rebuild   # recompute both report tables from the source tables
+"""
+import click
+from flask.cli import AppGroup
+from flask_restful import Resource
+from sqlalchemy import delete, except_, func, insert, select
+from sqlalchemy.orm import aliased
+from cache import cached
+from models import db, Course, Enrollment, ReportCoursePair, ReportTeacherStudent, Teacher, TeacherCourse
+from pagination import get_limit, keyset_page
+from serializers import course_serializer, student_serializer, teacher_serializer
+
+
+class TeacherStudentsReportResource(Resource):
+    @cached('report_teacher_students', 'students', 'teachers')
+    def get(self, teacher_id):
+        """
+        Lists the students taught by a teacher, with the number of its courses each one takes.
+        """
+        fields = student_serializer.parse_fields()
+        serialize = student_serializer.row_serializer(fields)
+        stmt = (
+            student_serializer.select(fields)
+            .add_columns(ReportTeacherStudent.shared_courses)
+            .join(ReportTeacherStudent, ReportTeacherStudent.student_id == student_serializer.columns['student_id'])
+            .where(ReportTeacherStudent.teacher_id == teacher_id)
+        )
+        body = keyset_page(
+            stmt, ReportTeacherStudent.student_id, 'students',
+            lambda row: {**serialize(row), 'shared_courses': row.shared_courses},
+        )
+        if not body['students'] and db.session.get(Teacher, teacher_id) is None:
+            return {'message': 'Teacher not found'}, 404
+        return body
+
+
+class CoEnrollmentReportResource(Resource):
+    @cached('report_course_pairs', 'courses')
+    def get(self, course_id):
+        """
+        Lists the courses sharing the most students with a course (?limit=, most shared first).
+        """
+        fields = course_serializer.parse_fields()
+        serialize = course_serializer.row_serializer(fields)
+        stmt = (
+            course_serializer.select(fields)
+            .add_columns(ReportCoursePair.shared_students)
+            .join(ReportCoursePair, ReportCoursePair.other_course_id == Course.course_id)
+            .where(ReportCoursePair.course_id == course_id)
+            .order_by(ReportCoursePair.shared_students.desc(), ReportCoursePair.other_course_id)
+            .limit(get_limit())
+        )
+        rows = db.session.execute(stmt).all()
+        if not rows and db.session.get(Course, course_id) is None:
+            return {'message': 'Course not found'}, 404
+        return {
+            'course_id': course_id,
+            'courses': [{**serialize(row), 'shared_students': row.shared_students} for row in rows],
+        }
+
+
+class TeacherLoadReportResource(Resource):
+    @cached('report_teacher_students', 'teacher_courses', 'teachers')
+    def get(self):
+        """
+        Lists every teacher with its number of courses, of distinct students and of enrollments
+        in its courses, keyset paginated by teacher_id.
+        """
+        fields = teacher_serializer.parse_fields()
+        serialize = teacher_serializer.row_serializer(fields)
+
+        def per_teacher(column, aggregate):
+            return select(aggregate).where(column == Teacher.teacher_id).correlate(Teacher).scalar_subquery()
+
+        stmt = teacher_serializer.select(fields).add_columns(
+            per_teacher(TeacherCourse.teacher_id, func.count()).label('course_count'),
+            per_teacher(ReportTeacherStudent.teacher_id, func.count()).label('student_count'),
+            per_teacher(
+                ReportTeacherStudent.teacher_id, func.coalesce(func.sum(ReportTeacherStudent.shared_courses), 0)
+            ).label('enrollment_count'),
+        )
+        return keyset_page(stmt, Teacher.teacher_id, 'teachers', lambda row: {
+            **serialize(row),
+            'course_count': row.course_count,
+            'student_count': row.student_count,
+            'enrollment_count': row.enrollment_count,
+        })
+
+
+def _teacher_students():
+    return (
+        select(TeacherCourse.teacher_id, Enrollment.student_id, func.count())
+        .join(Enrollment, Enrollment.course_id == TeacherCourse.course_id)
+        .where(TeacherCourse.teacher_id.is_not(None), Enrollment.student_id.is_not(None))
+        .group_by(TeacherCourse.teacher_id, Enrollment.student_id)
+    )
+
+
+def _course_pairs():
+    other = aliased(Enrollment)
+    return (
+        select(Enrollment.course_id, other.course_id, func.count())
+        .join(other, (other.student_id == Enrollment.student_id) & (other.course_id != Enrollment.course_id))
+        .group_by(Enrollment.course_id, other.course_id)
+    )
+
+
+# (report model, its columns, SELECT of its expected rows from the source tables)
+GRAPH = [
+    (
+        ReportTeacherStudent,
+        (ReportTeacherStudent.teacher_id, ReportTeacherStudent.student_id, ReportTeacherStudent.shared_courses),
+        _teacher_students,
+    ),
+    (
+        ReportCoursePair,
+        (ReportCoursePair.course_id, ReportCoursePair.other_course_id, ReportCoursePair.shared_students),
+        _course_pairs,
+    ),
+]
+
+
+def graph_drift():
+    """
+    Returns {table name: (rows missing or wrong, rows that should not be there)}.
+    """
+    drift = {}
+    for model, columns, expected in GRAPH:
+        stored = select(*columns)
+        missing = except_(expected(), stored).subquery()
+        unexpected = except_(stored, expected()).subquery()
+        drift[model.__tablename__] = (
+            db.session.scalar(select(func.count()).select_from(missing)),
+            db.session.scalar(select(func.count()).select_from(unexpected)),
+        )
+    return drift
+
+
+def rebuild_graph():
+    """
+    Replaces the rows of both report tables with the ones computed from the source tables and
+    commits. Returns {table name: number of rows}.
+    """
+    rows = {}
+    for model, columns, expected in GRAPH:
+        db.session.execute(delete(model))
+        result = db.session.execute(insert(model).from_select([column.key for column in columns], expected()))
+        rows[model.__tablename__] = result.rowcount
+    db.session.commit()
+    return rows
+
+
+reports_cli = AppGroup('reports', help='Check or rebuild the reporting graph.')
+
+
+@reports_cli.command('check')
+def check_command():
+    drift = graph_drift()
+    for table, (missing, unexpected) in drift.items():
+        click.echo(f'{table}: {missing} missing or wrong row(s), {unexpected} unexpected row(s)')
+    if any(missing or unexpected for missing, unexpected in drift.values()):
+        raise SystemExit(1)
+
+
+@reports_cli.command('rebuild')
+def rebuild_command():
+    for table, count in rebuild_graph().items():
+        click.echo(f'{table}: {count} row(s)')
@@ -0,0 +1,303 @@
+"""
+Pluggable, ranked name search for students, teachers and courses.
+
+PostgreSQL uses the pg_trgm GIN indexes from the migrations (TrigramSearch); SQLite falls back
+to an in-process trigram inverted index kept in sync on commit (NgramIndexSearch).
+"""
+import re
+import threading
+from abc import ABC, abstractmethod
+from flask import current_app, request
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import Session, object_session
+from models import db, Student, Teacher, Course
+from pagination import get_limit, next_link
+
+# Searchable collections: model, primary key column and the text column that is searched
+TARGETS = {
+    'students': (Student, Student.student_id, Student.name),
+    'teachers': (Teacher, Teacher.teacher_id, Teacher.name),
+    'courses': (Course, Course.course_id, Course.course_name),
+}
+TARGET_BY_MODEL = {model: name for name, (model, _, _) in TARGETS.items()}
+
+_WORD = re.compile(r'[^\W_]+')
+
+
+def _escape_like(term):
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def substring_trigrams(text):
+    """
+    Every three-character slice of the lowercased text. A term can only be a substring of a
+    name if all of its substring trigrams appear in the name.
+    """
+    text = text.lower()
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def word_trigrams(text):
+    """
+    pg_trgm-style trigrams: each word padded with two leading spaces and one trailing space.
+    Used for ranking, so both backends order results the same way.
+    """
+    grams = set()
+    for word in _WORD.findall(text.lower()):
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def similarity(a, b):
+    """
+    Same measure as pg_trgm's similarity(): shared trigrams over all distinct trigrams.
+    """
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class SearchBackend(ABC):
+    """
+    Interface of a search backend.
+    """
+
+    @abstractmethod
+    def search(self, target, stmt, term, limit, offset=0):
+        """
+        Runs the SELECT `stmt` restricted to rows of `target` whose name contains `term`,
+        ranked best match first, and returns at most `limit` rows starting at `offset`.
+        """
+
+
+class TrigramSearch(SearchBackend):
+    """
+    PostgreSQL backend: the ILIKE filter is served by the pg_trgm GIN index and results are
+    ordered by trigram similarity, all in one query.
+    """
+
+    def search(self, target, stmt, term, limit, offset=0):
+        _, pk_column, text_column = TARGETS[target]
+        stmt = (
+            stmt.where(text_column.ilike(f'%{_escape_like(term)}%', escape='\\'))
+            .order_by(func.similarity(text_column, term).desc(), pk_column)
+            .limit(limit)
+            .offset(offset)
+        )
+        return db.session.execute(stmt).all()
+
+
+class NgramIndexSearch(SearchBackend):
+    """
+    In-process trigram inverted index, for SQLite where pg_trgm is not available.
+
+    Each target keeps `postings` (trigram -> ids) and `texts` (id -> lowercased name). The
+    index of a target is loaded with one `SELECT pk, name` the first time it is searched and
+    then updated from the commit hooks at the bottom of this module. It lives in the memory of
+    one process, so it is meant for single-process local and test runs.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.postings = {}
+        self.texts = {}
+
+    def _load(self, target):
+        # Query without holding the lock: in the async server (asgi.py) requests share one
+        # thread, and a lock held across a database round trip would block all of them
+        _, pk_column, text_column = TARGETS[target]
+        rows = db.session.execute(select(pk_column, text_column)).all()
+        postings, texts = {}, {}
+        for pk, text in rows:
+            self._add(postings, texts, pk, text)
+        with self.lock:
+            if target not in self.texts:
+                self.postings[target] = postings
+                self.texts[target] = texts
+            return self.postings[target], self.texts[target]
+
+    @staticmethod
+    def _add(postings, texts, pk, text):
+        if text is None:
+            return
+        texts[pk] = text.lower()
+        for gram in substring_trigrams(text):
+            postings.setdefault(gram, set()).add(pk)
+
+    @staticmethod
+    def _remove(postings, texts, pk):
+        text = texts.pop(pk, None)
+        if text is None:
+            return
+        for gram in substring_trigrams(text):
+            ids = postings.get(gram)
+            if ids is not None:
+                ids.discard(pk)
+                if not ids:
+                    del postings[gram]
+
+    def apply(self, target, upserts, deletes):
+        """
+        Applies committed changes: `upserts` maps ids to their new name, `deletes` is a set of ids.
+        Targets that were never searched are not loaded yet and need no update.
+        """
+        with self.lock:
+            if target not in self.texts:
+                return
+            postings, texts = self.postings[target], self.texts[target]
+            for pk in deletes:
+                self._remove(postings, texts, pk)
+            for pk, text in upserts.items():
+                self._remove(postings, texts, pk)
+                self._add(postings, texts, pk, text)
+
+    def invalidate(self, target=None):
+        """
+        Drops the index of `target` (or of every target) so it is reloaded on the next search.
+        Used after writes that bypass the ORM, such as bulk inserts.
+        """
+        with self.lock:
+            for name in ([target] if target else list(self.texts)):
+                self.texts.pop(name, None)
+                self.postings.pop(name, None)
+
+    def rank(self, target, term, limit, offset=0):
+        """
+        Returns the ids of the best matches for `term`, best first.
+        """
+        needle = term.lower()
+        with self.lock:
+            postings, texts = self.postings.get(target), self.texts.get(target)
+        if texts is None:
+            postings, texts = self._load(target)
+        with self.lock:
+            grams = substring_trigrams(needle)
+            if grams:
+                posting_lists = sorted((postings.get(gram, set()) for gram in grams), key=len)
+                candidates = set(posting_lists[0]).intersection(*posting_lists[1:])
+            else:
+                # One or two characters have no trigram: check every name, still without touching the database
+                candidates = texts.keys()
+            matches = [(pk, texts[pk]) for pk in candidates if needle in texts[pk]]
+
+        query_grams = word_trigrams(term)
+        matches.sort(key=lambda match: (-similarity(query_grams, word_trigrams(match[1])), match[0]))
+        return [pk for pk, _ in matches[offset:offset + limit]]
+
+    def search(self, target, stmt, term, limit, offset=0):
+        _, pk_column, _ = TARGETS[target]
+        ids = self.rank(target, term, limit, offset)
+        if not ids:
+            return []
+        rows = db.session.execute(stmt.where(pk_column.in_(ids))).all()
+        by_id = {getattr(row, pk_column.key): row for row in rows}
+        return [by_id[pk] for pk in ids if pk in by_id]
+
+
+# One backend per engine, so several apps in one process (e.g. benchmarks) do not share an index
+_backends = {}
+
+
+def get_search_backend():
+    """
+    Returns the search backend for the current app's database. SEARCH_BACKEND in the config
+    ('trigram' or 'ngram') overrides the choice made from the SQL dialect.
+    """
+    engine = db.engine
+    backend = _backends.get(engine)
+    if backend is None:
+        kind = current_app.config.get('SEARCH_BACKEND')
+        if kind is None:
+            kind = 'trigram' if engine.dialect.name == 'postgresql' else 'ngram'
+        backend = TrigramSearch() if kind == 'trigram' else NgramIndexSearch()
+        _backends[engine] = backend
+    return backend
+
+
+def invalidate_search_index(target=None):
+    """
+    Forgets the in-process index of `target` (or of every target) for the current database, so
+    it is rebuilt on the next search. Call it after writes that bypass the ORM mapper events.
+    """
+    backend = _backends.get(db.engine)
+    if isinstance(backend, NgramIndexSearch):
+        backend.invalidate(target)
+
+
+def search_page(target, stmt, term, serialize):
+    """
+    Returns one page of ranked matches for `term` in `target`, paginated with ?limit= and ?offset=.
+    """
+    limit = get_limit()
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    rows = get_search_backend().search(target, stmt, term, limit + 1, offset)
+
+    body = {target: [serialize(row) for row in rows[:limit]]}
+    body['next'] = next_link(offset=offset + limit) if len(rows) > limit else None
+    return body
+
+
+# ---------------------Keep the n-gram indexes in sync---------------------------------------------
+# Mapper events record the changed names in session.info; they are applied only once the
+# transaction commits and thrown away on rollback.
+
+def _pending(session):
+    return session.info.setdefault('search_changes', {})
+
+
+def _record(session, model, pk, text):
+    name = TARGET_BY_MODEL[model]
+    upserts, deletes = _pending(session).setdefault(name, ({}, set()))
+    if text is None:
+        upserts.pop(pk, None)
+        deletes.add(pk)
+    else:
+        upserts[pk] = text
+
+
+def record_search_change(model, pk, text=None):
+    """
+    Records that the `model` row `pk` was renamed to `text`, or deleted (text None), in the current
+    transaction. For writes that bypass the mapper events, such as the single-statement UPDATE
+    and DELETE of the resources (conditional.update_row(), conditional.delete_row()).
+    """
+    _record(db.session, model, pk, text)
+
+
+def _record_upsert(mapper, connection, target):
+    session = object_session(target)
+    if session is None:
+        return
+    _, pk_column, text_column = TARGETS[TARGET_BY_MODEL[type(target)]]
+    _record(session, type(target), getattr(target, pk_column.key), getattr(target, text_column.key))
+
+
+def _record_delete(mapper, connection, target):
+    session = object_session(target)
+    if session is None:
+        return
+    _, pk_column, _ = TARGETS[TARGET_BY_MODEL[type(target)]]
+    _record(session, type(target), getattr(target, pk_column.key), None)
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_search_changes(session):
+    changes = session.info.pop('search_changes', None)
+    if not changes:
+        return
+    backend = _backends.get(session.get_bind())
+    if isinstance(backend, NgramIndexSearch):
+        for name, (upserts, deletes) in changes.items():
+            backend.apply(name, upserts, deletes)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_search_changes(session):
+    session.info.pop('search_changes', None)
+
+
+for _model in TARGET_BY_MODEL:
+    event.listen(_model, 'after_insert', _record_upsert)
+    event.listen(_model, 'after_update', _record_upsert)
+    event.listen(_model, 'after_delete', _record_delete)
@@ -1,40 +1,12 @@
-import os
-from dotenv import load_dotenv
-from flask import Flask
-from flask_sqlalchemy import SQLAlchemy
+from flask_migrate import upgrade
 from models import db, Student, StudentProfile, Teacher, TeacherProfile, Course, Enrollment, TeacherCourse
 from faker import Faker
 from datetime import date, timedelta
-from random import randint, choice
+from random import randint, choice, sample
+from app import create_app
 
-# Load environment variables
-load_dotenv()
-
-# Initialize Flask app
-app = Flask(__name__)
-
-# Load appropriate configuration based on FLASK_ENV
-if os.getenv('FLASK_ENV') == 'production':
-    app.config.from_object('config.ProductionConfig')
-elif os.getenv('FLASK_ENV') == 'testing':
-    app.config.from_object('config.TestingConfig')
-else:
-    app.config.from_object('config.DevelopmentConfig')
-
-# Configure SQLAlchemy database URI based on environment variables
-app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
-
-# Set up database URI based on environment (use DB_EXTERNAL_URL by default)
-if os.getenv('FLASK_ENV') == 'production':
-    app.config["SQLALCHEMY_DATABASE_URI"] = os.getenv("DB_INTERNAL_URL")
-else:
-    app.config["SQLALCHEMY_DATABASE_URI"] = os.getenv("DB_EXTERNAL_URL")
-
-# Set the Flask app secret key from environment variable
-app.config["SECRET_KEY"] = os.getenv("SECRET_KEY")
-
-# Initialize SQLAlchemy with the Flask app
-db.init_app(app)
+# Same app, configuration and database as the server (FLASK_ENV, DB_EXTERNAL_URL / DB_INTERNAL_URL)
+app = create_app()
 
 # Seed function to populate the database
 def seed_data():
@@ -58,7 +30,7 @@ def seed_data():
         student = Student(
             name=fake.name(),
             date_of_birth=fake.date_of_birth(minimum_age=18, maximum_age=25),
-            email=fake.email(),
+            email=fake.unique.email(),
             reg_no=fake.uuid4(),
             student_profile_id=choice(student_profiles).student_profile_id
         )
@@ -85,7 +57,7 @@ def seed_data():
     for _ in range(8):
         teacher = Teacher(
             name=fake.name(),
-            email=fake.email(),
+            email=fake.unique.email(),
             teacher_profile_id=choice(teacher_profiles).teacher_profile_id
         )
         db.session.add(teacher)
@@ -108,8 +80,7 @@ def seed_data():
 
     # Seed enrollments
     for student in students:
-        for _ in range(randint(1, 3)):  # Each student enrolls in 1-3 courses
-            course = choice(courses)
+        for course in sample(courses, randint(1, 3)):  # Each student enrolls in 1-3 distinct courses
             enrollment = Enrollment(
                 student_id=student.student_id,
                 course_id=course.course_id
@@ -120,8 +91,7 @@ def seed_data():
 
     # Seed teacher courses
     for teacher in teachers:
-        for _ in range(randint(1, 2)):  # Each teacher teaches 1-2 courses
-            course = choice(courses)
+        for course in sample(courses, randint(1, 2)):  # Each teacher teaches 1-2 distinct courses
             teacher_course = TeacherCourse(
                 teacher_id=teacher.teacher_id,
                 course_id=course.course_id
@@ -134,11 +104,13 @@ def seed_data():
 
 # Create the app context for database operations
 with app.app_context():
-    # Drop all tables
-    db.drop_all()
+    # Bring the schema up to date with the migrations
+    upgrade()
 
-    # Create all tables
-    db.create_all()
+    # Delete all existing rows, children first
+    for table in reversed(db.metadata.sorted_tables):
+        db.session.execute(table.delete())
+    db.session.commit()
 
     # Call the seed function
     seed_data()
@@ -0,0 +1,127 @@
+from datetime import date, datetime, time
+from decimal import Decimal
+from flask import request
+from flask_restful import abort
+from sqlalchemy import select
+from models import Student, StudentProfile, Teacher, TeacherProfile, Course, Enrollment, TeacherCourse
+
+# Same output formats SerializerMixin uses, so switching a resource over does not change its payload
+DATE_FORMAT = '%Y-%m-%d'
+DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+TIME_FORMAT = '%H:%M'
+
+
+def _converter(python_type):
+    """
+    Returns the function that turns a column value of `python_type` into JSON, or None if it is already JSON.
+    """
+    if issubclass(python_type, datetime):
+        return lambda value: value.strftime(DATETIME_FORMAT)
+    if issubclass(python_type, date):
+        return lambda value: value.strftime(DATE_FORMAT)
+    if issubclass(python_type, time):
+        return lambda value: value.strftime(TIME_FORMAT)
+    if issubclass(python_type, Decimal):
+        return float
+    return None
+
+
+class ModelSerializer:
+    """
+    Column-projected serializer for one model, compiled once from its table metadata.
+
+    Unlike SerializerMixin.to_dict() it never walks relationships or serialize_rules at
+    runtime: it selects only the requested columns and turns each result Row (a plain tuple,
+    no ORM identity-map object) into a dict with a precompiled per-field converter.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.primary_key = model.__mapper__.primary_key[0].key
+        self.columns = {}
+        self.converters = {}
+        for attr in model.__mapper__.column_attrs:
+            column = attr.columns[0]
+            self.columns[attr.key] = getattr(model, attr.key)
+            try:
+                python_type = column.type.python_type
+            except NotImplementedError:
+                python_type = object
+            self.converters[attr.key] = _converter(python_type)
+        self.fields = tuple(self.columns)
+        self._compiled = {}
+
+    def parse_fields(self):
+        """
+        Reads the ?fields= sparse fieldset from the request. The primary key is always included.
+        Aborts with 400 if an unknown field is requested.
+        """
+        raw = request.args.get('fields')
+        if not raw:
+            return self.fields
+
+        requested = [field.strip() for field in raw.split(',') if field.strip()]
+        unknown = [field for field in requested if field not in self.columns]
+        if unknown:
+            abort(400, message=f"Unknown field(s) for {self.model.__tablename__}: {', '.join(unknown)}")
+
+        fields = [self.primary_key] + [field for field in requested if field != self.primary_key]
+        return tuple(dict.fromkeys(fields))
+
+    def select(self, fields=None):
+        """
+        Returns a SELECT of only the columns in `fields` (all columns by default).
+        """
+        fields = fields or self.fields
+        return select(*[self.columns[field] for field in fields])
+
+    def row_serializer(self, fields=None):
+        """
+        Returns a function turning one result row of `select(fields)` into a dict.
+        The function is built once per distinct fieldset and cached.
+        """
+        fields = fields or self.fields
+        serialize = self._compiled.get(fields)
+        if serialize is not None:
+            return serialize
+
+        converters = [self.converters[field] for field in fields]
+        if not any(converters):
+            def serialize(row):
+                return dict(zip(fields, row))
+        else:
+            pairs = tuple(zip(fields, converters))
+
+            def serialize(row):
+                return {
+                    field: convert(value) if convert is not None and value is not None else value
+                    for (field, convert), value in zip(pairs, row)
+                }
+
+        self._compiled[fields] = serialize
+        return serialize
+
+    def dump(self, obj, fields=None):
+        """
+        Serializes an already loaded ORM object, e.g. the result of a POST or PUT.
+        """
+        fields = fields or self.fields
+        return self.row_serializer(fields)(tuple(getattr(obj, field) for field in fields))
+
+
+# One compiled serializer per model
+student_serializer = ModelSerializer(Student)
+student_profile_serializer = ModelSerializer(StudentProfile)
+teacher_serializer = ModelSerializer(Teacher)
+teacher_profile_serializer = ModelSerializer(TeacherProfile)
+course_serializer = ModelSerializer(Course)
+enrollment_serializer = ModelSerializer(Enrollment)
+teacher_course_serializer = ModelSerializer(TeacherCourse)
+
+SERIALIZERS = {
+    serializer.model: serializer
+    for serializer in (
+        student_serializer, student_profile_serializer, teacher_serializer, teacher_profile_serializer,
+        course_serializer, enrollment_serializer, teacher_course_serializer,
+    )
+}